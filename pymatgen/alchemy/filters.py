@@ -194,11 +194,13 @@ class RemoveDuplicatesFilter(AbstractStructureFilter):
             finder = SymmetryFinder(s, symprec=self._symprec)
             return finder.get_spacegroup_number()
 
+        sg = None
         for s in self._structure_list:
             if self._sm._comparator.get_structure_hash(structure) ==\
                     self._sm._comparator.get_structure_hash(s):
-                if self._symprec is None or \
-                        get_sg(s) == get_sg(structure):
+                if self._symprec is not None and sg is None:
+                    sg = get_sg(structure)
+                if self._symprec is None or get_sg(s) == sg:
                     if self._sm.fit(s, structure):
                         return False
 
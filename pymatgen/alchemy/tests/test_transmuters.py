@@ -42,6 +42,12 @@ class CifTransmuterTest(unittest.TestCase):
                        for el in s.final_structure.composition.elements])
             self.assertEqual(expected_ans, els)
 
+        tsc2 = CifTransmuter.from_filenames([os.path.join(
+            test_dir, "MultiStructure.cif")] * 2, trans, ncores=2)
+        self.assertEqual(len(tsc2), 4)
+        self.assertEqual([s.final_structure for s in tsc2],
+                         [s.final_structure for s in tsc] * 2)
+
 
 class PoscarTransmuterTest(unittest.TestCase):
 
@@ -59,6 +65,11 @@ class PoscarTransmuterTest(unittest.TestCase):
             els = set([el.symbol
                        for el in s.final_structure.composition.elements])
             self.assertEqual(expected_ans, els)
+        tsc2 = PoscarTransmuter.from_filenames(os.path.join(test_dir,
+                                                            "POSCAR"),
+                                               trans, ncores=2)
+        self.assertEqual(len(tsc2), 1)
+        self.assertEqual(tsc2[0].final_structure, tsc[0].final_structure)
 
     def test_transmuter(self):
         tsc = PoscarTransmuter.from_filenames([os.path.join(test_dir,
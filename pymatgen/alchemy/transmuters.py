@@ -21,10 +21,14 @@ __date__ = "Mar 4, 2012"
 
 import os
 import re
+import glob
 import warnings
+import functools
 
 from multiprocessing import Pool
 from pymatgen.alchemy.materials import TransformedStructure
+from pymatgen.io.smartio import read_structures
+from pymatgen.util.io_utils import zopen
 
 
 class StandardTransmuter(object):
@@ -311,14 +315,15 @@ class CifTransmuter(StandardTransmuter):
 
     @staticmethod
     def from_filenames(filenames, transformations=None, primitive=True,
-                       extend_collection=False):
+                       extend_collection=False, ncores=None):
         """
         Generates a TransformedStructureCollection from a cif, possibly
         containing multiple structures.
 
         Args:
             filenames:
-                List of strings of the cif files
+                List of strings of the cif files, or a glob pattern.
+                Compressed (.gz, .bz2) files are supported.
             transformations:
                 New transformations to be applied to all structures
             primitive:
@@ -326,15 +331,27 @@ class CifTransmuter(StandardTransmuter):
             extend_collection:
                 Whether to use more than one output structure from one-to-many
                 transformations.
-        """
-
-        allcifs = []
-        for fname in filenames:
-            with open(fname, "r") as f:
-                allcifs.append(f.read())
-        return CifTransmuter("\n".join(allcifs), transformations,
-                             primitive=primitive,
-                             extend_collection=extend_collection)
+            ncores:
+                Number of cores to use for parsing the files (see
+                pymatgen.io.smartio.read_structures) and applying
+                transformations. Defaults to None, which means serial
+                processing.
+        """
+        if isinstance(filenames, basestring):
+            filenames = sorted(glob.glob(filenames))
+        if not ncores:
+            allcifs = []
+            for fname in filenames:
+                with zopen(fname, "r") as f:
+                    allcifs.append(f.read())
+            return CifTransmuter("\n".join(allcifs), transformations,
+                                 primitive=primitive,
+                                 extend_collection=extend_collection)
+        reader = functools.partial(_read_cif_file, primitive=primitive)
+        return StandardTransmuter(
+            _read_transformed_structures(filenames, reader, ncores),
+            transformations, extend_collection=extend_collection,
+            ncores=ncores)
 
 
 class PoscarTransmuter(StandardTransmuter):
@@ -360,27 +377,33 @@ class PoscarTransmuter(StandardTransmuter):
 
     @staticmethod
     def from_filenames(poscar_filenames, transformations=None,
-                       extend_collection=False):
+                       extend_collection=False, ncores=None):
         """
         Convenient constructor to generates a POSCAR transmuter from a list of
         POSCAR filenames.
 
         Args:
             poscar_filenames:
-                List of POSCAR filenames
+                List of POSCAR filenames, or a glob pattern. Compressed (.gz,
+                .bz2) files are supported.
             transformations:
                 New transformations to be applied to all structures.
             extend_collection:
                 Whether to use more than one output structure from one-to-many
                 transformations.
-        """
-        tstructs = []
-        for filename in poscar_filenames:
-            with open(filename, "r") as f:
-                tstructs.append(TransformedStructure
-                                .from_poscar_string(f.read(), []))
+            ncores:
+                Number of cores to use for parsing the files (see
+                pymatgen.io.smartio.read_structures) and applying
+                transformations. Defaults to None, which means serial
+                processing.
+        """
+        if isinstance(poscar_filenames, basestring):
+            poscar_filenames = sorted(glob.glob(poscar_filenames))
+        tstructs = _read_transformed_structures(poscar_filenames,
+                                                _read_poscar_file, ncores)
         return StandardTransmuter(tstructs, transformations,
-                                  extend_collection=extend_collection)
+                                  extend_collection=extend_collection,
+                                  ncores=ncores)
 
 
 def batch_write_vasp_input(transformed_structures, vasp_input_set, output_dir,
@@ -446,3 +469,36 @@ def _apply_transformation(inputs):
     if new:
         o.extend(new)
     return o
+
+
+def _read_transformed_structures(filenames, reader, ncores):
+    """
+    Reads lists of TransformedStructures from files, in parallel if ncores
+    is set. The first error encountered is raised.
+    """
+    tstructs = []
+    for (filename, result) in read_structures(filenames, ncpus=ncores or 1,
+                                              reader=reader):
+        if isinstance(result, Exception):
+            raise result
+        tstructs.extend(result)
+    return tstructs
+
+
+def _read_cif_file(filename, primitive=True):
+    """
+    Reads all TransformedStructures in a cif file. Must not be in the class
+    so that it can be pickled.
+    """
+    with zopen(filename, "r") as f:
+        return CifTransmuter(f.read(),
+                             primitive=primitive).transformed_structures
+
+
+def _read_poscar_file(filename):
+    """
+    Reads a TransformedStructure from a POSCAR file. Must not be in the
+    class so that it can be pickled.
+    """
+    with zopen(filename, "r") as f:
+        return [TransformedStructure.from_poscar_string(f.read(), [])]
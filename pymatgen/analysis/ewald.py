@@ -15,15 +15,26 @@ __email__ = "shyue@mit.edu"
 __status__ = "Production"
 __date__ = "Aug 1 2012"
 
-from math import pi, sqrt, log, exp, erfc, factorial
+from math import pi, sqrt, log, erfc, factorial
 from datetime import datetime
-from copy import deepcopy, copy
 import bisect
+import time
+import multiprocessing
 
 import numpy as np
 
 from pymatgen.core.physical_constants import ELECTRON_CHARGE, EPSILON_0
-from pymatgen.util.coord_utils import get_points_in_sphere_pbc
+from pymatgen.util.coord_utils import get_points_in_sphere_pbc, \
+    find_pbc_matches
+
+try:
+    from scipy.special import erfc as erfc_array
+except ImportError:
+    erfc_array = np.vectorize(erfc, otypes=[np.float64])
+
+#Maximum number of (G vector, site) elements in the arrays used for each
+#block of the reciprocal space summation.
+RECIP_BLOCK_ELEMENTS = 2 ** 18
 
 
 class EwaldSummation(object):
@@ -44,7 +55,7 @@ class EwaldSummation(object):
     CONV_FACT = 1e10 * ELECTRON_CHARGE / (4 * pi * EPSILON_0)
 
     def __init__(self, structure, real_space_cut=None, recip_space_cut=None,
-                 eta=None, acc_factor=8.0):
+                 eta=None, acc_factor=8.0, energy_only=False):
         """
         Initializes and calculates the Ewald sum. Default convergence
         parameters have been specified, but you can override them if you wish.
@@ -69,6 +80,11 @@ class EwaldSummation(object):
                 determine automatically.
             acc_factor:
                 No. of significant figures each sum is converged to.
+            energy_only:
+                If True, only the energies are calculated initially, which
+                is much faster for large structures. The energy matrices and
+                forces are then only calculated when they are first
+                accessed. Defaults to False.
         """
         self._s = structure
         self._vol = structure.volume
@@ -95,13 +111,28 @@ class EwaldSummation(object):
         self._oxi_states = [compute_average_oxidation_state(site)
                             for site in structure]
         self._coords = np.array(self._s.cart_coords)
-        self._forces = np.zeros((len(structure), 3))
 
         # Now we call the relevant private methods to calculate the reciprocal
         # and real space terms.
+        self._recip = None
+        self._real = None
+        self._forces = None
+        if energy_only:
+            self._recip_energy = self._calc_recip(energy_only=True)
+            (self._real_energy, self._point) = \
+                self._calc_real_and_point(energy_only=True)
+        else:
+            self._calc_matrices()
+
+    def _calc_matrices(self):
+        """
+        Calculates the energy matrices and forces.
+        """
         (self._recip, recip_forces) = self._calc_recip()
         (self._real, self._point, real_point_forces) = \
             self._calc_real_and_point()
+        self._recip_energy = np.sum(self._recip)
+        self._real_energy = np.sum(self._real)
         self._forces = recip_forces + real_point_forces
 
     def compute_partial_energy(self, removed_indices):
@@ -130,46 +161,101 @@ class EwaldSummation(object):
         Returns:
             Ewald sum of substructure.
         """
-        total_energy_matrix = self.total_energy_matrix.copy()
+        return self.compute_sub_structures([sub_structure], tol)[0]
+
+    def compute_sub_structures(self, sub_structures, tol=1e-3):
+        """
+        Gives total ewald energies for a list of sub structures in the same
+        lattice, e.g., all orderings of a disordered structure in a
+        particular supercell. See compute_sub_structure. The energies are
+        calculated together using compute_energies.
+
+        Args:
+            sub_structures:
+                Substructures to compute Ewald sums for.
+            tol:
+                Tolerance for site matching in fractional coordinates.
+
+        Returns:
+            Array of Ewald sums of the substructures.
+        """
+        charges = np.zeros((len(sub_structures), self._s.num_sites))
+        for i, sub_structure in enumerate(sub_structures):
+            indices = self.get_site_indices(sub_structure, tol)
+            charges[i, indices] = [compute_average_oxidation_state(site)
+                                   for site in sub_structure]
+        return self.compute_energies(charges)
 
-        def find_match(site):
-            for test_site in sub_structure:
-                frac_diff = abs(np.array(site.frac_coords)
-                                - np.array(test_site.frac_coords)) % 1
-                frac_diff = [abs(a) < tol or abs(a) > 1 - tol
-                             for a in frac_diff]
-                if all(frac_diff):
-                    return test_site
-            return None
-
-        matches = []
-        for i, site in enumerate(self._s):
-            matching_site = find_match(site)
-            if matching_site:
-                new_charge = compute_average_oxidation_state(matching_site)
-                old_charge = self._oxi_states[i]
-                scaling_factor = new_charge / old_charge
-                matches.append(matching_site)
-            else:
-                scaling_factor = 0
-            total_energy_matrix[i, :] *= scaling_factor
-            total_energy_matrix[:, i] *= scaling_factor
-
-        if len(matches) != len(sub_structure):
+    def compute_energies(self, charges):
+        """
+        Gives total ewald energies for the sites of the structure taking on
+        different charges, using the total energy matrix. Each row and
+        column of the matrix is scaled by the ratio of the new to the
+        original charge of the site, i.e., the energy is the quadratic form
+        s.M.s of the scaling factors s. Removed sites have a charge of 0.
+        The energies of many configurations are obtained with a single
+        matrix product.
+
+        Args:
+            charges:
+                Sequence of the new charges of all sites, or a 2D array
+                where each row holds the charges of one configuration.
+
+        Returns:
+            Ewald sum for a 1D sequence of charges, or an array of Ewald sums
+            for a 2D array.
+        """
+        charges = np.array(charges, dtype=np.float64)
+        oxistates = np.array(self._oxi_states, dtype=np.float64)
+        neutral = oxistates == 0
+        if np.any(charges[..., neutral] != 0):
+            raise ValueError("Sites with zero charge cannot be assigned "
+                             "a charge.")
+        scales = charges / np.where(neutral, 1, oxistates)
+        matrix = self.total_energy_matrix
+        return np.sum(np.dot(scales, matrix) * scales, axis=-1)
+
+    def get_site_indices(self, sub_structure, tol=1e-3):
+        """
+        Finds the indices of the sites of a sub structure in the structure.
+        Sites are matched in a single pass using find_pbc_matches.
+
+        Args:
+            sub_structure:
+                Structure in the same lattice, with all its sites present
+                in the structure.
+            tol:
+                Tolerance for site matching in fractional coordinates.
+
+        Returns:
+            Array of indices of the sites of sub_structure.
+        """
+        sub_fcoords = np.array(sub_structure.frac_coords).reshape((-1, 3))
+        (sub_inds, cand_inds) = find_pbc_matches(sub_fcoords,
+                                                 self._s.frac_coords, tol)
+
+        #Each site can only be matched once.
+        indices = -np.ones(len(sub_fcoords), dtype=np.int)
+        used = set()
+        for i, j in zip(sub_inds, cand_inds):
+            if indices[i] < 0 and j not in used:
+                indices[i] = j
+                used.add(j)
+        unmatched = [sub_structure[i] for i in np.where(indices < 0)[0]]
+
+        if unmatched:
             output = ["Missing sites."]
-            for site in sub_structure:
-                if site not in matches:
-                    output.append("unmatched = {}".format(site))
+            for site in unmatched:
+                output.append("unmatched = {}".format(site))
             raise ValueError("\n".join(output))
-
-        return sum(sum(total_energy_matrix))
+        return indices
 
     @property
     def reciprocal_space_energy(self):
         """
         The reciprocal space energy.
         """
-        return sum(sum(self._recip))
+        return self._recip_energy
 
     @property
     def reciprocal_space_energy_matrix(self):
@@ -178,6 +264,8 @@ class EwaldSummation(object):
         corresponds to the interaction energy between site i and site j in
         reciprocal space.
         """
+        if self._recip is None:
+            self._calc_matrices()
         return self._recip
 
     @property
@@ -185,7 +273,7 @@ class EwaldSummation(object):
         """
         The real space space energy.
         """
-        return sum(sum(self._real))
+        return self._real_energy
 
     @property
     def real_space_energy_matrix(self):
@@ -193,6 +281,8 @@ class EwaldSummation(object):
         The real space energy matrix. Each matrix element (i, j) corresponds to
         the interaction energy between site i and site j in real space.
         """
+        if self._real is None:
+            self._calc_matrices()
         return self._real
 
     @property
@@ -215,7 +305,7 @@ class EwaldSummation(object):
         """
         The total energy.
         """
-        return sum(sum(self._recip)) + sum(sum(self._real)) + sum(self._point)
+        return self._recip_energy + self._real_energy + sum(self._point)
 
     @property
     def total_energy_matrix(self):
@@ -223,7 +313,8 @@ class EwaldSummation(object):
         The total energy matrix. Each matrix element (i, j) corresponds to the
         total interaction energy between site i and site j.
         """
-        totalenergy = self._recip + self._real
+        totalenergy = self.reciprocal_space_energy_matrix + \
+            self.real_space_energy_matrix
         for i in range(len(self._point)):
             totalenergy[i, i] += self._point[i]
         return totalenergy
@@ -234,9 +325,11 @@ class EwaldSummation(object):
         The forces on each site as a Nx3 matrix. Each row corresponds to a
         site.
         """
+        if self._forces is None:
+            self._calc_matrices()
         return self._forces
 
-    def _calc_recip(self):
+    def _calc_recip(self, energy_only=False):
         """
         Perform the reciprocal space summation. Calculates the quantity
         E_recip = 1/(2PiV) sum_{G < Gmax} exp(-(G.G/4/eta))/(G.G) S(G)S(-G)
@@ -244,103 +337,124 @@ class EwaldSummation(object):
         S(G) = sum_{k=1,N} q_k exp(-i G.r_k)
         S(G)S(-G) = |S(G)|**2
 
-        This method is heavily vectorized to utilize numpy's C backend for
-        speed.
+        The G vectors are processed in blocks, and the energy matrix is
+        obtained from matrix products of the cos(G.r) and sin(G.r) arrays
+        of each block.
+
+        Args:
+            energy_only:
+                If True, only the reciprocal space energy is returned.
+
+        Returns:
+            (energy matrix, forces), or the energy if energy_only is True.
         """
         numsites = self._s.num_sites
         prefactor = 2 * pi / self._vol
         erecip = np.zeros((numsites, numsites))
         forces = np.zeros((numsites, 3))
+        energy = 0
         coords = self._coords
         rcp_latt = self._s.lattice.reciprocal_lattice
         recip_nn = get_points_in_sphere_pbc(rcp_latt, [[0, 0, 0]], [0, 0, 0],
                                             self._gmax)
-
-        frac_to_cart = rcp_latt.get_cartesian_coords
-
-        oxistates = np.array(self._oxi_states)
-        #create array where q_2[i,j] is qi * qj
-        qiqj = oxistates[None, :] * oxistates[:, None]
-
-        for (fcoords, dist, i) in recip_nn:
-            if dist == 0:
+        recip_nn = recip_nn[recip_nn[:, 1] != 0]
+        if len(recip_nn) == 0:
+            return energy if energy_only else (erecip, forces)
+        gvects = rcp_latt.get_cartesian_coords(
+            np.array([fcoords for fcoords in recip_nn[:, 0]],
+                     dtype=np.float64))
+        gsquares = np.sum(gvects ** 2, axis=1)
+        #weight of each G vector, exp(-G.G/(4 eta)) / G.G
+        weights = np.exp(-gsquares / (4.0 * self._eta)) / gsquares
+
+        oxistates = np.array(self._oxi_states, dtype=np.float64)
+
+        #Limit the size of the (G vectors x sites) arrays in each block.
+        block_size = max(1, RECIP_BLOCK_ELEMENTS // numsites)
+        for start in xrange(0, len(gvects), block_size):
+            gvect = gvects[start:start + block_size]
+            weight = weights[start:start + block_size]
+            gvectdot = np.dot(gvect, coords.T)
+            cosval = np.cos(gvectdot)
+            sinval = np.sin(gvectdot)
+
+            #calculate the structure factors
+            sreal = np.dot(cosval, oxistates)
+            simag = np.dot(sinval, oxistates)
+
+            if energy_only:
+                energy += np.sum(weight * (sreal ** 2 + simag ** 2))
                 continue
-            gvect = frac_to_cart(fcoords)
-            gsquare = np.linalg.norm(gvect) ** 2
-
-            expval = exp(-1.0 * gsquare / (4.0 * self._eta))
-
-            gvectdot = np.sum(gvect[None, :] * coords, 1)
-
-            #calculate the structure factor
-            sreal = np.sum(oxistates * np.cos(gvectdot))
-            simag = np.sum(oxistates * np.sin(gvectdot))
-
-            #create array where exparg[i,j] is gvectdot[i] - gvectdot[j]
-            exparg = gvectdot[None, :] - gvectdot[:, None]
-
-            #uses the identity sin(x)+cos(x) = 2**0.5 sin(x + pi/4)
-            sfactor = qiqj * np.sin(exparg + pi / 4) * 2 ** 0.5
-
-            erecip += expval / gsquare * sfactor
-            pref = 2 * expval / gsquare * oxistates
-            factor = prefactor * pref * \
-                (sreal * np.sin(gvectdot)
-                 - simag * np.cos(gvectdot)) * EwaldSummation.CONV_FACT
-
-            forces += factor[:, None] * gvect[None, :]
 
+            #The (i, j) element is sum_G w_G sin(G.(r_j - r_i) + pi/4) *
+            #2 ** 0.5, which expands as
+            #cos_i cos_j + sin_i sin_j + cos_i sin_j - sin_i cos_j.
+            wcos = weight[:, None] * cosval
+            wsin = weight[:, None] * sinval
+            erecip += np.dot(wcos.T, cosval + sinval) + \
+                np.dot(wsin.T, sinval - cosval)
+
+            factor = 2 * weight[:, None] * oxistates[None, :] * \
+                (sreal[:, None] * sinval - simag[:, None] * cosval)
+            forces += np.dot(factor.T, gvect)
+
+        if energy_only:
+            return energy * prefactor * EwaldSummation.CONV_FACT
+        erecip *= oxistates[None, :] * oxistates[:, None]
+        forces *= prefactor * EwaldSummation.CONV_FACT
         return erecip * prefactor * EwaldSummation.CONV_FACT, forces
 
-    def _calc_real_and_point(self):
+    def _calc_real_and_point(self, energy_only=False):
         """
         Determines the self energy -(eta/pi)**(1/2) * sum_{i=1}^{N} q_i**2
 
         If cell is charged a compensating background is added (i.e. a G=0 term)
+
+        Args:
+            energy_only:
+                If True, only the real space energy and point energies are
+                returned.
+
+        Returns:
+            (real space energy matrix, point energies, forces), or
+            (real space energy, point energies) if energy_only is True.
         """
-        all_nn = self._s.get_all_neighbors(self._rmax, True)
+        (cind, nind, images, rij) = self._s.get_neighbor_list(self._rmax)
 
         forcepf = 2.0 * self._sqrt_eta / sqrt(pi)
         coords = self._coords
         numsites = self._s.num_sites
-        ereal = np.zeros((numsites, numsites))
-        epoint = np.zeros(numsites)
+        oxistates = np.array(self._oxi_states, dtype=np.float64)
+
+        epoint = oxistates ** 2 * -1.0 * sqrt(self._eta / pi)
+        # add jellium term
+        epoint += oxistates * pi / (2.0 * self._vol * self._eta)
+        epoint *= EwaldSummation.CONV_FACT
+
+        qi = oxistates[cind]
+        qj = oxistates[nind]
+        erfcval = erfc_array(self._sqrt_eta * rij)
+        new_ereals = erfcval * qi * qj / rij
+        if energy_only:
+            return (0.5 * EwaldSummation.CONV_FACT * np.sum(new_ereals),
+                    epoint)
+
+        ereal = np.bincount(nind * numsites + cind, weights=new_ereals,
+                            minlength=numsites * numsites)
+        ereal = ereal.reshape((numsites, numsites))
+
+        ncoords = coords[nind] + \
+            self._s.lattice.get_cartesian_coords(images)
+        fijpf = qj / rij ** 3 * (erfcval + forcepf * rij *
+                                 np.exp(-self._eta * rij ** 2))
+        fij = (fijpf * qi * EwaldSummation.CONV_FACT)[:, None] * \
+            (coords[cind] - ncoords)
         forces = np.zeros((numsites, 3))
-        for i in xrange(numsites):
-            nn = all_nn[i]  # self._s.get_neighbors(site, self._rmax)
-            num_neighbors = len(nn)
-            qi = self._oxi_states[i]
-            epoint[i] = qi * qi
-            epoint[i] *= -1.0 * sqrt(self._eta / pi)
-            # add jellium term
-            epoint[i] += qi * pi / (2.0 * self._vol * self._eta)
-
-            rij = np.zeros(num_neighbors)
-            qj = np.zeros(num_neighbors)
-            js = np.zeros(num_neighbors)
-            ncoords = np.zeros((num_neighbors, 3))
-
-            for k, (site, dist, j) in enumerate(nn):
-                rij[k] = dist
-                qj[k] = self._oxi_states[j]
-                js[k] = j
-                ncoords[k] = site.coords
-
-            erfcval = np.array(map(erfc, self._sqrt_eta * rij))
-            new_ereals = erfcval * qi * qj / rij
-
-            #insert new_ereals
-            for k, new_e in enumerate(new_ereals):
-                ereal[js[k], i] += new_e
-
-            fijpf = qj / rij ** 3 * (erfcval + forcepf * rij *
-                                     np.exp(-self._eta * rij ** 2))
-            forces[i] += np.sum(np.expand_dims(fijpf, 1) *
-                                (np.array([coords[i]]) - ncoords) *
-                                qi * EwaldSummation.CONV_FACT, axis=0)
+        for k in xrange(3):
+            forces[:, k] = np.bincount(cind, weights=fij[:, k],
+                                       minlength=numsites)
 
         ereal *= 0.5 * EwaldSummation.CONV_FACT
-        epoint *= EwaldSummation.CONV_FACT
         return ereal, epoint, forces
 
     @property
@@ -385,7 +499,8 @@ class EwaldMinimizer:
     """
     ALGO_TIME_LIMIT = 3
 
-    def __init__(self, matrix, m_list, num_to_return=1, algo=ALGO_FAST):
+    def __init__(self, matrix, m_list, num_to_return=1, algo=ALGO_FAST,
+                 ncpus=None, time_limit=None, max_nodes=None):
         """
         Args:
             matrix:
@@ -404,15 +519,29 @@ class EwaldMinimizer:
                 structures so it may be necessary to overestimate and then
                 remove the duplicates later. (duplicate checking in this
                 process is extremely expensive)
+            algo:
+                Algorithm to use. One of the EwaldMinimizer.ALGO_* constants.
+            ncpus:
+                Number of processes to search with. If set, the top of the
+                search tree is split into subtrees which are searched in
+                parallel, sharing the current bound. Defaults to None, which
+                means a serial search. ALGO_BEST_FIRST always searches
+                serially, since it stops at the first results found in the
+                order of the serial search.
+            time_limit:
+                Wall-clock limit on the search in seconds. Defaults to None,
+                i.e., no limit.
+            max_nodes:
+                Approximate limit on the number of nodes of the search tree
+                to visit. Defaults to None, i.e., no limit.
+
+            If the search is stopped by time_limit or max_nodes, the best
+            results found so far are returned, and completed is False.
         """
         # Setup and checking of inputs
-        self._matrix = copy(matrix)
+        matrix = np.array(matrix, dtype=np.float64)
         # Make the matrix diagonally symmetric (so matrix[i,:] == matrix[:,j])
-        for i in range(len(self._matrix)):
-            for j in range(i, len(self._matrix)):
-                value = (self._matrix[i, j] + self._matrix[j, i]) / 2
-                self._matrix[i, j] = value
-                self._matrix[j, i] = value
+        self._matrix = (matrix + matrix.T) / 2
 
         def comb(n, k):
             return factorial(n) / factorial(k) / factorial(n - k)
@@ -435,23 +564,76 @@ class EwaldMinimizer:
         # Tag that the recurse function looks at at each level. If a method
         # sets this to true it breaks the recursion and stops the search.
         self._finished = False
+        self._completed = True
+
+        self._ncpus = ncpus
+        self._max_nodes = max_nodes
+        self._num_nodes = 0
+        self._deadline = time.time() + time_limit if time_limit else None
+        #Bound shared between the processes of a parallel search.
+        self._shared_minimum = None
+        #Subtrees to be searched in parallel, collected at _split_depth.
+        self._subtrees = None
+        self._split_depth = None
 
         self._start_time = datetime.utcnow()
 
         self.minimize_matrix()
 
-        self._best_m_list = self._output_lists[0][1]
-        self._minimized_sum = self._output_lists[0][0]
+        if self._output_lists:
+            self._best_m_list = self._output_lists[0][1]
+            self._minimized_sum = self._output_lists[0][0]
+        else:
+            self._best_m_list = None
+            self._minimized_sum = None
 
     def minimize_matrix(self):
         """
         This method finds and returns the permutations that produce the lowest
         ewald sum calls recursive function to iterate through permutations
         """
-        if self._algo == EwaldMinimizer.ALGO_FAST or \
+        if self._algo not in (EwaldMinimizer.ALGO_FAST,
+                              EwaldMinimizer.ALGO_BEST_FIRST,
+                              EwaldMinimizer.ALGO_TIME_LIMIT):
+            return
+        #The search state holds the row sums of the manipulated matrix
+        #and its total sum, which are updated incrementally, instead of the
+        #matrix itself. Indices which have not been manipulated have a
+        #scaling of 1, so their row sums are simply matrix.sum(axis=1).
+        root = (np.sum(self._matrix, axis=1), np.sum(self._matrix),
+                len(self._m_list) - 1, [m[1] for m in self._m_list],
+                [list(m[2]) for m in self._m_list],
+                set(range(len(self._matrix))), [])
+        if not self._ncpus or self._ncpus < 2 or \
                 self._algo == EwaldMinimizer.ALGO_BEST_FIRST:
-            return self._recurse(self._matrix, self._m_list,
-                                 set(range(len(self._matrix))))
+            self._recurse(root)
+            return
+
+        self._subtrees = []
+        self._split_depth = int(np.ceil(np.log2(4 * self._ncpus)))
+        self._recurse(root)
+        subtrees = self._subtrees
+        self._subtrees = None
+        if not subtrees:
+            return
+        max_nodes = self._max_nodes
+        if max_nodes is not None:
+            max_nodes = max(1, (max_nodes - self._num_nodes) // len(subtrees))
+        shared_minimum = multiprocessing.Value("d", self._current_minimum)
+        pool = multiprocessing.Pool(
+            self._ncpus, initializer=_init_minimizer_worker,
+            initargs=(self, max_nodes, shared_minimum))
+        try:
+            results = pool.map(_minimize_subtree, subtrees, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+        for (output_lists, completed, num_nodes) in results:
+            self._completed = self._completed and completed
+            self._num_nodes += num_nodes
+            self._output_lists.extend(output_lists)
+        self._output_lists = sorted(self._output_lists,
+                                    key=lambda x: x[0])[:self._num_to_return]
 
     def add_m_list(self, matrix_sum, m_list):
         """
@@ -469,14 +651,31 @@ class EwaldMinimizer:
             self._output_lists.pop()
         if len(self._output_lists) == self._num_to_return:
             self._current_minimum = self._output_lists[-1][0]
+            if self._shared_minimum is not None:
+                with self._shared_minimum.get_lock():
+                    if self._current_minimum < self._shared_minimum.value:
+                        self._shared_minimum.value = self._current_minimum
 
-    def best_case(self, matrix, m_list, indices_left):
+    def get_minimum(self):
         """
-        Computes a best case given a matrix and manipulation list.
+        Returns the current bound, i.e., the largest sum that would still
+        be added to the output lists.
+        """
+        if self._shared_minimum is not None:
+            return min(self._current_minimum, self._shared_minimum.value)
+        return self._current_minimum
+
+    def best_case(self, row_sums, matrix_sum, m_list, indices_left):
+        """
+        Computes a best case given the current state of the matrix and a
+        manipulation list.
 
         Args:
-            matrix:
-                the current matrix (with some permutations already performed
+            row_sums:
+                Row sums of the current matrix (with some permutations
+                already performed).
+            matrix_sum:
+                Sum of the current matrix.
             m_list:
                 [(multiplication fraction, number_of_indices, indices,
                 species)] describing the manipulation
@@ -491,9 +690,11 @@ class EwaldMinimizer:
             m_indices.extend(m[2])
             fraction_list.extend([m[0]] * m[1])
 
-        indices = list(indices_left.intersection(m_indices))
+        indices = sorted(indices_left.intersection(m_indices))
 
-        interaction_matrix = matrix[indices, :][:, indices]
+        #Indices which haven't been manipulated are unscaled, so their
+        #interactions are those of the original matrix.
+        interaction_matrix = self._matrix[np.ix_(indices, indices)]
 
         fractions = np.zeros(len(interaction_matrix)) + 1
         fractions[:len(fraction_list)] = fraction_list
@@ -501,7 +702,7 @@ class EwaldMinimizer:
 
         # Sum associated with each index (disregarding interactions between
         # indices)
-        sums = 2 * np.sum(matrix[indices], axis=1)
+        sums = 2 * row_sums[indices]
         sums = np.sort(sums)
 
         # Interaction corrections. Can be reduced to (1-x)(1-y) for x,y in
@@ -523,19 +724,19 @@ class EwaldMinimizer:
             interaction_correction = average_correction * speedup_parameter \
                 + interaction_correction * (1 - speedup_parameter)
 
-        best_case = np.sum(matrix) + np.inner(sums[::-1], fractions - 1) \
+        best_case = matrix_sum + np.inner(sums[::-1], fractions - 1) \
             + interaction_correction
 
         return best_case
 
-    def get_next_index(self, matrix, manipulation, indices_left):
+    def get_next_index(self, row_sums, manipulation, indices_left):
         """
         Returns an index that should have the most negative effect on the
         matrix sum
         """
         f = manipulation[0]
-        indices = list(indices_left.intersection(manipulation[2]))
-        sums = np.sum(matrix[indices], axis=1)
+        indices = [i for i in manipulation[2] if i in indices_left]
+        sums = row_sums[indices]
         if f < 1:
             next_index = indices[sums.argmax(axis=0)]
         else:
@@ -543,64 +744,96 @@ class EwaldMinimizer:
 
         return next_index
 
-    def _recurse(self, matrix, m_list, indices, output_m_list=[]):
+    def _recurse(self, state, depth=0):
         """
         This method recursively finds the minimal permutations using a binary
         tree search strategy.
 
         Args:
-            matrix:
-                The current matrix (with some permutations already performed
-            m_list:
-                The list of permutations still to be performed
-            indices:
-                Set of indices which haven't had a permutation performed on
-                them.
+            state:
+                (row_sums, matrix_sum, level, counts, candidates, indices,
+                output_m_list), where row_sums and matrix_sum describe the
+                current matrix (with some permutations already performed),
+                level is the position in the m_list of the manipulation
+                being performed, counts and candidates are the number of
+                indices still to be manipulated and the candidate indices of
+                each manipulation, and indices is the set of indices which
+                haven't had a permutation performed on them.
+            depth:
+                Depth in the search tree.
         """
         #check to see if we've found all the solutions that we need
         if self._finished:
             return
+        self._num_nodes += 1
+        if (self._max_nodes is not None and
+                self._num_nodes > self._max_nodes) or \
+                (self._deadline is not None and time.time() > self._deadline):
+            self._finished = True
+            self._completed = False
+            return
 
-        #if we're done with the current manipulation, pop it off.
-        while m_list[-1][1] == 0:
-            m_list = copy(m_list)
-            m_list.pop()
+        (row_sums, matrix_sum, level, counts, candidates, indices,
+         output_m_list) = state
+
+        #if we're done with the current manipulation, move on to the next.
+        while counts[level] == 0:
+            level -= 1
             #if there are no more manipulations left to do check the value
-            if not m_list:
-                matrix_sum = np.sum(matrix)
-                if matrix_sum < self._current_minimum:
+            if level < 0:
+                if matrix_sum < self.get_minimum():
                     self.add_m_list(matrix_sum, output_m_list)
                 return
 
+        if self._subtrees is not None and depth == self._split_depth:
+            self._subtrees.append((row_sums, matrix_sum, level, counts,
+                                   candidates, indices, output_m_list))
+            return
+
+        m_list = [[m[0], counts[l], candidates[l], m[3]]
+                  for l, m in enumerate(self._m_list[:level + 1])]
+        manipulation = m_list[-1]
+
         #if we wont have enough indices left, return
-        if m_list[-1][1] > len(indices.intersection(m_list[-1][2])):
+        if manipulation[1] > len(indices.intersection(manipulation[2])):
             return
 
-        if len(m_list) == 1 or m_list[-1][1] > 1:
-            if self.best_case(matrix, m_list, indices) > self._current_minimum:
+        if level == 0 or manipulation[1] > 1:
+            if self.best_case(row_sums, matrix_sum, m_list, indices) > \
+                    self.get_minimum():
                 return
 
-        index = self.get_next_index(matrix, m_list[-1], indices)
-
-        m_list[-1][2].remove(index)
+        index = self.get_next_index(row_sums, manipulation, indices)
 
-        # Make the matrix and new m_list where we do the manipulation to the
-        # index that we just got
-        matrix2 = np.copy(matrix)
-        m_list2 = deepcopy(m_list)
-        output_m_list2 = copy(output_m_list)
+        candidates = list(candidates)
+        candidates[level] = [i for i in candidates[level] if i != index]
 
-        matrix2[index, :] *= m_list[-1][0]
-        matrix2[:, index] *= m_list[-1][0]
-        output_m_list2.append([index, m_list[-1][3]])
-        indices2 = copy(indices)
-        indices2.remove(index)
-        m_list2[-1][1] -= 1
+        # Do the manipulation to the index that we just got. Scaling row and
+        # column index by f changes the sum by
+        # 2 (f - 1) row_sums[index] + (f - 1) ** 2 matrix[index, index].
+        delta = manipulation[0] - 1
+        matrix_sum2 = matrix_sum + 2 * delta * row_sums[index] + \
+            delta ** 2 * self._matrix[index, index]
+        row_sums2 = row_sums + delta * self._matrix[index]
+        counts2 = list(counts)
+        counts2[level] -= 1
+        indices2 = indices - set([index])
+        output_m_list2 = output_m_list + [[index, manipulation[3]]]
 
         #recurse through both the modified and unmodified matrices
 
-        self._recurse(matrix2, m_list2, indices2, output_m_list2)
-        self._recurse(matrix, m_list, indices, output_m_list)
+        self._recurse((row_sums2, matrix_sum2, level, counts2, candidates,
+                       indices2, output_m_list2), depth + 1)
+        self._recurse((row_sums, matrix_sum, level, counts, candidates,
+                       indices, output_m_list), depth + 1)
+
+    @property
+    def completed(self):
+        """
+        Whether the search was completed, i.e., not stopped by time_limit or
+        max_nodes.
+        """
+        return self._completed
 
     @property
     def best_m_list(self):
@@ -615,6 +848,29 @@ class EwaldMinimizer:
         return self._output_lists
 
 
+#Minimizer and search limits used by the worker processes of a parallel
+#EwaldMinimizer search.
+_worker_data = {}
+
+
+def _init_minimizer_worker(minimizer, max_nodes, shared_minimum):
+    minimizer._shared_minimum = shared_minimum
+    minimizer._max_nodes = max_nodes
+    _worker_data["minimizer"] = minimizer
+
+
+def _minimize_subtree(state):
+    minimizer = _worker_data["minimizer"]
+    minimizer._output_lists = []
+    minimizer._current_minimum = float('inf')
+    minimizer._finished = False
+    minimizer._completed = True
+    minimizer._num_nodes = 0
+    minimizer._recurse(state)
+    return (minimizer._output_lists, minimizer._completed,
+            minimizer._num_nodes)
+
+
 def compute_average_oxidation_state(site):
     """
     Calculates the average oxidation state of a site
@@ -17,10 +17,12 @@ __date__ = "Dec 3, 2012"
 import numpy as np
 import itertools
 import abc
+import multiprocessing
+import collections
 
 from pymatgen.serializers.json_coders import MSONable
 from pymatgen.core.structure import Structure
-from pymatgen.core.structure_modifier import StructureEditor, SupercellMaker
+from pymatgen.core.structure_modifier import SupercellMaker
 from pymatgen.core.lattice import Lattice
 from pymatgen.core.composition import Composition
 from pymatgen.optimization.linear_assignment import LinearAssignment
@@ -299,21 +301,42 @@ class StructureMatcher(MSONable):
         self._primitive_cell = primitive_cell
         self._scale = scale
         self._supercell = attempt_supercell
+        self._prepared_cache = collections.OrderedDict()
 
-    def _get_lattices(self, s1, s2, vol_tol):
-        s1_lengths, s1_angles = s1.lattice.lengths_and_angles
-        all_nn = get_points_in_sphere_pbc(
-            s2.lattice, [[0, 0, 0]], [0, 0, 0],
-            (1 + self.ltol) * max(s1_lengths))[:, [0, 1]]
+    def _get_lattices(self, l1, l2, vol_tol, lattice_points=None):
+        """
+        Generates all lattices made up of lattice vectors of l2 that match
+        l1 within the length and angle tolerances.
+
+        Args:
+            l1:
+                Lattice to match.
+            l2:
+                Lattice to generate the candidate lattice vectors from.
+            vol_tol:
+                Minimum volume of valid lattices.
+            lattice_points:
+                Optional (fcoords, dists) of the points of l2 within
+                (1 + ltol) * max(l1.abc) of the origin, which may have been
+                precomputed. Further points are ignored.
+        """
+        s1_lengths, s1_angles = l1.lengths_and_angles
+        if lattice_points is None:
+            all_nn = get_points_in_sphere_pbc(
+                l2, [[0, 0, 0]], [0, 0, 0],
+                (1 + self.ltol) * max(s1_lengths))[:, [0, 1]]
+            nn_fcoords = np.array([np.array(c) for c in all_nn[:, 0]])
+            nn_dists = all_nn[:, 1].astype(np.float)
+        else:
+            (nn_fcoords, nn_dists) = lattice_points
 
         nv = []
         for l in s1_lengths:
-            nvi = all_nn[np.where((all_nn[:, 1] < (1 + self.ltol) * l)
-                                  & (all_nn[:, 1] > (1 - self.ltol) * l))][:, 0]
+            nvi = nn_fcoords[np.where((nn_dists < (1 + self.ltol) * l)
+                                      & (nn_dists > (1 - self.ltol) * l))]
             if not len(nvi):
                 return
-            nvi = [np.array(site) for site in nvi]
-            nvi = np.dot(nvi, s2.lattice.matrix)
+            nvi = np.dot(nvi, l2.matrix)
             nv.append(nvi)
             #The vectors are broadcast into a 5-D array containing
         #all permutations of the entries in nv[0], nv[1], nv[2]
@@ -481,7 +504,7 @@ class StructureMatcher(MSONable):
             s1[i] = np.mod(s1[i] - s1_translation, 1)
 
         #do permutations of vectors, check for equality
-        for nl in self._get_lattices(struct1, struct2, vol_tol):
+        for nl in self._get_lattices(nl1, nl2, vol_tol):
 
             s2_cart = [[] for i in s1]
 
@@ -588,10 +611,15 @@ class StructureMatcher(MSONable):
                 comparator.get_structure_hash(struct2):
             return None
 
+        prep1 = self._get_prepared(struct1)
+        prep2 = self._get_prepared(struct2)
+
         #primitive cell transformation
-        if self._primitive_cell and struct1.num_sites != struct2.num_sites:
-            struct1 = struct1.get_primitive_structure()
-            struct2 = struct2.get_primitive_structure()
+        use_primitive = self._primitive_cell and \
+            struct1.num_sites != struct2.num_sites
+        if use_primitive:
+            struct1 = prep1.primitive
+            struct2 = prep2.primitive
 
         # Same number of sites
         if struct1.num_sites != struct2.num_sites:
@@ -606,23 +634,20 @@ class StructureMatcher(MSONable):
         # Get niggli reduced cells. Though technically not necessary, this
         # minimizes cell lengths and speeds up the matching of skewed
         # cells considerably.
-        struct1 = struct1.get_reduced_structure(reduction_algo="niggli")
-        struct2 = struct2.get_reduced_structure(reduction_algo="niggli")
+        cell1 = prep1.get_reduced_cell(use_primitive)
+        cell2 = prep2.get_reduced_cell(use_primitive)
 
-        nl1 = struct1.lattice
-        nl2 = struct2.lattice
+        nl1 = cell1.lattice
+        nl2 = cell2.lattice
 
-        #rescale lattice to same volume
+        #rescale lattice to same volume. Fractional coordinates are
+        #unaffected, and cartesian coordinates are scaled with the lattice.
+        scale2 = 1
         if self._scale:
             scale_vol = (nl2.volume / nl1.volume) ** (1 / 6)
-            se1 = StructureEditor(struct1)
             nl1 = Lattice(nl1.matrix * scale_vol)
-            se1.modify_lattice(nl1)
-            struct1 = se1.modified_structure
-            se2 = StructureEditor(struct2)
-            nl2 = Lattice(nl2.matrix / scale_vol)
-            se2.modify_lattice(nl2)
-            struct2 = se2.modified_structure
+            scale2 = 1 / scale_vol
+            nl2 = Lattice(nl2.matrix * scale2)
 
         #Volume to determine invalid lattices
         vol_tol = nl2.volume / 2
@@ -630,52 +655,40 @@ class StructureMatcher(MSONable):
         #fractional tolerance of atomic positions (2x for initial fitting)
         frac_tol = \
             np.array([stol / ((1 - self.ltol) * np.pi) * i for
-                      i in struct1.lattice.reciprocal_lattice.abc]) * \
+                      i in nl1.reciprocal_lattice.abc]) * \
             ((nl1.volume + nl2.volume) /
              (2 * struct1.num_sites)) ** (1.0 / 3)
 
-        #generate structure coordinate lists
-        species_list = []
-        s1 = []
-        for site in struct1:
+        #match the site groups of struct2 to those of struct1
+        species_list = cell1.species
+        s2_cart = [[] for i in species_list]
+        for species, cart_coords in zip(cell2.species, cell2.cart_coords):
             found = False
-            for i, species in enumerate(species_list):
-                if comparator.are_equal(site.species_and_occu, species):
+            for i, sp in enumerate(species_list):
+                if comparator.are_equal(species, sp):
                     found = True
-                    s1[i].append(site.frac_coords)
-                    break
-            if not found:
-                s1.append([site.frac_coords])
-                species_list.append(site.species_and_occu)
-
-        zipped = sorted(zip(s1, species_list), key=lambda x: len(x[0]))
-
-        s1 = [x[0] for x in zipped]
-        species_list = [x[1] for x in zipped]
-        s2_cart = [[] for i in s1]
-
-        for site in struct2:
-            found = False
-            for i, species in enumerate(species_list):
-                if comparator.are_equal(site.species_and_occu, species):
-                    found = True
-                    s2_cart[i].append(site.coords)
+                    s2_cart[i].extend(cart_coords * scale2)
                     break
                     #if no site match found return None
             if not found:
                 return None
 
         #check that sizes of the site groups are identical
-        for f1, c2 in zip(s1, s2_cart):
+        for f1, c2 in zip(cell1.frac_coords, s2_cart):
             if len(f1) != len(c2):
                 return None
 
         #translate s1
-        s1_translation = s1[0][0]
-        for i in range(len(species_list)):
-            s1[i] = np.mod(s1[i] - s1_translation, 1)
-            #do permutations of vectors, check for equality
-        for nl in self._get_lattices(struct1, struct2, vol_tol):
+        s1_translation = cell1.frac_coords[0][0]
+        s1 = [np.mod(f1 - s1_translation, 1) for f1 in cell1.frac_coords]
+
+        #candidate lattice vectors of struct2
+        r = (1 + self.ltol) * max(nl1.abc)
+        (nn_fcoords, nn_dists) = cell2.get_lattice_points(r / scale2)
+        lattice_points = (nn_fcoords, nn_dists * scale2)
+
+        #do permutations of vectors, check for equality
+        for nl in self._get_lattices(nl1, nl2, vol_tol, lattice_points):
             s2 = [nl.get_fractional_coords(c) for c in s2_cart]
             for coord in s2[0]:
                 t_s2 = [np.mod(coords - coord, 1) for coords in s2]
@@ -692,6 +705,28 @@ class StructureMatcher(MSONable):
         else:
             return stored_rms
 
+    def _get_prepared(self, structure):
+        """
+        Returns the _PreparedStructure for a structure. Structures are
+        immutable, so prepared structures are cached by identity in a small
+        LRU cache. This ensures that comparing one structure against many
+        others only reduces it once. Other structure-like objects (e.g.,
+        TransformedStructure) are prepared afresh every time.
+        """
+        if not isinstance(structure, Structure):
+            return _PreparedStructure(structure, self._comparator)
+        cache = self._prepared_cache
+        key = id(structure)
+        prepared = cache.pop(key, None)
+        #The cached entry holds a reference to the structure, so the id
+        #cannot have been reused by another object.
+        if prepared is None:
+            prepared = _PreparedStructure(structure, self._comparator)
+            if len(cache) >= PREPARED_CACHE_SIZE:
+                cache.popitem(last=False)
+        cache[key] = prepared
+        return prepared
+
     def find_indexes(self, s_list, group_list):
         """
         Given a list of structures, return list of indices where each
@@ -711,37 +746,178 @@ class StructureMatcher(MSONable):
                     break
         return inds
 
-    def group_structures(self, s_list):
+    def group_structures(self, s_list, ncpus=None, prefilter=True):
         """
         Given a list of structures, use fit to group
         them by structural equality.
 
+        Structures are first grouped by the comparator's structure hash.
+        Within each hash group, each structure is compared to the preceding
+        ones in turn and joins the group of the first structure it fits.
+        Pairs which cannot possibly fit according to cheap invariants (see
+        get_prefilter_data) are skipped without performing a full fit.
+
         Args:
             s_list:
                 List of structures to be grouped
+            ncpus:
+                Number of processes to use for the comparisons. Defaults to
+                None, which means serial processing.
+            prefilter:
+                Whether to skip pairs of structures using cheap invariants.
+                Defaults to True.
 
         Returns:
             A list of lists of matched structures
             Assumption: if s1=s2 and s2=s3, then s1=s3
             This may not be true for small tolerances.
         """
+        hashes = [self._comparator.get_structure_hash(s) for s in s_list]
         #Use structure hash to pre-group structures.
-        sorted_s_list = sorted(s_list, key=self._comparator.get_structure_hash)
-        all_groups = []
-
-        #For each pre-grouped list of structures, perform actual matching.
-        for k, g in itertools.groupby(sorted_s_list,
-                                      key=self._comparator.get_structure_hash):
-            g = list(g)
-            group_list = [[g[0]]]
-            for i, j in itertools.combinations(range(len(g)), 2):
-                s1_ind, s2_ind = self.find_indexes([g[i], g[j]], group_list)
-                if s2_ind == -1 and self.fit(g[i], g[j]):
-                    group_list[s1_ind].append(g[j])
-                elif (j - i) == 1 and s2_ind == -1:
-                    group_list.append([g[j]])
-            all_groups.extend(group_list)
-        return all_groups
+        hash_groups = [list(g) for k, g in itertools.groupby(
+            sorted(range(len(s_list)), key=lambda i: hashes[i]),
+            key=lambda i: hashes[i])]
+
+        pool = None
+        if ncpus:
+            pool = multiprocessing.Pool(ncpus, initializer=_init_worker,
+                                        initargs=(self, s_list))
+        try:
+            prefilter_data = None
+            if prefilter:
+                if pool:
+                    prefilter_data = pool.map(_get_prefilter_data,
+                                              range(len(s_list)))
+                else:
+                    prefilter_data = [self.get_prefilter_data(s)
+                                      for s in s_list]
+            all_groups = []
+            #For each pre-grouped list of structures, perform actual matching.
+            for g in hash_groups:
+                all_groups.extend(self._group_indices(s_list, g,
+                                                      prefilter_data, pool))
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+        return [[s_list[i] for i in group] for group in all_groups]
+
+    def _group_indices(self, s_list, inds, prefilter_data, pool):
+        """
+        Groups the structures s_list[i] for i in inds. Each round compares
+        one structure with all later structures which are still ungrouped.
+        The comparisons within a round are independent, and are distributed
+        over the pool if one is given. Structures are added to their group in
+        the order they are matched.
+        """
+        #Index of the group of each structure, or -1 if not grouped yet.
+        group_ids = [-1] * len(inds)
+        groups = []
+        for i in xrange(len(inds)):
+            if group_ids[i] == -1:
+                group_ids[i] = len(groups)
+                groups.append([inds[i]])
+            candidates = [j for j in xrange(i + 1, len(inds))
+                          if group_ids[j] == -1]
+            if prefilter_data is not None:
+                candidates = [j for j in candidates
+                              if self._may_fit(prefilter_data[inds[i]],
+                                               prefilter_data[inds[j]])]
+            pairs = [(inds[i], inds[j]) for j in candidates]
+            if pool and len(pairs) > 1:
+                fits = pool.map(_fit_pair, pairs)
+            else:
+                fits = [self.fit(s_list[m], s_list[n]) for (m, n) in pairs]
+            for (j, is_fit) in zip(candidates, fits):
+                if is_fit:
+                    group_ids[j] = group_ids[i]
+                    groups[group_ids[i]].append(inds[j])
+        return groups
+
+    def get_prefilter_data(self, structure):
+        """
+        Computes cheap invariants of a structure, which are used to skip
+        comparisons of structures that cannot possibly fit. Invariants are
+        computed for the structure as given, and also for the primitive
+        cell if primitive_cell is True, mirroring the cells which are
+        actually compared in fit.
+
+        Args:
+            structure:
+                A structure
+
+        Returns:
+            A dict of {"cell": invariants, "primitive": invariants}, with
+            the invariants being the number of sites, the volume per site,
+            the Niggli cell lengths and the sorted nearest neighbor
+            distances of all sites. Lengths and distances are normalized by
+            the volume if scale is True.
+        """
+        data = {"cell": self._get_cell_invariants(structure)}
+        if self._primitive_cell:
+            prim = self._get_prepared(structure).primitive
+            data["primitive"] = self._get_cell_invariants(prim) \
+                if prim.num_sites != structure.num_sites else data["cell"]
+        return data
+
+    def _get_cell_invariants(self, structure):
+        nsites = structure.num_sites
+        latt = structure.lattice.get_niggli_reduced_lattice()
+        vol = latt.volume
+        lengths = np.array(sorted(latt.abc))
+        norm = (vol / nsites) ** (1 / 3)
+        #Neighbors beyond this distance are irrelevant for the comparison,
+        #so the distances are simply capped.
+        r = 2 * norm
+        nn_dists = np.zeros(nsites) + r
+        (cind, nind, images, dists) = structure.get_neighbor_list(r)
+        order = np.lexsort((dists, cind))
+        (centers, first) = np.unique(cind[order], return_index=True)
+        nn_dists[centers] = dists[order][first]
+        nn_dists = np.sort(nn_dists)
+        if self._scale:
+            lengths /= vol ** (1 / 3)
+            nn_dists /= norm
+        return {"nsites": nsites, "volume": vol / nsites,
+                "lengths": lengths, "nn_dists": nn_dists}
+
+    def _may_fit(self, data1, data2):
+        """
+        Checks whether two structures may fit based on their prefilter data.
+        Only necessary conditions for fit are tested, with a margin for the
+        approximations involved.
+        """
+        if self._supercell:
+            return True
+        inv1 = data1["cell"]
+        inv2 = data2["cell"]
+        if inv1["nsites"] != inv2["nsites"]:
+            if not self._primitive_cell:
+                return False
+            inv1 = data1["primitive"]
+            inv2 = data2["primitive"]
+            if inv1["nsites"] != inv2["nsites"]:
+                return False
+        #The Niggli cell lengths are the successive minima of the lattice.
+        #The lattice vectors of struct2 which are matched to those of
+        #struct1 are no longer than (1 + ltol) times the latter.
+        if np.any(inv2["lengths"] > (1 + self.ltol) * inv1["lengths"] *
+                  (1 + 1e-4)):
+            return False
+        if not self._scale:
+            max_ratio = (1 + self.ltol) ** 3 * 1.5
+            if inv2["volume"] > max_ratio * inv1["volume"] or \
+                    inv1["volume"] > max_ratio * inv2["volume"]:
+                return False
+        #Each site moves by at most stol (normalized) and distances are
+        #strained by the lattice tolerances.
+        d1 = inv1["nn_dists"]
+        d2 = inv2["nn_dists"]
+        norm = 1 if self._scale else inv1["volume"] ** (1 / 3)
+        strain = self.ltol + np.radians(self.angle_tol)
+        tol = 1.1 * (2 * self.stol * norm +
+                     2 * strain * np.maximum(d1, d2))
+        return bool(np.all(np.abs(d1 - d2) <= tol))
 
     @property
     def to_dict(self):
@@ -832,4 +1008,111 @@ class StructureMatcher(MSONable):
         if min_rms is None or min_rms > self.stol:
             return None
         else:
-            return min_mapping
\ No newline at end of file
+            return min_mapping
+
+#Number of prepared structures cached by each StructureMatcher.
+PREPARED_CACHE_SIZE = 100
+
+
+class _PreparedStructure(object):
+    """
+    Holds the preprocessed forms of a structure used by StructureMatcher,
+    i.e., the primitive cell and the Niggli reduced cells with their sites
+    grouped by species. Everything is computed lazily and only once.
+    """
+
+    def __init__(self, structure, comparator):
+        self.structure = structure
+        self._comparator = comparator
+        self._primitive = None
+        self._reduced_cells = {}
+
+    @property
+    def primitive(self):
+        """
+        The primitive structure.
+        """
+        if self._primitive is None:
+            self._primitive = self.structure.get_primitive_structure()
+        return self._primitive
+
+    def get_reduced_cell(self, primitive=False):
+        """
+        Returns the _ReducedCell of the structure or of its primitive cell.
+        """
+        if primitive not in self._reduced_cells:
+            s = self.primitive if primitive else self.structure
+            self._reduced_cells[primitive] = _ReducedCell(
+                s.get_reduced_structure(reduction_algo="niggli"),
+                self._comparator)
+        return self._reduced_cells[primitive]
+
+
+class _ReducedCell(object):
+    """
+    Niggli reduced structure with its fractional and cartesian coordinates
+    grouped by species according to a comparator. The groups are sorted by
+    size (stable), so that the smallest group is first.
+    """
+
+    def __init__(self, structure, comparator):
+        self.structure = structure
+        self.lattice = structure.lattice
+        species_list = []
+        groups = []
+        for i, site in enumerate(structure):
+            found = False
+            for j, species in enumerate(species_list):
+                if comparator.are_equal(site.species_and_occu, species):
+                    found = True
+                    groups[j].append(i)
+                    break
+            if not found:
+                groups.append([i])
+                species_list.append(site.species_and_occu)
+
+        order = sorted(range(len(groups)), key=lambda j: len(groups[j]))
+        fcoords = structure.frac_coords
+        cart_coords = structure.cart_coords
+        self.species = [species_list[j] for j in order]
+        self.frac_coords = [fcoords[groups[j]] for j in order]
+        self.cart_coords = [cart_coords[groups[j]] for j in order]
+        self._lattice_points = None
+        self._lattice_points_radius = -1
+
+    def get_lattice_points(self, r):
+        """
+        Returns (fcoords, dists) of all lattice points within r of the
+        origin. Points are computed once for the largest radius requested.
+        """
+        if r > self._lattice_points_radius:
+            all_nn = get_points_in_sphere_pbc(self.lattice, [[0, 0, 0]],
+                                              [0, 0, 0], r)
+            self._lattice_points = (
+                np.array([np.array(c) for c in all_nn[:, 0]]),
+                all_nn[:, 1].astype(np.float))
+            self._lattice_points_radius = r
+        (fcoords, dists) = self._lattice_points
+        within_r = dists <= r
+        return fcoords[within_r], dists[within_r]
+
+
+#Structure matcher and structures used by the worker processes of
+#StructureMatcher.group_structures.
+_worker_data = {}
+
+
+def _init_worker(matcher, structures):
+    _worker_data["matcher"] = matcher
+    _worker_data["structures"] = structures
+
+
+def _fit_pair(pair):
+    structures = _worker_data["structures"]
+    return _worker_data["matcher"].fit(structures[pair[0]],
+                                       structures[pair[1]])
+
+
+def _get_prefilter_data(i):
+    return _worker_data["matcher"].get_prefilter_data(
+        _worker_data["structures"][i])
@@ -16,7 +16,7 @@ __date__ = "Jul 5, 2012"
 import itertools
 import logging
 
-from pymatgen.symmetry.finder import SymmetryFinder
+from pymatgen.symmetry.finder import get_symmetry_finders
 
 logger = logging.getLogger(__name__)
 
@@ -37,7 +37,7 @@ class SymmetryFitter(object):
         [[struct1, struct2,...], ...]
     """
 
-    def __init__(self, structures, spacegroup, symm_prec=0.1):
+    def __init__(self, structures, spacegroup, symm_prec=0.1, ncpus=None):
         """
         Args:
             structures:
@@ -46,13 +46,16 @@ class SymmetryFitter(object):
                 A spacegroup to test the structures.
             symm_prec:
                 The symmetry precision to test with.
+            ncpus:
+                Number of processes used to compute the spacegroups. Defaults
+                to None, which computes them serially.
         """
         structure_symm = {}
         self.symm_prec = symm_prec
         self.spacegroup = spacegroup
         logger.debug("Computing spacegroups...")
-        for i, s in enumerate(structures):
-            finder = SymmetryFinder(s, symm_prec)
+        finders = get_symmetry_finders(structures, symm_prec, ncpus=ncpus)
+        for i, (s, finder) in enumerate(zip(structures, finders)):
             structure_symm[s] = finder.get_spacegroup_number()
             logger.debug("Structure {} has spacegroup {}"
                          .format(i, structure_symm[s]))
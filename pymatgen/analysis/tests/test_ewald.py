@@ -45,6 +45,36 @@ class EwaldSummationTest(unittest.TestCase):
                                "Total space energy matrix incorrect!")
         #note that forces are not individually tested, but should work fine.
 
+        ham_e = EwaldSummation(s, energy_only=True)
+        self.assertAlmostEqual(ham_e.real_space_energy, -354.91294268, 4)
+        self.assertAlmostEqual(ham_e.reciprocal_space_energy, 25.475754801,
+                               4)
+        self.assertAlmostEqual(ham_e.total_energy, -1119.90102291, 2)
+        #Matrices and forces are computed on demand.
+        self.assertAlmostEqual(sum(sum(ham_e.total_energy_matrix)),
+                               -1119.90102291, 2)
+        self.assertAlmostEqual(sum(sum(abs(ham_e.forces))), 915.925354346, 4)
+
+        #Removing sites through charges, sub structures and partial energies
+        #gives identical results.
+        charges = np.array([site.specie.oxi_state for site in s])
+        configs = np.tile(charges, (3, 1))
+        configs[1, 0] = 0
+        configs[2, [0, 1]] = 0
+        energies = ham.compute_energies(configs)
+        self.assertAlmostEqual(energies[0], ham.total_energy, 4)
+        self.assertAlmostEqual(energies[1], ham.compute_partial_energy([0]),
+                               4)
+        self.assertAlmostEqual(energies[2],
+                               ham.compute_partial_energy([0, 1]), 4)
+        editor = StructureEditor(s)
+        editor.delete_sites([1, 0])
+        sub = editor.modified_structure
+        self.assertEqual(list(ham.get_site_indices(sub)), range(2, len(s)))
+        self.assertAlmostEqual(ham.compute_sub_structure(sub), energies[2], 4)
+        self.assertTrue(np.allclose(ham.compute_sub_structures([s, sub]),
+                                    [energies[0], energies[2]]))
+
         self.assertRaises(ValueError, EwaldSummation, original_s)
         #try sites with charge.
         charges = []
@@ -89,6 +119,35 @@ class EwaldMinimizerTest(unittest.TestCase):
                                "Returned wrong minimum value")
         self.assertEqual(len(e_min.best_m_list), 6,
                          "Returned wrong number of permutations")
+        self.assertTrue(e_min.completed)
+
+        e_min = EwaldMinimizer(matrix, m_list, 50, ncpus=2)
+        self.assertEqual(len(e_min.output_lists), 15)
+        self.assertAlmostEqual(e_min.minimized_sum, 111.63, 3)
+
+        #Stopping the search early still gives the best results found.
+        e_min = EwaldMinimizer(matrix, m_list, 50, max_nodes=10)
+        self.assertFalse(e_min.completed)
+        self.assertTrue(len(e_min.output_lists) < 15)
+        self.assertTrue(e_min.minimized_sum >= 111.63)
+
+    def test_parallel(self):
+        #A parallel search gives the results of the serial search.
+        np.random.seed(0)
+        m_list = [[.5, 5, range(0, 10), 'a'], [0, 2, range(10, 14), 'b']]
+        for _ in range(5):
+            matrix = np.random.randint(-5, 15, (14, 14)).astype(float)
+            for algo in [EwaldMinimizer.ALGO_FAST,
+                         EwaldMinimizer.ALGO_BEST_FIRST,
+                         EwaldMinimizer.ALGO_TIME_LIMIT]:
+                for num_to_return in [1, 3, 50]:
+                    serial = EwaldMinimizer(matrix, m_list, num_to_return,
+                                            algo)
+                    parallel = EwaldMinimizer(matrix, m_list, num_to_return,
+                                              algo, ncpus=2)
+                    self.assertEqual(
+                        [l[0] for l in parallel.output_lists],
+                        [l[0] for l in serial.output_lists])
 
 if __name__ == "__main__":
     unittest.main()
@@ -11,6 +11,7 @@ from pymatgen.core.structure_modifier import StructureEditor
 from pymatgen.core.structure_modifier import SupercellMaker
 from pymatgen.io.smartio import read_structure
 from pymatgen.core.structure import Structure
+from pymatgen.core.lattice import Lattice
 from pymatgen.core.composition import Composition
 
 test_dir = os.path.join(os.path.dirname(__file__), "..", "..", "..",
@@ -110,6 +111,49 @@ class StructureMatcherTest(unittest.TestCase):
 
         self.assertEqual(sm.find_indexes(self.struct_list, out),
                          [0, 0, 0, 1, 2, 3, 4, 0, 5, 6, 7, 8, 8, 9, 9, 10])
+        for kwargs in [{"prefilter": False}, {"ncpus": 2}]:
+            out = sm.group_structures(self.struct_list, **kwargs)
+            self.assertEqual(sm.find_indexes(self.struct_list, out),
+                             [0, 0, 0, 1, 2, 3, 4, 0, 5, 6, 7, 8, 8, 9, 9,
+                              10])
+
+    def test_group_order(self):
+        #s[2] only fits s[1], so it joins the group after s[3], which fits
+        #s[0].
+        s = [Structure(Lattice.cubic(a), ["Fe"], [[0, 0, 0]])
+             for a in [3.0, 3.2, 3.4, 3.05]]
+        sm = StructureMatcher(ltol=0.1, scale=False)
+        for kwargs in [{}, {"prefilter": False}, {"ncpus": 2}]:
+            out = sm.group_structures(s, **kwargs)
+            self.assertEqual(len(out), 1)
+            self.assertEqual([s.index(x) for x in out[0]], [0, 1, 3, 2])
+
+
+        sm = StructureMatcher()
+        data = [sm.get_prefilter_data(s) for s in self.struct_list]
+        self.assertEqual(data[0]["cell"]["nsites"], 12)
+        self.assertTrue(sm._may_fit(data[0], data[1]))
+        #Structures that fit are never filtered out.
+        for (i, j) in [(0, 1), (0, 7), (11, 12), (13, 14)]:
+            self.assertTrue(sm.fit(self.struct_list[i], self.struct_list[j]))
+            self.assertTrue(sm._may_fit(data[i], data[j]))
+        nfiltered = len([j for j in xrange(1, len(data))
+                         if not sm._may_fit(data[0], data[j])])
+        self.assertTrue(nfiltered > 0)
+
+    def test_prepared_cache(self):
+        sm = StructureMatcher()
+        s = self.struct_list[0]
+        prepared = sm._get_prepared(s)
+        self.assertIs(sm._get_prepared(s), prepared)
+        cell = prepared.get_reduced_cell()
+        self.assertEqual([len(f) for f in cell.frac_coords], [4, 8])
+        self.assertAlmostEqual(cell.lattice.volume, s.lattice.volume)
+        rms = [sm.get_rms_dist(s, s2) for s2 in self.struct_list]
+        #A fresh matcher without cached preprocessing gives the same result.
+        self.assertEqual(rms, [StructureMatcher().get_rms_dist(s, s2)
+                               for s2 in self.struct_list])
+        self.assertIs(sm._get_prepared(s), prepared)
 
     def test_mix(self):
         structures = []
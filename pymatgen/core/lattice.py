@@ -528,8 +528,9 @@ class Lattice(MSONable):
             Reduced lattice.
         """
         # Transpose the lattice matrix first so that basis vectors are columns.
-        # Makes life easier.
-        a = self._matrix.T
+        # Makes life easier. A copy is made so that this lattice is not
+        # modified in place.
+        a = self._matrix.copy().T
 
         b = np.zeros((3, 3))  # Vectors after the Gram-Schmidt process
         u = np.zeros((3, 3))  # Gram-Schmidt coeffieicnts
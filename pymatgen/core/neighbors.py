@@ -0,0 +1,278 @@
+#!/usr/bin/env python
+
+"""
+This module provides engines for finding all periodic images of a set of
+points that lie within a given radius of a set of centers. The engines return
+flat numpy arrays of (center index, point index, image, distance) so that
+callers can process neighbor lists in a vectorized manner and only construct
+Site objects when they are actually needed.
+"""
+
+from __future__ import division
+
+__author__ = "Shyue Ping Ong"
+__copyright__ = "Copyright 2013, The Materials Project"
+__version__ = "0.1"
+__maintainer__ = "Shyue Ping Ong"
+__email__ = "shyue@mit.edu"
+__date__ = "Apr 22, 2013"
+
+import abc
+import math
+import itertools
+
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+
+class NeighborFinder(object):
+    """
+    Abstract base class for neighbor finding engines. Implementations only
+    need to provide the _find_in_images method, which searches a flat array of
+    cartesian image coordinates for points within r of each center.
+    """
+    __metaclass__ = abc.ABCMeta
+
+    def find(self, lattice, frac_points, centers, r):
+        """
+        Find all periodic images of frac_points that lie within a distance r
+        of each center.
+
+        Args:
+            lattice:
+                The lattice/basis for the periodic boundary conditions.
+            frac_points:
+                Sequence of fractional coordinates of the points.
+            centers:
+                Sequence of cartesian coordinates of the sphere centers.
+            r:
+                Radius of spheres.
+
+        Returns:
+            (center_indices, point_indices, images, distances) as numpy
+            arrays. The image is expressed relative to the supplied
+            frac_points, i.e., the fractional coordinates of the neighbor are
+            frac_points[point_indices[k]] + images[k]. Results are sorted by
+            center index, then point index.
+        """
+        fcoords = np.array(frac_points, dtype=np.float64).reshape((-1, 3))
+        centers = np.array(centers, dtype=np.float64).reshape((-1, 3))
+        if len(fcoords) == 0 or len(centers) == 0:
+            return _empty_result()
+
+        #Work with points mapped into the unit cell and correct the image
+        #offsets at the end.
+        shifts = np.floor(fcoords)
+        fcoords = fcoords - shifts
+
+        images = get_images_for_sphere(lattice, centers, r)
+        #Only keep image points within the bounding box of all spheres.
+        shifted = fcoords[None, :, :] + images[:, None, :]
+        cart = lattice.get_cartesian_coords(shifted).reshape((-1, 3))
+        lower = np.min(centers, axis=0) - r
+        upper = np.max(centers, axis=0) + r
+        in_box = np.where(np.all((cart >= lower) & (cart <= upper),
+                                 axis=1))[0]
+        if len(in_box) == 0:
+            return _empty_result()
+
+        (cind, pind, dists) = self._find_in_images(cart[in_box], centers, r)
+        image_pts = in_box[pind]
+        npts = len(fcoords)
+        point_indices = image_pts % npts
+        found_images = images[image_pts // npts] - shifts[point_indices]
+
+        order = np.lexsort((found_images[:, 2], found_images[:, 1],
+                            found_images[:, 0], point_indices, cind))
+        return (cind[order], point_indices[order],
+                found_images[order].astype(np.int), dists[order])
+
+    @abc.abstractmethod
+    def _find_in_images(self, points, centers, r):
+        """
+        Find all points within r of each center.
+
+        Args:
+            points:
+                (n, 3) array of cartesian coords of the candidate points.
+            centers:
+                (m, 3) array of cartesian coords of the centers.
+            r:
+                Radius of spheres.
+
+        Returns:
+            (center_indices, point_indices, distances) as numpy arrays.
+        """
+        return
+
+
+class CellListNeighborFinder(NeighborFinder):
+    """
+    Neighbor finder based on linked-cell binning. Candidate points are binned
+    into cubic cells with edge length r, and each center only tests the
+    points in the 27 cells surrounding it. The bins are stored as a sorted
+    array of linearized cell keys, so the memory requirement scales with the
+    number of points rather than the volume of the bounding box.
+    """
+
+    def _find_in_images(self, points, centers, r):
+        origin = np.min(np.concatenate([points, centers]), axis=0)
+        #A lower bound on the cell size keeps the number of cells (and hence
+        #the linearized keys) bounded for very small radii.
+        cell_size = max(r, 0.1)
+        pcells = np.floor((points - origin) / cell_size).astype(np.int64)
+        ccells = np.floor((centers - origin) / cell_size).astype(np.int64)
+        ncells = np.max(np.concatenate([pcells, ccells]), axis=0) + 3
+
+        def get_keys(cells):
+            #Offset by 1 so that neighboring cells of the centers never go
+            #negative.
+            cells = cells + 1
+            return (cells[:, 0] * ncells[1] + cells[:, 1]) * ncells[2] + \
+                cells[:, 2]
+
+        pkeys = get_keys(pcells)
+        order = np.argsort(pkeys, kind="mergesort")
+        sorted_keys = pkeys[order]
+
+        all_cind = []
+        all_pind = []
+        for offset in itertools.product((-1, 0, 1), repeat=3):
+            keys = get_keys(ccells + np.array(offset))
+            start = np.searchsorted(sorted_keys, keys, side="left")
+            end = np.searchsorted(sorted_keys, keys, side="right")
+            counts = end - start
+            total = np.sum(counts)
+            if total == 0:
+                continue
+            cind = np.repeat(np.arange(len(centers)), counts)
+            #Position of each candidate within its own run of the bin.
+            run_starts = np.cumsum(counts) - counts
+            within = np.arange(total) - np.repeat(run_starts, counts)
+            all_cind.append(cind)
+            all_pind.append(order[np.repeat(start, counts) + within])
+
+        if not all_cind:
+            return _empty_pairs()
+        cind = np.concatenate(all_cind)
+        pind = np.concatenate(all_pind)
+        dists = np.sqrt(np.sum((points[pind] - centers[cind]) ** 2, axis=1))
+        within_r = dists <= r
+        return cind[within_r], pind[within_r], dists[within_r]
+
+
+class KDTreeNeighborFinder(NeighborFinder):
+    """
+    Neighbor finder based on scipy's cKDTree. This performs better than cell
+    lists for highly skewed cells, where the image points fill only a small
+    fraction of their cartesian bounding box. Requires scipy.
+    """
+
+    def __init__(self):
+        if cKDTree is None:
+            raise ImportError("KDTreeNeighborFinder requires scipy.")
+
+    def _find_in_images(self, points, centers, r):
+        tree = cKDTree(points)
+        results = tree.query_ball_point(centers, r)
+        counts = np.array([len(res) for res in results], dtype=np.int)
+        if np.sum(counts) == 0:
+            return _empty_pairs()
+        cind = np.repeat(np.arange(len(centers)), counts)
+        pind = np.array(list(itertools.chain(*results)), dtype=np.int)
+        dists = np.sqrt(np.sum((points[pind] - centers[cind]) ** 2, axis=1))
+        #query_ball_point uses a slightly fuzzy comparison.
+        within_r = dists <= r
+        return cind[within_r], pind[within_r], dists[within_r]
+
+
+#Above this ratio of bounding box volume to cell volume, the linked-cell
+#grid is mostly empty and a k-d tree is preferred.
+SKEWNESS_THRESHOLD = 5
+
+
+def get_neighbor_finder(lattice):
+    """
+    Returns the most appropriate neighbor finder for a lattice. Cell lists are
+    used by default, and a k-d tree is used for highly skewed cells if scipy
+    is available.
+
+    Args:
+        lattice:
+            Lattice to find neighbors in.
+
+    Returns:
+        A NeighborFinder.
+    """
+    if cKDTree is not None:
+        box_volume = np.prod(np.sum(np.abs(lattice.matrix), axis=0))
+        if box_volume > SKEWNESS_THRESHOLD * lattice.volume:
+            return KDTreeNeighborFinder()
+    return CellListNeighborFinder()
+
+
+def get_images_for_sphere(lattice, centers, r):
+    """
+    Returns all lattice translations needed so that the images of the unit
+    cell cover spheres of radius r around all centers. The number of
+    translations along each axis is determined from the interplanar spacings
+    (given by the reciprocal lattice), which handles skewed cells correctly.
+
+    Args:
+        lattice:
+            The lattice.
+        centers:
+            Cartesian coordinates of the sphere centers.
+        r:
+            Radius of spheres.
+
+    Returns:
+        (n, 3) integer array of images.
+    """
+    recp_len = np.array(lattice.reciprocal_lattice.abc)
+    nmax = (r + 0.15) * recp_len / (2 * math.pi)
+    pcoords = lattice.get_fractional_coords(np.atleast_2d(centers))
+    nmin = np.floor(np.min(pcoords, axis=0) - nmax).astype(np.int)
+    nmaxs = np.floor(np.max(pcoords, axis=0) + nmax).astype(np.int)
+    ranges = [np.arange(nmin[i], nmaxs[i] + 1) for i in xrange(3)]
+    return np.array(list(itertools.product(*ranges)), dtype=np.int)
+
+
+def find_neighbors(lattice, frac_points, centers, r, finder=None):
+    """
+    Convenience function to find all periodic images of frac_points within a
+    sphere of radius r around each center. See NeighborFinder.find for
+    details.
+
+    Args:
+        lattice:
+            The lattice/basis for the periodic boundary conditions.
+        frac_points:
+            Sequence of fractional coordinates of the points.
+        centers:
+            Sequence of cartesian coordinates of the sphere centers.
+        r:
+            Radius of spheres.
+        finder:
+            NeighborFinder to use. Defaults to None, which means an
+            appropriate finder is selected using get_neighbor_finder.
+
+    Returns:
+        (center_indices, point_indices, images, distances) as numpy arrays.
+    """
+    finder = finder if finder else get_neighbor_finder(lattice)
+    return finder.find(lattice, frac_points, centers, r)
+
+
+def _empty_pairs():
+    return (np.zeros(0, dtype=np.int), np.zeros(0, dtype=np.int),
+            np.zeros(0))
+
+
+def _empty_result():
+    return (np.zeros(0, dtype=np.int), np.zeros(0, dtype=np.int),
+            np.zeros((0, 3), dtype=np.int), np.zeros(0))
@@ -702,6 +702,11 @@ class Specie(MSONable):
         except:
             raise AttributeError(a)
 
+    def __getnewargs__(self):
+        #function used by pickle to recreate object
+        return (self._el.symbol, self._oxi_state,
+                self._properties if self._properties else None)
+
     def __eq__(self, other):
         """
         Specie is equal to other only if element and oxidation states are
@@ -914,6 +919,11 @@ class DummySpecie(MSONable):
         except:
             raise AttributeError(a)
 
+    def __getnewargs__(self):
+        #function used by pickle to recreate object
+        return (self._symbol, self._oxi_state,
+                self._properties if self._properties else None)
+
     def __eq__(self, other):
         """
         Specie is equal to other only if element and oxidation states are
@@ -55,7 +55,14 @@ class Site(collections.Mapping, collections.Hashable, MSONable):
                 Properties associated with the site as a dict, e.g.
                 {"magmom": 5}. Defaults to None.
         """
-        if issubclass(atoms_n_occu.__class__, collections.Mapping):
+        if isinstance(atoms_n_occu, Composition):
+            #Compositions are immutable and can be shared between sites.
+            self._species = atoms_n_occu
+            totaloccu = self._species.num_atoms
+            if totaloccu > 1:
+                raise ValueError("Species occupancies sum to more than 1!")
+            self._is_ordered = (totaloccu == 1 and len(self._species) == 1)
+        elif issubclass(atoms_n_occu.__class__, collections.Mapping):
             self._species = Composition({smart_element_or_specie(k): v
                                          for k, v in atoms_n_occu.items()})
             totaloccu = self._species.num_atoms
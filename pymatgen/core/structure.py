@@ -19,17 +19,21 @@ import abc
 import math
 import collections
 import itertools
+from fractions import gcd
 
 import numpy as np
 
 from pymatgen.core.lattice import Lattice
-from pymatgen.core.periodic_table import Element, Specie
+from pymatgen.core.periodic_table import Element, Specie, \
+    smart_element_or_specie
 from pymatgen.serializers.json_coders import MSONable
 from pymatgen.core.sites import Site, PeriodicSite
 from pymatgen.core.bonds import CovalentBond
 from pymatgen.core.physical_constants import AMU_TO_KG
 from pymatgen.core.composition import Composition
-from pymatgen.util.coord_utils import get_points_in_sphere_pbc
+from pymatgen.core.neighbors import find_neighbors
+from pymatgen.util.coord_utils import pbc_all_distances, find_pbc_matches
+from pymatgen.util.num_utils import hermite_normal_form
 
 
 class SiteCollection(collections.Sequence, collections.Hashable):
@@ -324,16 +328,38 @@ class Structure(SiteCollection, MSONable):
         else:
             self._lattice = Lattice(lattice)
 
-        sites = []
-        for i in xrange(len(species)):
-            prop = None
-            if site_properties:
-                prop = {k: v[i] for k, v in site_properties.items()}
-            sites.append(PeriodicSite(species[i], coords[i],
-                                      self._lattice, to_unit_cell,
-                                      coords_are_cartesian,
-                                      properties=prop))
-        self._sites = tuple(sites)
+        # Sites are stored in columnar form, i.e., as an array of fractional
+        # coords, an array of indices into a table of unique species and a
+        # table of site properties. PeriodicSite objects are only created
+        # when they are requested.
+        if coords_are_cartesian:
+            fcoords = self._lattice.get_fractional_coords(
+                np.reshape(coords, (-1, 3)))
+        else:
+            fcoords = _to_coords_array(coords)
+        if to_unit_cell:
+            fcoords = np.mod(fcoords, 1)
+        fcoords.flags.writeable = False
+        self._frac_coords = fcoords
+        self._cart_coords = None
+
+        (self._species_table, self._species_indices) = \
+            _get_species_table(species)
+
+        props = {}
+        if site_properties:
+            for k, v in site_properties.items():
+                if k not in Site.supported_properties:
+                    raise ValueError("{} is not a supported property"
+                                     .format(k))
+                props[k] = list(v)
+        self._site_properties = props
+        self._site_cache = [None] * len(fcoords)
+        self._distance_matrix = None
+        self._primitive_structures = {}
+        #Site permutations of symmetry operations, cached by SymmetryFinder.
+        self._site_permutations = {}
+
         if validate_proximity and not self.is_valid():
             raise StructureError(("Structure contains sites that are ",
                                   "less than 0.01 Angstrom apart!"))
@@ -361,12 +387,41 @@ class Structure(SiteCollection, MSONable):
                          [site.frac_coords for site in sites],
                          site_properties=props)
 
+    def _get_site(self, i):
+        """
+        Returns the PeriodicSite at index i, creating and caching it on first
+        access. The site is created from the read-only row of the
+        structure's fractional coords without copying it, while its
+        frac_coords property still returns a copy.
+        """
+        site = self._site_cache[i]
+        if site is None:
+            props = {k: v[i] for k, v in self._site_properties.items()}
+            site = PeriodicSite(
+                self._species_table[self._species_indices[i]],
+                self._frac_coords[i], self._lattice, properties=props)
+            self._site_cache[i] = site
+        return site
+
     @property
     def sites(self):
         """
-        Returns an iterator for the sites in the Structure.
+        Returns a tuple of the sites in the Structure.
         """
-        return self._sites
+        return tuple(self._get_site(i) for i in xrange(len(self)))
+
+    def __getitem__(self, ind):
+        if isinstance(ind, slice):
+            return tuple(self._get_site(i)
+                         for i in xrange(*ind.indices(len(self))))
+        return self._get_site(ind)
+
+    def __iter__(self):
+        for i in xrange(len(self)):
+            yield self._get_site(i)
+
+    def __len__(self):
+        return len(self._frac_coords)
 
     @property
     def lattice(self):
@@ -420,9 +475,80 @@ class Structure(SiteCollection, MSONable):
     @property
     def frac_coords(self):
         """
-        Returns the fractional coordinates.
+        Returns the fractional coordinates as a read-only (n, 3) numpy array.
+        """
+        return self._frac_coords
+
+    @property
+    def cart_coords(self):
+        """
+        Returns the cartesian coordinates as a read-only (n, 3) numpy array.
+        """
+        if self._cart_coords is None:
+            cart_coords = self._lattice.get_cartesian_coords(
+                self._frac_coords)
+            cart_coords.flags.writeable = False
+            self._cart_coords = cart_coords
+        return self._cart_coords
+
+    @property
+    def distance_matrix(self):
         """
-        return [site.frac_coords for site in self._sites]
+        Returns the distance matrix between all sites in the structure, using
+        the minimum image distance. The matrix is computed in a vectorized
+        manner on first access and cached, since structures are immutable.
+        The returned array is read-only.
+        """
+        if self._distance_matrix is None:
+            dmatrix = pbc_all_distances(self._lattice, self._frac_coords,
+                                        self._frac_coords)
+            np.fill_diagonal(dmatrix, 0)
+            dmatrix.flags.writeable = False
+            self._distance_matrix = dmatrix
+        return self._distance_matrix
+
+    @property
+    def species_and_occu(self):
+        """
+        List of species and occupancies at each site of the structure.
+        """
+        table = self._species_table
+        return [table[i] for i in self._species_indices]
+
+    @property
+    def site_properties(self):
+        """
+        Returns the site properties as a dict of sequences. E.g.,
+        {"magmom": (5,-5), "charge": (-4,4)}.
+        """
+        props = collections.defaultdict(list)
+        for k, v in self._site_properties.items():
+            props[k] = list(v)
+        return props
+
+    @property
+    def composition(self):
+        """
+        Returns the composition
+        """
+        elmap = collections.defaultdict(float)
+        if len(self) == 0:
+            return Composition(elmap)
+        counts = np.bincount(self._species_indices,
+                             minlength=len(self._species_table))
+        for comp, count in zip(self._species_table, counts):
+            for species, occu in comp.items():
+                elmap[species] += occu * count
+        return Composition(elmap)
+
+    @property
+    def is_ordered(self):
+        """
+        Checks if structure is ordered, meaning no partial occupancies in any
+        of the sites.
+        """
+        return all((comp.num_atoms == 1 and len(comp) == 1
+                    for comp in self._species_table))
 
     @property
     def volume(self):
@@ -455,22 +581,61 @@ class Structure(SiteCollection, MSONable):
         """
         return self[i].distance(self[j], jimage)
 
-    def get_sites_in_sphere(self, pt, r, include_index=False):
+    def get_neighbor_list(self, r, sites=None, finder=None):
         """
-        Find all sites within a sphere from the point. This includes sites
-        in other periodic images.
+        Get neighbor lists as flat arrays for a set of sites, out to a
+        distance r. This does not construct any site objects and is the
+        preferred method for analyses over all sites of large structures.
+        Neighbors at zero distance (i.e., the site itself) are excluded.
 
-        Algorithm:
-
-        1. place sphere of radius r in crystal and determine minimum supercell
-           (parallelpiped) which would contain a sphere of radius r. for this
-           we need the projection of a_1 on a unit vector perpendicular
-           to a_2 & a_3 (i.e. the unit vector in the direction b_1) to
-           determine how many a_1"s it will take to contain the sphere.
+        Args:
+            r:
+                radius of sphere.
+            sites:
+                Sites to find neighbors for. Defaults to None, which means
+                all sites in the structure.
+            finder:
+                NeighborFinder from pymatgen.core.neighbors to use. Defaults
+                to None, which means an appropriate finder is selected
+                automatically.
 
-           Nxmax = r * length_of_b_1 / (2 Pi)
+        Returns:
+            (center_indices, neighbor_indices, images, distances) as numpy
+            arrays. center_indices are the indices of the centers in sites,
+            neighbor_indices are the indices of the neighbors in the
+            structure, and images are the lattice translations of the
+            neighbors, i.e., the fractional coordinates of the k-th neighbor
+            are self[neighbor_indices[k]].frac_coords + images[k].
+        """
+        centers = self.cart_coords if sites is None \
+            else [site.coords for site in sites]
+        (cind, nind, images, dists) = find_neighbors(
+            self._lattice, self.frac_coords, centers, r, finder=finder)
+        not_self = dists > 1e-8
+        return (cind[not_self], nind[not_self], images[not_self],
+                dists[not_self])
+
+    def _make_image_sites(self, indices, images, fcoords=None):
+        """
+        Creates the PeriodicSites at specific images of sites in the
+        structure.
+        """
+        fcoords = self._frac_coords if fcoords is None else fcoords
+        latt = self._lattice
+        table = self._species_table
+        sp_indices = self._species_indices
+        props = self._site_properties
+        return [PeriodicSite(table[sp_indices[i]], fcoords[i] + image,
+                             latt, properties={k: v[i]
+                                               for k, v in props.items()})
+                for i, image in zip(indices, images)]
 
-        2. keep points falling within r.
+    def get_sites_in_sphere(self, pt, r, include_index=False):
+        """
+        Find all sites within a sphere from the point. This includes sites
+        in other periodic images. The search is performed by a neighbor
+        finding engine from pymatgen.core.neighbors, which scales linearly
+        with the number of sites.
 
         Args:
             pt:
@@ -486,15 +651,12 @@ class Structure(SiteCollection, MSONable):
             requires the distance.
         """
         site_fcoords = np.mod(self.frac_coords, 1)
-        neighbors = []
-        for fcoord, dist, i in get_points_in_sphere_pbc(self._lattice,
-                                                        site_fcoords, pt, r):
-            nnsite = PeriodicSite(self[i].species_and_occu,
-                                  fcoord, self._lattice,
-                                  properties=self[i].properties)
-            neighbors.append((nnsite, dist) if not include_index
-                             else (nnsite, dist, i))
-        return neighbors
+        (cind, inds, images, dists) = find_neighbors(self._lattice,
+                                                     site_fcoords, [pt], r)
+        nnsites = self._make_image_sites(inds, images, site_fcoords)
+        if include_index:
+            return zip(nnsites, dists, inds)
+        return zip(nnsites, dists)
 
     def get_neighbors(self, site, r, include_index=False):
         """
@@ -524,10 +686,9 @@ class Structure(SiteCollection, MSONable):
         Returns a list of list of neighbors for each site in structure.
         Use this method if you are planning on looping over all sites in the
         crystal. If you only want neighbors for a particular site, use the
-        method get_neighbors as it may not have to build such a large supercell
-        However if you are looping over all sites in the crystal, this method
-        is more efficient since it only performs one pass over a large enough
-        supercell to contain all possible atoms out to a distance r.
+        method get_neighbors. If you do not need the neighbors as site
+        objects, use get_neighbor_list, which returns flat arrays and is
+        much faster.
         The return type is a [(site, dist) ...] since most of the time,
         subsequent processing requires the distance.
 
@@ -546,49 +707,17 @@ class Structure(SiteCollection, MSONable):
             structure. This is needed for ewaldmatrix by keeping track of which
             sites contribute to the ewald sum.
         """
-
-        # Use same algorithm as get_sites_in_sphere to determine supercell but
-        # loop over all atoms in crystal
-        recp_len = self.lattice.reciprocal_lattice.abc
-        sr = r + 0.15
-        nmax = [sr * l / (2 * math.pi) for l in recp_len]
-        site_nminmax = []
-        floor = math.floor
-        for site in self:
-            pcoords = site.frac_coords
-            inmax = [int(floor(pcoords[i] + nmax[i])) for i in xrange(3)]
-            inmin = [int(floor(pcoords[i] - nmax[i])) for i in xrange(3)]
-            site_nminmax.append(zip(inmin, inmax))
-
-        nmin = [min([i[j][0] for i in site_nminmax]) for j in xrange(3)]
-        nmax = [max([i[j][1] for i in site_nminmax]) for j in xrange(3)]
-
-        all_ranges = [range(nmin[i], nmax[i] + 1) for i in xrange(3)]
-
-        neighbors = [list() for i in xrange(len(self._sites))]
-        all_fcoords = np.mod(self.frac_coords, 1)
-
-        site_coords = np.array(self.cart_coords)
-        latt = self._lattice
-        frac_2_cart = latt.get_cartesian_coords
-        n = len(self)
-        indices = np.array(range(n))
-        for image in itertools.product(*all_ranges):
-            for (j, fcoord) in enumerate(all_fcoords):
-                fcoords = fcoord + image
-                coords = frac_2_cart(fcoords)
-                submat = np.tile(coords, (n, 1))
-                dists = (site_coords - submat) ** 2
-                dists = np.sqrt(dists.sum(axis=1))
-                withindists = (dists <= r) * (dists > 1e-8)
-                sp = self[j].species_and_occu
-                props = self[j].properties
-                for i in indices[withindists]:
-                    nnsite = PeriodicSite(sp, fcoords, latt,
-                                          properties=props)
-                    item = (nnsite, dists[i], j) if include_index else (
-                        nnsite, dists[i])
-                    neighbors[i].append(item)
+        (cind, nind, images, dists) = self.get_neighbor_list(r)
+        #Materialize images relative to the sites in the unit cell.
+        fcoords = self._frac_coords
+        images = images + np.floor(fcoords)[nind]
+        nnsites = self._make_image_sites(nind, images,
+                                         fcoords - np.floor(fcoords))
+        neighbors = [list() for i in xrange(len(self))]
+        for k, i in enumerate(cind):
+            item = (nnsites[k], dists[k], nind[k]) if include_index else (
+                nnsites[k], dists[k])
+            neighbors[i].append(item)
         return neighbors
 
     def get_neighbors_in_shell(self, origin, r, dr):
@@ -608,9 +737,13 @@ class Structure(SiteCollection, MSONable):
             [(site, dist) ...] since most of the time, subsequent processing
             requires the distance.
         """
-        outer = self.get_sites_in_sphere(origin, r + dr)
-        inner = r - dr
-        return [(site, dist) for (site, dist) in outer if dist > inner]
+        site_fcoords = np.mod(self.frac_coords, 1)
+        (cind, inds, images, dists) = find_neighbors(
+            self._lattice, site_fcoords, [origin], r + dr)
+        in_shell = dists > r - dr
+        nnsites = self._make_image_sites(inds[in_shell], images[in_shell],
+                                         site_fcoords)
+        return zip(nnsites, dists[in_shell])
 
     def get_sorted_structure(self):
         """
@@ -666,10 +799,9 @@ class Structure(SiteCollection, MSONable):
         if site_properties:
             props.update(site_properties)
         if not sanitize:
-            return Structure(self._lattice,
-                             [site.species_and_occu for site in self],
-                             [site.frac_coords for site in self],
-                             site_properties=props)
+            # The coords array is immutable and is shared with the copy.
+            return Structure(self._lattice, self.species_and_occu,
+                             self._frac_coords, site_properties=props)
         else:
             reduced_latt = self._lattice.get_lll_reduced_lattice()
             new_sites = []
@@ -710,156 +842,172 @@ class Structure(SiteCollection, MSONable):
             raise ValueError("Structures with different lattices!")
 
         #Check that both structures have the same species
-        for i in range(0, len(self)):
-            if self[i].species_and_occu != end_structure[i].species_and_occu:
-                raise ValueError("Different species!\nStructure 1:\n" +
-                                 str(self) + "\nStructure 2\n" +
-                                 str(end_structure))
+        species = self.species_and_occu
+        if species != end_structure.species_and_occu:
+            raise ValueError("Different species!\nStructure 1:\n" +
+                             str(self) + "\nStructure 2\n" +
+                             str(end_structure))
 
-        start_coords = np.array(self.frac_coords)
+        start_coords = self.frac_coords
         end_coords = np.array(end_structure.frac_coords)
 
         vec = end_coords - start_coords
-        structs = [Structure(self.lattice,
-                             [site.species_and_occu for site in self._sites],
+        props = self.site_properties
+        structs = [Structure(self.lattice, species,
                              start_coords + float(x) / float(nimages) * vec,
-                             site_properties=self.site_properties)
+                             site_properties=props)
                    for x in range(0, nimages + 1)]
         return structs
 
-    def get_primitive_structure(self, tolerance=0.25):
+    def get_primitive_structure(self, tolerance=0.25, use_symmetry=False):
         """
-        This finds a smaller unit cell than the input. Sometimes it doesn"t
-        find the smallest possible one, so this method is recursively called
-        until it is unable to find a smaller cell.
+        This finds a smaller unit cell than the input by finding all pure
+        translations that map the structure onto itself.
 
-        The method works by finding possible smaller translations
-        and then using that translational symmetry instead of one of the
-        lattice basis vectors if more than one vector is found (usually the
-        case for large cells) the one with the smallest norm is used.
-
-        Things are done in fractional coordinates because its easier to
-        translate back to the unit cell.
+        The candidate translations are the vectors from one site of the
+        least abundant species to all other sites of that species. All
+        candidates are tested in a single batched pass, in which the
+        translated coordinates of all sites are matched against the
+        original coordinates (see find_pbc_matches). The valid
+        translations, together with the original lattice vectors, generate
+        the lattice of the primitive cell. The result is cached on the
+        structure, so repeated calls are cheap.
 
         NOTE: if the tolerance is greater than 1/2 the minimum inter-site
         distance, the algorithm may find 2 non-equivalent sites that are
-        within tolerance of each other. The algorithm will reject this
-        lattice.
+        within tolerance of each other. The algorithm will reject such
+        translations.
 
         Args:
             tolerance:
                 Tolerance for each coordinate of a particular site. For
                 example, [0.5, 0, 0.5] in cartesian coordinates will be
                 considered to be on the same coordinates as [0, 0, 0] for a
-                tolerance of 0.5. Defaults to 0.5.
+                tolerance of 0.5. Defaults to 0.25.
+            use_symmetry:
+                If True, the primitive cell is found by spglib via
+                SymmetryFinder.find_primitive, with the tolerance used as
+                the symprec. Only ordered structures are supported. Defaults
+                to False.
 
         Returns:
             The most primitive structure found. The returned structure is
             guaranteed to have len(new structure) <= len(structure).
         """
-        original_volume = self.volume
-        (reduced_formula, num_fu) =\
-            self.composition.get_reduced_composition_and_factor()
-
-        min_vol = original_volume * 0.5 / num_fu
-
-        #get the possible symmetry vectors
-        sites = sorted(self._sites, key=lambda site: site.species_string)
-        grouped_sites = [list(a[1]) for a
-                         in itertools.groupby(sites,
-                                              key=lambda s: s.species_string)]
-        min_site_list = min(grouped_sites, key=lambda group: len(group))
-
-        min_site_list = [site.to_unit_cell for site in min_site_list]
-        org = min_site_list[0].coords
-        possible_vectors = [min_site_list[i].coords - org
-                            for i in xrange(1, len(min_site_list))]
-
-        #Let's try to use the shortest vector possible first. Allows for faster
-        #convergence to primitive cell.
-        possible_vectors = sorted(possible_vectors,
-                                  key=lambda x: np.linalg.norm(x))
-
-        # Pre-create a few varibles for faster lookup.
-        all_coords = [site.coords for site in sites]
-        all_sp = [site.species_and_occu for site in sites]
-        new_structure = None
-
-        #all lattice points need to be projected to 0 under new basis
-        l_points = np.array([[0, 0, 1], [0, 1, 0], [0, 1, 1], [1, 0, 0],
-                             [1, 0, 1], [1, 1, 0], [1, 1, 1]])
-        l_points = self._lattice.get_cartesian_coords(l_points)
-
-        for v, repl_pos in itertools.product(possible_vectors, xrange(3)):
-            #Try combinations of new lattice vectors with existing lattice
-            #vectors.
-            latt = self._lattice.matrix
-            latt[repl_pos] = v
-
-            #Exclude coplanar lattices from consideration.
-            if abs(np.dot(np.cross(latt[0], latt[1]), latt[2])) < min_vol:
-                continue
-            latt = Lattice(latt)
-
-            #Convert to fractional tol
-            tol = tolerance / np.array(latt.abc)
-
-            #check validity of new basis
-            new_l_points = latt.get_fractional_coords(l_points)
-            f_l_dist = np.abs(new_l_points - np.round(new_l_points))
-            if np.any(f_l_dist > tol[None, None, :]):
-                continue
-
-            all_frac = latt.get_fractional_coords(np.array(all_coords))
-
-            #calculate grouping of equivalent sites, represented by
-            #adjacency matrix
-            fdist = all_frac[None, :, :] - all_frac[:, None, :]
-            fdist = np.abs(fdist - np.round(fdist))
-            groups = np.all(fdist < tol[None, None, :], axis=2)
+        key = (tolerance, use_symmetry)
+        if key not in self._primitive_structures:
+            if use_symmetry:
+                from pymatgen.symmetry.finder import SymmetryFinder
+                prim = SymmetryFinder(self, symprec=tolerance)\
+                    .find_primitive()
+                if prim is None or len(prim) >= len(self):
+                    prim = self
+            else:
+                prim = self._find_primitive(tolerance)
+            if prim is not self:
+                prim._primitive_structures[key] = prim
+            self._primitive_structures[key] = prim
+        return self._primitive_structures[key]
+
+    def _find_primitive(self, tolerance):
+        """
+        Batched primitive cell finder used by get_primitive_structure.
+        """
+        nsites = len(self)
+        sp_inds = self._species_indices
+        counts = np.bincount(sp_inds)
+        present = np.where(counts > 0)[0]
+        if nsites < 2 or reduce(gcd, counts[present]) == 1:
+            return self
 
-            #check that all group sizes are the same
-            sizes = np.unique(np.sum(groups, axis=0))
-            if len(sizes) > 1:
-                continue
+        fcoords = np.mod(self._frac_coords, 1)
+        min_sp = present[np.argmin(counts[present])]
+        min_sites = np.where(sp_inds == min_sp)[0]
+        trans = fcoords[min_sites[1:]] - fcoords[min_sites[0]]
+        trans -= np.round(trans)
+        tol = tolerance / np.array(self._lattice.abc)
+
+        def get_valid(site_inds):
+            #Matches the translated coordinates of the sites against the
+            #original coordinates for all candidates at once. Each site is
+            #mapped to the nearest matching site of the same species, and a
+            #candidate is valid if this mapping is one-to-one.
+            nsub = len(site_inds)
+            shifted = (fcoords[None, site_inds, :] +
+                       trans[:, None, :]).reshape((-1, 3))
+            (inds1, inds2) = find_pbc_matches(shifted, fcoords, tol)
+            same_sp = sp_inds[site_inds[inds1 % nsub]] == sp_inds[inds2]
+            (inds1, inds2) = (inds1[same_sp], inds2[same_sp])
+            fdist = fcoords[inds2] - shifted[inds1]
+            fdist -= np.round(fdist)
+            dists = np.sum(self._lattice.get_cartesian_coords(fdist) ** 2,
+                           axis=1)
+            nearest = np.lexsort((dists, inds1))
+            (inds1, first) = np.unique(inds1[nearest], return_index=True)
+            inds2 = inds2[nearest][first]
+            cands = inds1 // nsub
+            ntargets = np.bincount(
+                np.unique(cands * nsites + inds2) // nsites,
+                minlength=len(trans))
+            valid = ntargets == nsub
+            return (valid, inds1, inds2)
+
+        #The sites of the least abundant species are a cheap first filter.
+        trans = trans[get_valid(min_sites)[0]]
+        if len(trans) == 0:
+            return self
+        (valid, inds1, inds2) = get_valid(np.arange(nsites))
+        if not np.any(valid):
+            return self
+        ntrans = len(trans)
+
+        #Each valid translation is a permutation of the sites. Noise in the
+        #coordinates may cause some combinations of valid translations to
+        #fall outside the tolerance, so only a subgroup that is closed under
+        #composition is used.
+        mappings = -np.ones(ntrans * nsites, dtype=np.int)
+        mappings[inds1] = inds2
+        mappings = mappings.reshape((ntrans, nsites))[valid]
+        norms = np.sum(self._lattice.get_cartesian_coords(trans[valid]) ** 2,
+                       axis=1)
+        group = _get_translation_group(mappings[np.argsort(norms)],
+                                       min_sites[0])
+        order = len(group)
+        if order < 2 or nsites % order != 0:
+            return self
 
-            #check that reduction in number of sites was by the same
-            #amount as the volume reduction
-            if round(self._lattice.volume / latt.volume) != sizes[0]:
-                continue
+        #Each orbit contains exactly one image of a site under each
+        #translation.
+        reps = np.min(group, axis=0)
+        rep_sites = np.unique(reps)
+        if len(rep_sites) != nsites // order or \
+                np.any(np.bincount(reps)[rep_sites] != order):
+            return self
 
-            new_sp = []
-            new_frac = []
-            #this flag is set to ensure that all sites in a group are
-            #the same species, it is set to false if a group is found
-            #where this is not the case
-            correct = True
-
-            added = np.zeros(len(groups), dtype='bool')
-            for i, g in enumerate(groups):
-                if added[i]:
-                    continue
-                indices = np.where(g)[0]
-                i0 = indices[0]
-                sp = all_sp[i0]
-                added[indices] = 1
-                if not all([all_sp[i] == sp for i in indices]):
-                    correct = False
-                    break
-                new_sp.append(all_sp[i0])
-                new_frac.append(all_frac[i0])
-
-            if correct:
-                new_structure = Structure(latt, new_sp, new_frac,
-                                          to_unit_cell=True)
-                break
-
-        if new_structure and len(new_structure) != len(self):
-            # If a more primitive structure has been found, try to find an
-            # even more primitive structure again.
-            return new_structure.get_primitive_structure(tolerance=tolerance)
-        else:
+        #The translations are multiples of 1 / order, so the lattice they
+        #generate together with the original lattice vectors is found
+        #exactly using integer arithmetic.
+        trans = fcoords[group[:, min_sites[0]]] - fcoords[min_sites[0]]
+        gens = np.concatenate([np.round(trans * order), np.eye(3) * order])
+        try:
+            hnf = hermite_normal_form(gens)
+        except ValueError:
+            return self
+        if int(round(abs(np.linalg.det(hnf)))) != order ** 2:
             return self
+        latt = Lattice(np.dot(hnf / order, self._lattice.matrix))
+        latt = latt.get_lll_reduced_lattice()
+        if np.linalg.det(latt.matrix) < 0:
+            latt = Lattice(-latt.matrix)
+
+        rep_sites = sorted(rep_sites, key=lambda i: self[i].species_string)
+        props = {k: [v[i] for i in rep_sites]
+                 for k, v in self._site_properties.items()}
+        return Structure(latt, [self._species_table[sp_inds[i]]
+                                for i in rep_sites],
+                         self.cart_coords[rep_sites], to_unit_cell=True,
+                         coords_are_cartesian=True,
+                         site_properties=props if props else None)
 
     def __repr__(self):
         outs = ["Structure Summary", repr(self.lattice)]
@@ -891,12 +1039,27 @@ class Structure(SiteCollection, MSONable):
         d = {"@module": self.__class__.__module__,
              "@class": self.__class__.__name__,
              "lattice": self._lattice.to_dict, "sites": []}
-        for site in self:
-            site_dict = site.to_dict
-            del site_dict["lattice"]
-            del site_dict["@module"]
-            del site_dict["@class"]
-            d["sites"].append(site_dict)
+        #The species representations only need to be generated once for each
+        #unique species.
+        labels = []
+        species_lists = []
+        for comp in self._species_table:
+            labels.append(Site(comp, [0, 0, 0]).species_string)
+            species_list = []
+            for spec, occu in comp.items():
+                sp_dict = spec.to_dict
+                sp_dict["occu"] = occu
+                species_list.append(sp_dict)
+            species_lists.append(species_list)
+        props = self._site_properties
+        for i, (fcoords, coords) in enumerate(zip(self._frac_coords.tolist(),
+                                                  self.cart_coords.tolist())):
+            j = self._species_indices[i]
+            d["sites"].append({
+                "label": labels[j],
+                "species": [dict(sp_dict) for sp_dict in species_lists[j]],
+                "xyz": coords, "abc": fcoords,
+                "properties": {k: v[i] for k, v in props.items()}})
         return d
 
     @staticmethod
@@ -913,8 +1076,19 @@ class Structure(SiteCollection, MSONable):
             Structure object
         """
         lattice = Lattice.from_dict(d["lattice"])
-        sites = [PeriodicSite.from_dict(sd, lattice) for sd in d["sites"]]
-        return Structure.from_sites(sites)
+        species = []
+        coords = []
+        props = collections.defaultdict(list)
+        for site_dict in d["sites"]:
+            species.append({Specie.from_dict(sp)
+                            if "oxidation_state" in sp else
+                            Element(sp["element"]): sp["occu"]
+                            for sp in site_dict["species"]})
+            coords.append(site_dict["abc"])
+            siteprops = site_dict.get("properties", {})
+            for k, v in siteprops.items():
+                props[k].append(v)
+        return Structure(lattice, species, coords, site_properties=props)
 
 
 class Molecule(SiteCollection, MSONable):
@@ -970,6 +1144,7 @@ class Molecule(SiteCollection, MSONable):
             sites.append(Site(species[i], coords[i], properties=prop))
 
         self._sites = tuple(sites)
+        self._distance_matrix = None
         if validate_proximity and not self.is_valid():
             raise StructureError(("Molecule contains sites that are ",
                                   "less than 0.01 Angstrom apart!"))
@@ -1032,6 +1207,21 @@ class Molecule(SiteCollection, MSONable):
         """
         return self._sites
 
+    @property
+    def distance_matrix(self):
+        """
+        Returns the distance matrix between all sites in the molecule. The
+        matrix is computed on first access and cached, since molecules are
+        immutable. The returned array is read-only.
+        """
+        if self._distance_matrix is None:
+            coords = np.array(self.cart_coords)
+            diff = coords[:, None, :] - coords[None, :, :]
+            dmatrix = np.sqrt(np.sum(diff ** 2, axis=2))
+            dmatrix.flags.writeable = False
+            self._distance_matrix = dmatrix
+        return self._distance_matrix
+
     @staticmethod
     def from_sites(sites):
         """
@@ -1310,6 +1500,93 @@ class Molecule(SiteCollection, MSONable):
                         site_properties=self.site_properties)
 
 
+def _to_coords_array(coords):
+    """
+    Converts a sequence of coords to a read-only (n, 3) float array. Arrays
+    that are already read-only, e.g., the coords of another Structure, are
+    shared rather than copied.
+    """
+    if isinstance(coords, np.ndarray) and not coords.flags.writeable \
+            and coords.dtype == np.float64 and coords.ndim == 2:
+        return coords
+    return np.array(coords, dtype=np.float64).reshape((-1, 3))
+
+
+def _get_translation_group(mappings, ref):
+    """
+    Greedily builds a group of translations from the site permutations of
+    the valid translations of a structure. A permutation is only added if
+    all its compositions with the group are themselves valid translations.
+
+    Args:
+        mappings:
+            (n, nsites) array of the site permutations of the valid
+            translations, in order of preference.
+        ref:
+            Index of a site. Translations are identified by the image of
+            this site.
+
+    Returns:
+        (order, nsites) array of the permutations in the group, starting
+        with the identity.
+    """
+    valid = {m[ref]: m for m in mappings}
+    identity = np.arange(mappings.shape[1])
+    group = {ref: identity}
+    for m in mappings:
+        if m[ref] in group:
+            continue
+        #The group is abelian, so the new group is the union of the cosets
+        #of the powers of m.
+        new_group = dict(group)
+        power = m
+        consistent = True
+        while consistent and power[ref] not in group:
+            for g in group.values():
+                prod = power[g]
+                target = valid.get(prod[ref])
+                if target is None or np.any(target != prod):
+                    consistent = False
+                    break
+                new_group[prod[ref]] = prod
+            power = m[power]
+        if consistent:
+            group = new_group
+    return np.array([group[ref]] + [g for k, g in group.items() if k != ref])
+
+
+def _get_species_table(species):
+    """
+    Converts a sequence of species inputs into a table of unique
+    Compositions and an array of indices into that table.
+    """
+    table = []
+    indices = np.zeros(len(species), dtype=np.int)
+    comp_indices = {}
+    input_indices = {}
+    for i, sp in enumerate(species):
+        if isinstance(sp, Composition):
+            comp = sp
+        elif isinstance(sp, collections.Mapping):
+            comp = Composition({smart_element_or_specie(k): v
+                                for k, v in sp.items()})
+        else:
+            #Avoid repeatedly parsing the same string/element inputs.
+            if sp in input_indices:
+                indices[i] = input_indices[sp]
+                continue
+            comp = Composition({smart_element_or_specie(sp): 1})
+        if comp not in comp_indices:
+            if comp.num_atoms > 1:
+                raise ValueError("Species occupancies sum to more than 1!")
+            comp_indices[comp] = len(table)
+            table.append(comp)
+        indices[i] = comp_indices[comp]
+        if not isinstance(sp, collections.Mapping):
+            input_indices[sp] = indices[i]
+    return table, indices
+
+
 class StructureError(Exception):
     """
     Exception class for Structure.
@@ -15,7 +15,6 @@ __status__ = "Production"
 __date__ = "Sep 23, 2011"
 
 import abc
-import itertools
 import warnings
 import collections
 
@@ -24,7 +23,8 @@ from pymatgen.core.periodic_table import Specie, Element
 from pymatgen.core.lattice import Lattice
 from pymatgen.core.sites import PeriodicSite, Site
 from pymatgen.core.structure import Structure, Molecule
-from pymatgen.util.coord_utils import get_points_in_sphere_pbc
+from pymatgen.util.coord_utils import get_points_in_sphere_pbc, \
+    get_lattice_points_in_supercell
 
 
 class StructureModifier(object):
@@ -449,31 +449,42 @@ class SupercellMaker(StructureModifier):
         """
         self._original_structure = structure
         old_lattice = structure.lattice
-        scale_matrix = np.array(scaling_matrix)
+        scale_matrix = np.array(scaling_matrix, dtype=np.int)
         new_lattice = Lattice(np.dot(scale_matrix, old_lattice.matrix))
-        new_sites = []
 
-        def range_vec(i):
-            return range(max(scale_matrix[:][:, i])
-                         - min(scale_matrix[:][:, i]) + 1)
-
-        for site in structure.sites:
-            for (i, j, k) in itertools.product(range_vec(0), range_vec(1),
-                                               range_vec(2)):
-                fcoords = site.frac_coords + np.array([i, j, k])
-                coords = old_lattice.get_cartesian_coords(fcoords)
-                new_coords = new_lattice.get_fractional_coords(coords)
-                new_site = PeriodicSite(site.species_and_occu, new_coords,
-                                        new_lattice,
-                                        properties=site.properties)
-                contains_site = False
-                for s in new_sites:
-                    if s.is_periodic_image(new_site):
-                        contains_site = True
-                        break
-                if not contains_site:
-                    new_sites.append(new_site)
-        self._modified_structure = Structure.from_sites(new_sites)
+        #Each site gives rise to one site per lattice point in the supercell.
+        images = get_lattice_points_in_supercell(scale_matrix)
+        nsites = len(structure)
+        nimages = len(images)
+        self._parent_indices = np.repeat(np.arange(nsites), nimages)
+        self._images = np.tile(images, (nsites, 1))
+
+        inv_scale = np.linalg.inv(scale_matrix)
+        fcoords = np.dot(structure.frac_coords[self._parent_indices] +
+                         self._images, inv_scale)
+        #Map the sites into the supercell, keeping track of the images.
+        shifts = np.floor(fcoords + 1e-8)
+        fcoords -= shifts
+        self._images -= np.round(np.dot(shifts, scale_matrix)).astype(np.int)
+        species = structure.species_and_occu
+        props = {k: [v[i] for i in self._parent_indices]
+                 for k, v in structure.site_properties.items()}
+        self._modified_structure = Structure(
+            new_lattice, [species[i] for i in self._parent_indices], fcoords,
+            site_properties=props)
+
+    @property
+    def site_mapping(self):
+        """
+        The mapping of the sites of the supercell to those of the original
+        structure, as (parent_indices, images) numpy arrays. Site i of the
+        supercell is the image of site parent_indices[i] of the original
+        structure at the lattice translation images[i], i.e., its fractional
+        coordinates in the original lattice are
+        original[parent_indices[i]].frac_coords + images[i]. Sites are
+        ordered by parent index.
+        """
+        return self._parent_indices, self._images
 
     @property
     def original_structure(self):
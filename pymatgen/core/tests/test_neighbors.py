@@ -0,0 +1,63 @@
+#!/usr/bin/python
+
+import unittest
+
+import numpy as np
+
+from pymatgen.core.lattice import Lattice
+from pymatgen.core.neighbors import CellListNeighborFinder, \
+    KDTreeNeighborFinder, find_neighbors, get_neighbor_finder, cKDTree
+from pymatgen.util.coord_utils import get_points_in_sphere_pbc
+
+
+class NeighborFinderTest(unittest.TestCase):
+
+    def setUp(self):
+        #A strongly skewed cell.
+        self.lattice = Lattice([[4, 0, 0], [20, 3, 0], [0, 0, 5]])
+        self.fcoords = [[0, 0, 0], [0.5, 0.5, 0.5], [0.1, 0.8, 1.3],
+                        [-0.2, 0.3, 0.6]]
+        self.centers = self.lattice.get_cartesian_coords(self.fcoords)
+
+    def check_finder(self, finder):
+        (cind, pind, images, dists) = finder.find(self.lattice, self.fcoords,
+                                                  self.centers, 6)
+        for i, center in enumerate(self.centers):
+            ans = get_points_in_sphere_pbc(self.lattice,
+                                           np.mod(self.fcoords, 1),
+                                           center, 6)
+            self.assertEqual(np.sum(cind == i), len(ans))
+            self.assertTrue(np.allclose(sorted(dists[cind == i]),
+                                        sorted([a[1] for a in ans])))
+        cart = self.lattice.get_cartesian_coords(
+            np.array(self.fcoords)[pind] + images)
+        calc_dists = np.sqrt(np.sum((cart - self.centers[cind]) ** 2, axis=1))
+        self.assertTrue(np.allclose(calc_dists, dists))
+
+    def test_cell_list(self):
+        self.check_finder(CellListNeighborFinder())
+
+    def test_kdtree(self):
+        if cKDTree is None:
+            raise unittest.SkipTest("scipy not present. Skipping...")
+        self.check_finder(KDTreeNeighborFinder())
+        self.assertIsInstance(get_neighbor_finder(self.lattice),
+                              KDTreeNeighborFinder)
+
+    def test_find_neighbors(self):
+        self.assertIsInstance(get_neighbor_finder(Lattice.cubic(3)),
+                              CellListNeighborFinder)
+        (cind, pind, images, dists) = find_neighbors(Lattice.cubic(3),
+                                                     [[0, 0, 0]],
+                                                     [[0, 0, 0]], 3.5)
+        #Self and the 6 nearest images.
+        self.assertEqual(len(dists), 7)
+        self.assertEqual(np.sum(dists == 0), 1)
+        (cind, pind, images, dists) = find_neighbors(Lattice.cubic(3),
+                                                     [[0, 0, 0]],
+                                                     [[1.5, 1.5, 1.5]], 1)
+        self.assertEqual(len(dists), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,7 @@
 #!/usr/bin/python
 
 import unittest
+import itertools
 
 from pymatgen.core.periodic_table import Element, Specie
 from pymatgen.core.composition import Composition
@@ -166,6 +167,29 @@ class StructureTest(unittest.TestCase):
         self.assertEqual(new_struct[1].charge, 2)
         self.assertAlmostEqual(new_struct.volume, structure.volume)
 
+    def test_array_storage(self):
+        s = Structure(self.lattice, ["Si", "O", "Si", {"Si": 0.5, "Mn": 0.5}],
+                      [[0, 0, 0], [0.25, 0.25, 0.25], [0.5, 0.5, 0.5],
+                       [1.75, 0.5, 0.75]])
+        fcoords = s.frac_coords
+        self.assertEqual(fcoords.shape, (4, 3))
+        self.assertFalse(fcoords.flags.writeable)
+        self.assertEqual(s.cart_coords.shape, (4, 3))
+        self.assertTrue(np.allclose(s.cart_coords,
+                                    [site.coords for site in s]))
+        #Species are stored only once.
+        self.assertEqual(len(s._species_table), 3)
+        self.assertIs(s[0].species_and_occu, s[2].species_and_occu)
+        self.assertFalse(s.is_ordered)
+        self.assertEqual(s.composition, Composition({"Si": 2.5, "O": 1,
+                                                     "Mn": 0.5}))
+        #Sites are created lazily and reused.
+        self.assertIs(s[1], s[1])
+        self.assertEqual(len(s[1:3]), 2)
+        self.assertEqual(s[-1].frac_coords[0], 1.75)
+        #Coords are shared with copies.
+        self.assertIs(s.copy().frac_coords, fcoords)
+
     def test_interpolate(self):
         coords = list()
         coords.append([0, 0, 0])
@@ -199,6 +223,30 @@ class StructureTest(unittest.TestCase):
         bcc_li = Structure(Lattice.cubic(4.09), ["Li"] * 2, coords)
         self.assertEqual(len(bcc_li.get_primitive_structure()), 1)
 
+        #Supercell with noise and site properties.
+        coords = [[0, 0, 0], [0.25, 0.25, 0.25]]
+        coords = [[(c[0] + i) / 3.0, (c[1] + j) / 2.0, c[2]]
+                  for i in xrange(3) for j in xrange(2) for c in coords]
+        coords = np.array(coords) + np.random.uniform(-1e-3, 1e-3, (12, 3))
+        latt = Lattice([[3 * 2.73, 3 * 2.73, 0], [0, 2 * 2.73, 2 * 2.73],
+                        [2.73, 0, 2.73]])
+        super_si = Structure(latt, ["Si", "C"] * 6, coords,
+                             site_properties={"magmom": [1, 2] * 6})
+        prim = super_si.get_primitive_structure()
+        self.assertEqual(len(prim), 2)
+        self.assertAlmostEqual(prim.volume, super_si.volume / 6)
+        self.assertEqual(prim.formula, "Si1 C1")
+        self.assertEqual(sorted(prim.site_properties["magmom"]), [1, 2])
+        #The result is cached.
+        self.assertIs(super_si.get_primitive_structure(), prim)
+        self.assertIs(prim.get_primitive_structure(), prim)
+        self.assertEqual(len(super_si.get_primitive_structure(0.001)), 12)
+
+        sym_prim = super_si.get_primitive_structure(tolerance=0.1,
+                                                    use_symmetry=True)
+        self.assertEqual(len(sym_prim), 2)
+        self.assertAlmostEqual(sym_prim.volume, prim.volume, 2)
+
     def test_primitive_structure_volume_check(self):
         l = Lattice.tetragonal(10, 30)
         coords = [[0.5, 0.8, 0], [0.5, 0.2, 0],
@@ -215,10 +263,41 @@ class StructureTest(unittest.TestCase):
         for i in range(len(s)):
             self.assertEqual(len(all_nn[i]), len(s.get_neighbors(s[i], r)))
 
+    def test_get_neighbor_list(self):
+        s = self.struct
+        r = 4
+        (centers, neighbors, images, dists) = s.get_neighbor_list(r)
+        all_nn = s.get_all_neighbors(r, include_index=True)
+        self.assertEqual(len(centers), sum([len(nn) for nn in all_nn]))
+        self.assertTrue(np.all(dists <= r))
+        self.assertTrue(np.all(dists > 0))
+        fcoords = np.array(s.frac_coords)[neighbors] + images
+        cart = s.lattice.get_cartesian_coords(fcoords)
+        diff = cart - np.array(s.cart_coords)[centers]
+        self.assertTrue(np.allclose(np.sqrt(np.sum(diff ** 2, axis=1)),
+                                    dists))
+
+    def test_get_neighbors_in_shell(self):
+        s = self.struct
+        nn = s.get_neighbors_in_shell(s[0].coords, 3, 1)
+        self.assertEqual(len(nn), 16)
+        for site, dist in nn:
+            self.assertTrue(2 < dist <= 4)
+            self.assertAlmostEqual(site.distance_from_point(s[0].coords),
+                                   dist)
+
     def test_get_dist_matrix(self):
         ans = [[0., 2.3516318],
                [2.3516318, 0.]]
         self.assertTrue(np.allclose(self.struct.distance_matrix, ans))
+        self.assertIs(self.struct.distance_matrix,
+                      self.struct.distance_matrix)
+        self.assertFalse(self.struct.distance_matrix.flags.writeable)
+        s = Structure(self.lattice, ["Si"] * 10, np.random.rand(10, 3))
+        dmatrix = s.distance_matrix
+        for i, j in itertools.combinations(range(10), 2):
+            self.assertAlmostEqual(dmatrix[i, j], s.get_distance(i, j))
+            self.assertAlmostEqual(dmatrix[j, i], s.get_distance(i, j))
 
 
 class MoleculeTest(unittest.TestCase):
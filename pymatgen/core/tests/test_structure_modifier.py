@@ -161,6 +161,20 @@ class SupercellMakerTest(unittest.TestCase):
         self.assertEquals(self.mod.modified_structure.formula, "Fe4 Si4",
                           "Wrong formula!")
 
+    def test_site_mapping(self):
+        s = self.mod.original_structure
+        supercell = self.mod.modified_structure
+        (parent_indices, images) = self.mod.site_mapping
+        self.assertEqual(list(parent_indices), [0, 0, 0, 0, 1, 1, 1, 1])
+        for i, site in enumerate(supercell):
+            self.assertEqual(site.species_and_occu,
+                             s[parent_indices[i]].species_and_occu)
+            coords = s.lattice.get_cartesian_coords(
+                s[parent_indices[i]].frac_coords + images[i])
+            self.assertTrue(np.allclose(site.coords, coords))
+        self.assertTrue(np.all(supercell.frac_coords >= 0))
+        self.assertTrue(np.all(supercell.frac_coords < 1))
+
 
 class MoleculeEditorTest(unittest.TestCase):
 
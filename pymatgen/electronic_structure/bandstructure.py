@@ -183,7 +183,6 @@ class BandStructure(object):
 
         self._efermi = efermi
         self._lattice_rec = lattice
-        self._kpoints = []
         self._labels_dict = {}
         self._structure = structure
         self._projections = projections if projections else {}
@@ -194,19 +193,26 @@ class BandStructure(object):
             raise Exception("if projections are provided a structure object"
                             " needs also to be given")
 
-        for k in kpoints:
-            #let see if this kpoint has been assigned a label
-            label = None
-            for c in labels_dict:
-                if np.linalg.norm(k - np.array(labels_dict[c])) < 0.0001:
-                    label = c
-                    self._labels_dict[label] = Kpoint(
-                        k, lattice, label=label,
-                        coords_are_cartesian=coords_are_cartesian)
-            self._kpoints.append(
-                Kpoint(k, lattice, label=label,
-                       coords_are_cartesian=coords_are_cartesian))
-        self._bands = eigenvals
+        coords = np.array(kpoints, dtype=float).reshape((-1, 3))
+        self._frac_coords = lattice.get_fractional_coords(coords) \
+            if coords_are_cartesian else coords
+        #let see which kpoints have been assigned a label. If several labels
+        #match a kpoint, the last one is used.
+        self._kpoint_labels = [None] * len(coords)
+        if len(labels_dict) != 0:
+            labels = list(labels_dict.keys())
+            label_coords = np.array([labels_dict[c] for c in labels],
+                                    dtype=float)
+            dist = np.sqrt(np.sum((coords[:, None, :] -
+                                   label_coords[None, :, :]) ** 2, axis=2))
+            for i, j in zip(*np.where(dist < 0.0001)):
+                self._kpoint_labels[i] = labels[j]
+                self._labels_dict[labels[j]] = Kpoint(
+                    self._frac_coords[i], lattice, label=labels[j])
+        #Kpoint objects are only created when the kpoints are requested.
+        self._kpoints = None
+        self._bands = {spin: np.array(v, dtype=float)
+                       for spin, v in eigenvals.items()}
         self._nb_bands = len(eigenvals[Spin.up])
 
         self._is_spin_polarized = False
@@ -218,8 +224,22 @@ class BandStructure(object):
         """
         the list of kpoints (as Kpoint objects) in the band structure
         """
+        if self._kpoints is None:
+            self._kpoints = [Kpoint(c, self._lattice_rec, label=label)
+                             for c, label in zip(self._frac_coords,
+                                                 self._kpoint_labels)]
         return self._kpoints
 
+    def _get_kpoint(self, index):
+        """
+        Returns the Kpoint object of a kpoint index, without creating the
+        Kpoint objects of all other kpoints.
+        """
+        if self._kpoints is not None:
+            return self._kpoints[index]
+        return Kpoint(self._frac_coords[index], self._lattice_rec,
+                      label=self._kpoint_labels[index])
+
     @property
     def lattice(self):
         """
@@ -245,8 +265,8 @@ class BandStructure(object):
     def bands(self):
         """
         returns the eigenvalues for each kpoints as a dictionary
-        {Spin.up:[][],Spin.down:[][]}, the first index of the array
-        [][] refers to the band and the second to the index of the
+        {Spin.up:[][],Spin.down:[][]} of numpy arrays, the first index of the
+        array [][] refers to the band and the second to the index of the
         kpoint. The kpoints are ordered according to the order of the
         self.kpoints. If the band structure is not spin polarized, we
         only store one data set under Spin.up
@@ -280,10 +300,10 @@ class BandStructure(object):
         for spin in result:
             result[spin] = [[{str(e): 0.0
                               for e in self._structure.composition.elements}
-                             for i in range(len(self._kpoints))]
+                             for i in range(len(self._frac_coords))]
                             for j in range(self._nb_bands)]
             for i, j, k in itertools.product(range(self._nb_bands),
-                                             range(len(self._kpoints)),
+                                             range(len(self._frac_coords)),
                                              range(structure.num_sites)):
                 for orb in self._projections[Spin.up][i][j]:
                     result[spin][i][j][str(structure[k].specie)] += \
@@ -318,11 +338,11 @@ class BandStructure(object):
         for spin in result:
             result[spin] = [[{str(e): {o: 0.0 for o in dictio[e]}
                             for e in dictio}
-                            for i in range(len(self._kpoints))]
+                            for i in range(len(self._frac_coords))]
                             for j in range(self._nb_bands)]
 
             for i, j, k in itertools.product(
-                    range(self._nb_bands), range(len(self._kpoints)),
+                    range(self._nb_bands), range(len(self._frac_coords)),
                     range(structure.num_sites)):
                 for orb in self._projections[Spin.up][i][j]:
                     if str(structure[k].specie) in dictio:
@@ -384,26 +404,23 @@ class BandStructureSymmLine(BandStructure, MSONable):
         BandStructure.__init__(self, kpoints, eigenvals, lattice, efermi,
                                labels_dict, coords_are_cartesian, structure,
                                projections)
-        self._distance = []
+        labels = self._kpoint_labels
+        #get distance for each kpoint. Consecutive labelled kpoints are the
+        #same point in two branches and do not add to the distance.
+        cart_coords = self._lattice_rec.get_cartesian_coords(
+            self._frac_coords)
+        steps = np.sqrt(np.sum(np.diff(cart_coords, axis=0) ** 2, axis=1))
+        for i in xrange(1, len(labels)):
+            if labels[i] is not None and labels[i - 1] is not None:
+                steps[i - 1] = 0.0
+        self._distance = [0.0] + np.cumsum(steps).tolist()
+
+        #get the branches
         self._branches = []
         one_group = []
         branches_tmp = []
-        #get labels and distance for each kpoint
-        previous_kpoint = self._kpoints[0]
-        previous_distance = 0.0
-
-        previous_label = self._kpoints[0].label
-        for i in range(len(self._kpoints)):
-            label = self._kpoints[i].label
-            if label is not None and previous_label is not None:
-                self._distance.append(previous_distance)
-            else:
-                self._distance.append(
-                    np.linalg.norm(self._kpoints[i].cart_coords -
-                                   previous_kpoint.cart_coords) +
-                    previous_distance)
-            previous_kpoint = self._kpoints[i]
-            previous_distance = self._distance[i]
+        previous_label = labels[0]
+        for i, label in enumerate(labels):
             if label:
                 if previous_label:
                     if len(one_group) != 0:
@@ -416,8 +433,8 @@ class BandStructureSymmLine(BandStructure, MSONable):
             branches_tmp.append(one_group)
         for b in branches_tmp:
             self._branches.append({"start_index": b[0], "end_index": b[-1],
-                                   "name": (self._kpoints[b[0]].label + "-" +
-                                            self._kpoints[b[-1]].label)})
+                                   "name": (labels[b[0]] + "-" +
+                                            labels[b[-1]])})
 
         self._is_spin_polarized = False
         if len(self._bands) == 2:
@@ -441,15 +458,11 @@ class BandStructureSymmLine(BandStructure, MSONable):
         #if the kpoint has no label it can"t have a repetition along the band
         #structure line object
 
-        if self._kpoints[index].label is None:
+        if self._kpoint_labels[index] is None:
             return [index]
 
-        list_index_kpoints = []
-        for i in range(len(self._kpoints)):
-            if self._kpoints[i].label == self._kpoints[index].label:
-                list_index_kpoints.append(i)
-
-        return list_index_kpoints
+        label = self._kpoint_labels[index]
+        return [i for i, l in enumerate(self._kpoint_labels) if l == label]
 
     def get_branch(self, index):
         """
@@ -487,7 +500,7 @@ class BandStructureSymmLine(BandStructure, MSONable):
                     the band containing the VBM (please note that you can have
                     several bands sharing the VBM) {Spin.up:[],Spin.down:[]}
                 "kpoint_index":
-                    The list of indices in self._kpoints for the kpoint vbm.
+                    The list of indices in self.kpoints for the kpoint vbm.
                     Please note that there can be several kpoint_indices
                     relating to the same kpoint (e.g., Gamma can occur at
                     different spots in the band structure line plot)
@@ -506,45 +519,13 @@ class BandStructureSymmLine(BandStructure, MSONable):
         if self.is_metal():
             return {"band_index": [], "kpoint_index": [],
                     "kpoint": [], "energy": None, "projections": {}}
-        max_tmp = -float("inf")
-        index = None
-        kpointvbm = None
-        for i in range(self._nb_bands):
-            for j in range(len(self._kpoints)):
-                for spin in self._bands:
-                    if self._bands[spin][i][j] < self._efermi:
-                        if self._bands[spin][i][j] > max_tmp:
-                            max_tmp = self._bands[spin][i][j]
-                            index = j
-                            kpointvbm = self._kpoints[j]
-
-        list_ind_kpts = []
-        if kpointvbm.label is not None:
-            for i in range(len(self._kpoints)):
-                if self._kpoints[i].label == kpointvbm.label:
-                    list_ind_kpts.append(i)
-        else:
-            list_ind_kpts.append(index)
-        #get all other bands sharing the vbm
-        list_ind_band = {Spin.up: []}
-        if self.is_spin_polarized:
-            list_ind_band = {Spin.up: [], Spin.down: []}
-        for spin in self._bands:
-            for i in range(self._nb_bands):
-                if math.fabs(self._bands[spin][i][index] - max_tmp) < 0.001:
-                    list_ind_band[spin].append(i)
-        proj = {}
-        if len(self._projections) != 0:
-            for spin in list_ind_band:
-                if len(list_ind_band[spin]) == 0:
-                    continue
-                proj[spin] =\
-                    self._projections[spin][list_ind_band[spin][0]][
-                        list_ind_kpts[0]]
-        return {'band_index': list_ind_band,
-                'kpoint_index': list_ind_kpts,
-                'kpoint': kpointvbm, 'energy': max_tmp,
-                'projections': proj}
+        #the VBM is the first maximum of the energies below the fermi level,
+        #scanning bands, then kpoints, then spins.
+        spins = list(self._bands)
+        energies = np.dstack([self._bands[spin] for spin in spins])
+        energies = np.where(energies < self._efermi, energies, -float("inf"))
+        (i, j, k) = np.unravel_index(np.argmax(energies), energies.shape)
+        return self._get_band_edge(j, energies[i, j, k])
 
     def get_cbm(self):
         """
@@ -557,7 +538,7 @@ class BandStructureSymmLine(BandStructure, MSONable):
                     the band containing the CBM (please note that you can have
                     several bands sharing the CBM) {Spin.up:[],Spin.down:[]}
                 "kpoint_index":
-                    The list of indices in self._kpoints for the kpoint vbm.
+                    The list of indices in self.kpoints for the kpoint vbm.
                     Please note that there can be several kpoint_indices
                     relating to the same kpoint (e.g., Gamma can occur at
                     different spots in the band structure line plot)
@@ -576,33 +557,33 @@ class BandStructureSymmLine(BandStructure, MSONable):
         if self.is_metal():
             return {"band_index": [], "kpoint_index": [],
                     "kpoint": [], "energy": None, "projections": {}}
-        max_tmp = float("inf")
-
-        index = None
-        kpointcbm = None
-        for spin in self._bands:
-            for i in range(self._nb_bands):
-                for j in range(len(self._kpoints)):
-                    if self._bands[spin][i][j] > self._efermi:
-                        if self._bands[spin][i][j] < max_tmp:
-                            max_tmp = self._bands[spin][i][j]
-                            index = j
-                            kpointcbm = self._kpoints[j]
-        list_index_kpoints = []
-        if kpointcbm.label is not None:
-            for i in range(len(self._kpoints)):
-                if self._kpoints[i].label == kpointcbm.label:
-                    list_index_kpoints.append(i)
+        #the CBM is the first minimum of the energies above the fermi level,
+        #scanning spins, then bands, then kpoints.
+        spins = list(self._bands)
+        energies = np.array([self._bands[spin] for spin in spins])
+        energies = np.where(energies > self._efermi, energies, float("inf"))
+        (i, j, k) = np.unravel_index(np.argmin(energies), energies.shape)
+        return self._get_band_edge(k, energies[i, j, k])
+
+    def _get_band_edge(self, index, energy):
+        """
+        Returns the data about a band edge at a kpoint index and energy in the
+        format of get_vbm and get_cbm.
+        """
+        kpoint = self._get_kpoint(index)
+        if kpoint.label is not None:
+            list_index_kpoints = [i for i, l in enumerate(self._kpoint_labels)
+                                  if l == kpoint.label]
         else:
-            list_index_kpoints.append(index)
-        #get all other bands sharing the vbm
+            list_index_kpoints = [index]
+        #get all other bands sharing the band edge
         list_index_band = {Spin.up: []}
         if self.is_spin_polarized:
             list_index_band = {Spin.up: [], Spin.down: []}
         for spin in self._bands:
-            for i in range(self._nb_bands):
-                if math.fabs(self._bands[spin][i][index] - max_tmp) < 0.001:
-                    list_index_band[spin].append(i)
+            bands = np.where(np.abs(self._bands[spin][:, index] - energy)
+                             < 0.001)[0]
+            list_index_band[spin] = bands.tolist()
 
         proj = {}
         if len(self._projections) != 0:
@@ -614,7 +595,7 @@ class BandStructureSymmLine(BandStructure, MSONable):
 
         return {'band_index': list_index_band,
                 'kpoint_index': list_index_kpoints,
-                'kpoint': kpointcbm, 'energy': max_tmp,
+                'kpoint': kpoint, 'energy': float(energy),
                 'projections': proj}
 
     def apply_scissor(self, new_band_gap):
@@ -633,32 +614,7 @@ class BandStructureSymmLine(BandStructure, MSONable):
         if self.is_metal():
             #moves then the highest index band crossing the fermi level
             #find this band...
-            max_index = -1000
-            #spin_index = None
-            for i in range(self._nb_bands):
-                below = False
-                above = False
-                for j in range(len(self._kpoints)):
-                    if self._bands[Spin.up][i][j] < self._efermi:
-                        below = True
-                    if self._bands[Spin.up][i][j] > self._efermi:
-                        above = True
-                if above and below:
-                    if i > max_index:
-                        max_index = i
-                        #spin_index = Spin.up
-                if self.is_spin_polarized:
-                    below = False
-                    above = False
-                    for j in range(len(self._kpoints)):
-                        if self._bands[Spin.down][i][j] < self._efermi:
-                            below = True
-                        if self._bands[Spin.down][i][j] > self._efermi:
-                            above = True
-                    if above and below:
-                        if i > max_index:
-                            max_index = i
-                            #spin_index = Spin.down
+            max_index = self._get_crossing_bands()[-1]
             old_dict = self.to_dict
             shift = new_band_gap
             for spin in old_dict['bands']:
@@ -725,17 +681,14 @@ class BandStructureSymmLine(BandStructure, MSONable):
         """
         if self.is_metal():
             return 0.0
-        lowest_conduction_band = []
-        highest_valence_band = []
-        for j in range(len(self._bands[Spin.up])):
-            for i in range(len(self.kpoints)):
-                if self._bands[Spin.up][j][i] > self._efermi:
-                    lowest_conduction_band.append(self._bands[Spin.up][j][i])
-                    highest_valence_band.append(self._bands[Spin.up][j-1][i])
-        diff = []
-        for i in range(len(self.kpoints)):
-            diff.append(lowest_conduction_band[i] - highest_valence_band[i])
-        return min(diff)
+        #lowest energy above and highest energy below the fermi level at
+        #each kpoint
+        bands = self._bands[Spin.up]
+        lowest_conduction_band = np.where(bands > self._efermi, bands,
+                                          float("inf")).min(axis=0)
+        highest_valence_band = np.where(bands < self._efermi, bands,
+                                        -float("inf")).max(axis=0)
+        return float(np.min(lowest_conduction_band - highest_valence_band))
 
     def is_metal(self):
         """
@@ -745,28 +698,18 @@ class BandStructureSymmLine(BandStructure, MSONable):
         Returns:
             True if a metal, False if not
         """
-        #print self._efermi
-        for i in range(self._nb_bands):
-            below = False
-            above = False
-            for j in range(len(self._kpoints)):
-                if self._bands[Spin.up][i][j] < self._efermi:
-                    below = True
-                if self._bands[Spin.up][i][j] > self._efermi:
-                    above = True
-            if above and below:
-                return True
-            if self.is_spin_polarized:
-                below = False
-                above = False
-                for j in range(len(self._kpoints)):
-                    if self._bands[Spin.down][i][j] < self._efermi:
-                        below = True
-                    if self._bands[Spin.down][i][j] > self._efermi:
-                        above = True
-                if above and below:
-                    return True
-        return False
+        return len(self._get_crossing_bands()) != 0
+
+    def _get_crossing_bands(self):
+        """
+        Returns the indices of the bands crossing the fermi level in any spin
+        channel.
+        """
+        crossing = np.zeros(self._nb_bands, dtype=bool)
+        for spin in self._bands:
+            crossing |= np.any(self._bands[spin] < self._efermi, axis=1) & \
+                np.any(self._bands[spin] > self._efermi, axis=1)
+        return np.where(crossing)[0]
 
     @property
     def to_dict(self):
@@ -775,14 +718,12 @@ class BandStructureSymmLine(BandStructure, MSONable):
         """
         d = {"module": self.__class__.__module__,
              "class": self.__class__.__name__,
-             "lattice_rec": self._lattice_rec.to_dict, "efermi": self._efermi,
-             "kpoints": []}
+             "lattice_rec": self._lattice_rec.to_dict, "efermi": self._efermi}
         #kpoints are not kpoint objects dicts but are frac coords (this makes
         #the dict smaller and avoids the repetition of the lattice
-        for k in self._kpoints:
-            d["kpoints"].append(k.to_dict["fcoords"])
+        d["kpoints"] = self._frac_coords.tolist()
         d["branches"] = self._branches
-        d["bands"] = {str(int(spin)): self._bands[spin]
+        d["bands"] = {str(int(spin)): self._bands[spin].tolist()
                       for spin in self._bands}
         d["is_metal"] = self.is_metal()
         vbm = self.get_vbm()
@@ -883,37 +824,21 @@ def get_reconstructed_band_structure(list_bs, efermi=None):
         nb_bands = min([list_bs[i]._nb_bands for i in range(len(list_bs))])
 
         for bs in list_bs:
-            for k in bs._kpoints:
-                kpoints.append(k.frac_coords)
+            kpoints.extend(bs._frac_coords)
             for k, v in bs._labels_dict.iteritems():
                 labels_dict[k] = v.frac_coords
-        eigenvals = {Spin.up: [list_bs[0]._bands[Spin.up][i]
-                               for i in range(nb_bands)]}
-        for i in range(nb_bands):
-            for bs in list_bs[1:]:
-                for e in bs._bands[Spin.up][i]:
-                    eigenvals[Spin.up][i].append(e)
-        if list_bs[0].is_spin_polarized:
-            eigenvals[Spin.down] = [list_bs[0]._bands[Spin.down][i]
-                                    for i in range(nb_bands)]
-            for i in range(nb_bands):
-                for bs in list_bs[1:]:
-                    for e in bs._bands[Spin.down][i]:
-                        eigenvals[Spin.down][i].append(e)
+        eigenvals = {spin: np.concatenate([bs._bands[spin][:nb_bands]
+                                           for bs in list_bs], axis=1)
+                     for spin in list_bs[0]._bands}
         projections = {}
         if len(list_bs[0]._projections) != 0:
-            projections = {Spin.up: [list_bs[0]._projections[Spin.up][i]
-                           for i in range(nb_bands)]}
-            for i in range(nb_bands):
-                for bs in list_bs[1:]:
-                    projections[Spin.up][i].extend(bs._projections[Spin.up][i])
-            if list_bs[0].is_spin_polarized:
-                projections[Spin.down] = [list_bs[0]._projections[Spin.down][i]
-                                          for i in range(nb_bands)]
-                for i in range(nb_bands):
-                    for bs in list_bs[1:]:
-                        projections[Spin.down][i].extend(
-                            bs._projections[Spin.down][i])
+            #the projections of each band are copied, so that the band
+            #structures in list_bs are not modified.
+            for spin in list_bs[0]._projections:
+                projections[spin] = [
+                    list(itertools.chain(*[bs._projections[spin][i]
+                                           for bs in list_bs]))
+                    for i in range(nb_bands)]
 
         if isinstance(list_bs[0], BandStructureSymmLine):
             return BandStructureSymmLine(kpoints, eigenvals, rec_lattice,
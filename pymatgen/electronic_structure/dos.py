@@ -13,6 +13,9 @@ __maintainer__ = "Shyue Ping Ong"
 __email__ = "shyue@mit.edu"
 __date__ = "Mar 20, 2012"
 
+import base64
+import zlib
+
 import numpy as np
 
 from pymatgen.electronic_structure.core import Spin, Orbital
@@ -297,6 +300,21 @@ class CompleteDos(Dos):
 
         Structure associated with the CompleteDos.
 
+    .. attribute:: pdos_array
+
+        Array of all partial densities, of shape (number of sites, number of
+        orbitals, number of spins, number of energies). Sites are ordered as
+        in the structure, and orbitals and spins as in the orbitals and spins
+        attributes. Densities of orbitals not projected on a site are zero.
+
+    .. attribute:: orbitals
+
+        List of the orbitals of the partial densities.
+
+    .. attribute:: spins
+
+        List of the spins of the partial densities.
+
     .. attribute:: pdos
 
         Dict of partial densities of the form {Site:{Orbital:{Spin:Densities}}}
@@ -315,8 +333,55 @@ class CompleteDos(Dos):
         Dos.__init__(self, total_dos.efermi, energies=total_dos.energies,
                      densities={k: np.array(d)
                                 for k, d in total_dos.densities.items()})
-        self.pdos = pdoss
         self.structure = structure
+        orbitals = set()
+        spins = set()
+        for atom_dos in pdoss.values():
+            for orb, pdos in atom_dos.items():
+                orbitals.add(orb)
+                spins.update(pdos.keys())
+        self.orbitals = sorted(orbitals, key=lambda orb: orb.vasp_index)
+        self.spins = [spin for spin in Spin.all_spins if spin in spins]
+        self._set_indices()
+        self.pdos_array = np.zeros((len(structure), len(self.orbitals),
+                                    len(self.spins), len(self.energies)))
+        self._pdos_mask = np.zeros(self.pdos_array.shape[:2], dtype=bool)
+        for site, atom_dos in pdoss.items():
+            i = self._site_indices[site]
+            for orb, pdos in atom_dos.items():
+                j = self._orbital_indices[orb]
+                self._pdos_mask[i, j] = True
+                for k, spin in enumerate(self.spins):
+                    self.pdos_array[i, j, k] = pdos[spin]
+
+    def _set_indices(self):
+        """
+        Sets the maps of sites and orbitals to their indices in pdos_array.
+        """
+        self._site_indices = {site: i for i, site in enumerate(self.structure)}
+        self._orbital_indices = {orb: i for i, orb in enumerate(self.orbitals)}
+        self._pdos = None
+
+    def _get_densities(self, densities):
+        """
+        Returns a {Spin: densities} dict from an array of densities indexed
+        by the spins of the partial densities.
+        """
+        return dict(zip(self.spins, densities))
+
+    @property
+    def pdos(self):
+        """
+        Dict of partial densities of the form {Site:{Orbital:{Spin:Densities}}}
+        The densities are views of pdos_array.
+        """
+        if self._pdos is None:
+            self._pdos = {}
+            for i, j in zip(*np.where(self._pdos_mask)):
+                atom_dos = self._pdos.setdefault(self.structure[i], {})
+                atom_dos[self.orbitals[j]] = self._get_densities(
+                    self.pdos_array[i, j])
+        return self._pdos
 
     def get_site_orbital_dos(self, site, orbital):
         """
@@ -331,7 +396,12 @@ class CompleteDos(Dos):
         Returns:
             Dos containing densities for orbital of site.
         """
-        return Dos(self.efermi, self.energies, self.pdos[site][orbital])
+        i = self._site_indices[site]
+        j = self._orbital_indices[orbital]
+        if not self._pdos_mask[i, j]:
+            raise KeyError(orbital)
+        return Dos(self.efermi, self.energies,
+                   self._get_densities(self.pdos_array[i, j]))
 
     def get_site_dos(self, site):
         """
@@ -344,8 +414,11 @@ class CompleteDos(Dos):
         Returns:
             Dos containing summed orbital densities for site.
         """
-        site_dos = reduce(add_densities, self.pdos[site].values())
-        return Dos(self.efermi, self.energies, site_dos)
+        i = self._site_indices[site]
+        if not self._pdos_mask[i].any():
+            raise KeyError(site)
+        return Dos(self.efermi, self.energies,
+                   self._get_densities(self.pdos_array[i].sum(axis=0)))
 
     def get_site_t2g_eg_resolved_dos(self, site):
         """
@@ -359,19 +432,15 @@ class CompleteDos(Dos):
             A dict {"e_g": Dos, "t2g": Dos} containing summed e_g and t2g DOS
             for the site.
         """
-        t2g_dos = []
-        eg_dos = []
-        for s, atom_dos in self.pdos.items():
-            if s == site:
-                for orb, pdos in atom_dos.items():
-                    if orb in (Orbital.dxy, Orbital.dxz, Orbital.dyz):
-                        t2g_dos.append(pdos)
-                    elif orb in (Orbital.dx2, Orbital.dz2):
-                        eg_dos.append(pdos)
-        return {"t2g": Dos(self.efermi, self.energies,
-                           reduce(add_densities, t2g_dos)),
-                "e_g": Dos(self.efermi, self.energies,
-                           reduce(add_densities, eg_dos))}
+        i = self._site_indices[site]
+        t2g = [j for j, orb in enumerate(self.orbitals)
+               if orb in (Orbital.dxy, Orbital.dxz, Orbital.dyz)]
+        eg = [j for j, orb in enumerate(self.orbitals)
+              if orb in (Orbital.dx2, Orbital.dz2)]
+        return {"t2g": Dos(self.efermi, self.energies, self._get_densities(
+                    self.pdos_array[i, t2g].sum(axis=0))),
+                "e_g": Dos(self.efermi, self.energies, self._get_densities(
+                    self.pdos_array[i, eg].sum(axis=0)))}
 
     def get_spd_dos(self):
         """
@@ -380,17 +449,16 @@ class CompleteDos(Dos):
         Returns:
             dict of {orbital: Dos}, e.g. {"s": Dos object, ...}
         """
-        spd_dos = {}
-        for atom_dos in self.pdos.values():
-            for orb, pdos in atom_dos.items():
-                orbital_type = orb.orbital_type
-                if orbital_type not in spd_dos:
-                    spd_dos[orbital_type] = pdos
-                else:
-                    spd_dos[orbital_type] = \
-                        add_densities(spd_dos[orbital_type], pdos)
-        return {orb: Dos(self.efermi, self.energies, densities)
-                for orb, densities in spd_dos.items()}
+        if not self._pdos_mask.any():
+            return {}
+        orbital_types = sorted(set(self.orbitals[j].orbital_type for j in
+                                   np.where(self._pdos_mask.any(axis=0))[0]))
+        membership = np.array([[orb.orbital_type == t for orb in self.orbitals]
+                               for t in orbital_types], dtype=float)
+        spd_densities = np.einsum("to,sokn->tkn", membership,
+                                  self.pdos_array)
+        return {t: Dos(self.efermi, self.energies, self._get_densities(dens))
+                for t, dens in zip(orbital_types, spd_densities)}
 
     def get_element_dos(self):
         """
@@ -399,40 +467,57 @@ class CompleteDos(Dos):
         Returns:
             dict of {Element: Dos}
         """
-
-        el_dos = {}
-        for site, atom_dos in self.pdos.items():
-            el = site.specie
-            for pdos in atom_dos.values():
-                if el not in el_dos:
-                    el_dos[el] = pdos
-                else:
-                    el_dos[el] = add_densities(el_dos[el], pdos)
-        return {el: Dos(self.efermi, self.energies, densities)
-                for el, densities in el_dos.items()}
+        if not self._pdos_mask.any():
+            return {}
+        species = [self.structure[i].specie
+                   for i in np.where(self._pdos_mask.any(axis=1))[0]]
+        elements = list(set(species))
+        membership = np.array([[site.specie == el for site in self.structure]
+                               for el in elements], dtype=float)
+        el_densities = np.einsum("es,sokn->ekn", membership, self.pdos_array)
+        return {el: Dos(self.efermi, self.energies, self._get_densities(dens))
+                for el, dens in zip(elements, el_densities)}
 
     @staticmethod
     def from_dict(d):
         """
-        Returns CompleteDos object from dict representation.
+        Returns CompleteDos object from dict representation. Both the encoded
+        pdos array of to_dict and the older list of per site dicts are
+        supported.
         """
         tdos = Dos.from_dict(d)
         struct = Structure.from_dict(d["structure"])
-        pdoss = {}
-        for i in xrange(len(d["pdos"])):
-            at = struct[i]
-            orb_dos = {}
-            for orb_str, odos in d["pdos"][i].items():
-                orb = Orbital.from_string(orb_str)
-                orb_dos[orb] = {Spin.from_int(int(k)): v
-                                for k, v in odos["densities"].items()}
-            pdoss[at] = orb_dos
-        return CompleteDos(struct, tdos, pdoss)
+        if not isinstance(d["pdos"], dict):
+            pdoss = {}
+            for i in xrange(len(d["pdos"])):
+                at = struct[i]
+                orb_dos = {}
+                for orb_str, odos in d["pdos"][i].items():
+                    orb = Orbital.from_string(orb_str)
+                    orb_dos[orb] = {Spin.from_int(int(k)): v
+                                    for k, v in odos["densities"].items()}
+                pdoss[at] = orb_dos
+            return CompleteDos(struct, tdos, pdoss)
+
+        pdos = d["pdos"]
+        dos = CompleteDos(struct, tdos, {})
+        dos.orbitals = [Orbital.from_string(orb) for orb in pdos["orbitals"]]
+        dos.spins = [Spin.from_int(spin) for spin in pdos["spins"]]
+        dos._set_indices()
+        densities = zlib.decompress(base64.b64decode(pdos["densities"]))
+        dos.pdos_array = np.fromstring(densities, dtype="<f8").reshape(
+            pdos["shape"])
+        dos._pdos_mask = np.ones(dos.pdos_array.shape[:2], dtype=bool)
+        for i, j in pdos["missing"]:
+            dos._pdos_mask[i, j] = False
+        return dos
 
     @property
     def to_dict(self):
         """
-        Json-serializable dict representation of CompleteDos.
+        Json-serializable dict representation of CompleteDos. The partial
+        densities are stored as the zlib compressed, base64 encoded
+        little-endian float64 bytes of pdos_array.
         """
         d = {"@module": self.__class__.__module__,
              "@class": self.__class__.__name__, "efermi": self.efermi,
@@ -441,14 +526,16 @@ class CompleteDos(Dos):
              "densities": {str(spin): list(dens)
                            for spin, dens in self.densities.items()},
              "pdos": []}
-        if len(self.pdos) > 0:
-            for at in self.structure:
-                dd = {}
-                for orb, pdos in self.pdos[at].items():
-                    dd[str(orb)] = {"densities": {str(int(spin)): list(dens)
-                                                  for spin,
-                                                  dens in pdos.items()}}
-                d["pdos"].append(dd)
+        if self._pdos_mask.any():
+            densities = np.ascontiguousarray(self.pdos_array, dtype="<f8")
+            d["pdos"] = {
+                "orbitals": [str(orb) for orb in self.orbitals],
+                "spins": [int(spin) for spin in self.spins],
+                "shape": list(self.pdos_array.shape),
+                "densities": base64.b64encode(
+                    zlib.compress(densities.tostring())),
+                "missing": [[int(i), int(j)] for i, j in
+                            zip(*np.where(~self._pdos_mask))]}
             d["atom_dos"] = {str(at): dos.to_dict for at,
                              dos in self.get_element_dos().items()}
             d["spd_dos"] = {str(orb): dos.to_dict for orb,
@@ -288,7 +288,7 @@ class BSPlotter(object):
             zero_energy = 0.0
 
         energy = {str(Spin.up): []}
-        kpoints = self._bs._kpoints
+        kpoints = self._bs.kpoints
         if self._bs.is_spin_polarized:
             energy = {str(Spin.up): [], str(Spin.down): []}
         distance = [self._bs._distance[j]
@@ -301,7 +301,7 @@ class BSPlotter(object):
         if self._bs.is_spin_polarized:
             for i in range(self._nb_bands):
                 energy[str(Spin.down)].append([self._bs._bands[Spin.down][i][j]
-                       - zero_energy for j in range(len(self._bs._kpoints))])
+                       - zero_energy for j in range(len(self._bs.kpoints))])
 
         vbm = self._bs.get_vbm()
         cbm = self._bs.get_cbm()
@@ -555,9 +555,9 @@ class BSPlotter(object):
         """
         tick_distance = []
         tick_labels = []
-        previous_label = self._bs._kpoints[0].label
+        previous_label = self._bs.kpoints[0].label
         previous_branch = self._bs._branches[0]['name']
-        for i, c in enumerate(self._bs._kpoints):
+        for i, c in enumerate(self._bs.kpoints):
             if c.label is not None:
                 tick_distance.append(self._bs._distance[i])
                 this_branch = None
@@ -664,12 +664,12 @@ class BSPlotter(object):
                     [vertex1[2], vertex2[2]], color='k')
 
         for b in self._bs._branches:
-            vertex1 = self._bs._kpoints[b['start_index']].cart_coords
-            vertex2 = self._bs._kpoints[b['end_index']].cart_coords
+            vertex1 = self._bs.kpoints[b['start_index']].cart_coords
+            vertex2 = self._bs.kpoints[b['end_index']].cart_coords
             ax.plot([vertex1[0], vertex2[0]], [vertex1[1], vertex2[1]],
                     [vertex1[2], vertex2[2]], color='r', linewidth=3)
 
-        for k in self._bs._kpoints:
+        for k in self._bs.kpoints:
             if k.label:
                 label = k.label
                 if k.label.startswith("\\") or k.label.find("_") != -1:
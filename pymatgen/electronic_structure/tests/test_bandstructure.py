@@ -8,6 +8,8 @@ from pymatgen.electronic_structure.bandstructure import Kpoint
 from pymatgen import Lattice
 from pymatgen.electronic_structure.core import Spin, Orbital
 from pymatgen.electronic_structure.bandstructure import BandStructureSymmLine
+from pymatgen.electronic_structure.bandstructure import \
+    get_reconstructed_band_structure
 
 test_dir = os.path.join(os.path.dirname(__file__), "..", "..", "..",
                         'test_files')
@@ -140,5 +142,26 @@ class BandStructureSymmLine_test(unittest.TestCase):
         self.assertEqual(bg_spin['transition'], "L-\\Gamma", "wrong kpoint transition")
         self.assertFalse(bg_spin['direct'], "wrong nature of the gap")
 
+    def test_get_direct_band_gap(self):
+        self.assertAlmostEqual(self.bs.get_direct_band_gap(), 4.0126)
+        self.assertAlmostEqual(self.bs_spin.get_direct_band_gap(), 3.8607)
+
+    def test_get_reconstructed_band_structure(self):
+        bs = get_reconstructed_band_structure([self.bs_spin, self.bs_spin])
+        self.assertEqual(len(bs.kpoints), 2 * len(self.bs_spin.kpoints))
+        self.assertEqual(bs._bands[Spin.down].shape,
+                         (27, 2 * len(self.bs_spin.kpoints)))
+        self.assertEqual(bs.get_band_gap(), self.bs_spin.get_band_gap())
+        self.assertEqual(len(bs._branches), 2 * len(self.bs_spin._branches))
+
+        with open(os.path.join(test_dir, "Cu2O_361_bandstructure.json"),
+                  "rb") as f:
+            bs_proj = BandStructureSymmLine.from_dict(json.loads(f.read()))
+        nkpts = len(bs_proj.kpoints)
+        bs = get_reconstructed_band_structure([bs_proj, bs_proj])
+        self.assertEqual(len(bs._projections[Spin.up][0]), 2 * nkpts)
+        #the input band structures are not modified
+        self.assertEqual(len(bs_proj._projections[Spin.up][0]), nkpts)
+
 if __name__ == '__main__':
     unittest.main()
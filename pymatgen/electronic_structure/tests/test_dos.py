@@ -112,6 +112,11 @@ class CompleteDosTest(unittest.TestCase):
     def test_to_from_dict(self):
         d = self.dos.to_dict
         dos = CompleteDos.from_dict(d)
+        self.assertEqual(dos.pdos_array.shape, (25, 9, 2, 301))
+        self.assertTrue((dos.pdos_array == self.dos.pdos_array).all())
+        site = dos.structure[4]
+        self.assertEqual(list(dos.pdos[site][Orbital.dxy][Spin.up]),
+                         list(self.dos.pdos[site][Orbital.dxy][Spin.up]))
         el_dos = dos.get_element_dos()
         self.assertEqual(len(el_dos), 4)
         spd_dos = dos.get_spd_dos()
@@ -127,6 +132,24 @@ class CompleteDosTest(unittest.TestCase):
         self.assertTrue((abs(sum_spd.energies
                              - sum_element.energies) < 0.0001).all())
 
+    def test_no_projections(self):
+        dos = CompleteDos(self.dos.structure, self.dos, {})
+        self.assertEqual(dos.get_spd_dos(), {})
+        self.assertEqual(dos.get_element_dos(), {})
+        self.assertEqual(dos.pdos, {})
+        self.assertRaises(KeyError, dos.get_site_dos, dos.structure[0])
+        d = dos.to_dict
+        self.assertEqual(d["pdos"], [])
+        self.assertEqual(CompleteDos.from_dict(d).get_element_dos(), {})
+
+    def test_site_without_projections(self):
+        site = self.dos.structure[0]
+        pdoss = {s: pdos for s, pdos in self.dos.pdos.items() if s != site}
+        dos = CompleteDos(self.dos.structure, self.dos, pdoss)
+        self.assertRaises(KeyError, dos.get_site_dos, site)
+        self.assertEqual(set(dos.get_element_dos().keys()),
+                         set(s.specie for s in dos.structure[1:]))
+
     def test_str(self):
         self.assertIsNotNone(str(self.dos))
 
@@ -334,7 +334,7 @@ def asabistructure(obj):
             if obj.endswith(".nc"):
                 from .netcdf import structure_from_etsf_file
                 structure = structure_from_etsf_file(obj)
-                print(structure._sites)
+                print(structure.sites)
             else:
                 from pymatgen.io.smartio import read_structure
                 structure = read_structure(obj)
@@ -17,7 +17,6 @@ __date__ = "Sep 23, 2011"
 
 import re
 import cStringIO
-import math
 import warnings
 from collections import OrderedDict
 
@@ -26,7 +25,7 @@ import numpy as np
 
 from pymatgen.core.periodic_table import Element, Specie
 from pymatgen.util.io_utils import zopen
-from pymatgen.util.coord_utils import in_coord_list_pbc
+from pymatgen.util.coord_utils import find_pbc_matches
 from pymatgen.core.lattice import Lattice
 from pymatgen.core.structure import Structure
 from pymatgen.core.composition import Composition
@@ -73,17 +72,51 @@ class CifParser(object):
         output = cStringIO.StringIO(cif_string)
         return CifParser(output, occupancy_tolerance)
 
-    def _unique_coords(self, coord_in):
+    def _unique_coords(self, coords_in):
         """
-        Generate unique coordinates using coord and symmetry positions.
+        Generate unique coordinates using coords and symmetry positions. All
+        symmetry operations are applied to all coordinates at once. Images
+        that round to the same point on a grid are removed by hashing, and
+        the remaining duplicates (e.g., near grid boundaries) are found in a
+        single binned search (see find_pbc_matches).
+
+        Args:
+            coords_in:
+                Sequence of fractional coordinates of the asymmetric unit.
+
+        Returns:
+            List of arrays of the unique images of each coordinate.
         """
-        coords = []
-        for op in self.symmetry_operations:
-            coord = op.operate(coord_in)
-            coord = np.array([i - math.floor(i) for i in coord])
-            if not in_coord_list_pbc(coords, coord, atol=1e-3):
-                coords.append(coord)
-        return coords
+        coords_in = np.reshape(np.array(coords_in, dtype=np.float64),
+                               (-1, 3))
+        affine = np.array([op.affine_matrix for op in
+                           self.symmetry_operations])
+        nops = len(affine)
+        images = np.einsum("ijk,lk->lij", affine[:, :3, :3], coords_in) + \
+            affine[None, :, :3, 3]
+        images = images - np.floor(images)
+        flat = images.reshape((-1, 3))
+        site_inds = np.arange(len(flat)) // nops
+
+        #First occurrences of each grid point of each coordinate.
+        ngrid = 1000
+        grid = np.round(flat * ngrid).astype(np.int64) % ngrid
+        keys = ((site_inds * ngrid + grid[:, 0]) * ngrid + grid[:, 1]) * \
+            ngrid + grid[:, 2]
+        first = np.unique(keys, return_index=True)[1]
+        first.sort()
+
+        #An image is a duplicate if it is equal to an earlier image of the
+        #same coordinate.
+        (inds1, inds2) = find_pbc_matches(flat[first], flat[first],
+                                          atol=1e-3)
+        dup = (site_inds[first[inds1]] == site_inds[first[inds2]]) & \
+            (inds2 < inds1)
+        keep = np.zeros(len(flat), dtype=bool)
+        keep[first] = True
+        keep[first[inds1[dup]]] = False
+        keep = keep.reshape((-1, nops))
+        return [images[i][keep[i]] for i in xrange(len(coords_in))]
 
     def _get_structure(self, data, primitive):
         """
@@ -144,8 +177,8 @@ class CifParser(object):
         allspecies = []
         allcoords = []
 
-        for coord, species in coord_to_species.items():
-            coords = self._unique_coords(coord)
+        all_unique = self._unique_coords(coord_to_species.keys())
+        for coords, species in zip(all_unique, coord_to_species.values()):
             allcoords.extend(coords)
             allspecies.extend(len(coords) * [species])
 
@@ -312,9 +345,18 @@ def float_from_str(text):
     return float(re.sub("\(.+\)", "", text))
 
 
+#Maximum number of sets of symmetry operations cached by
+#parse_symmetry_operations.
+SYMMOPS_CACHE_SIZE = 1000
+
+_symmops_cache = OrderedDict()
+
+
 def parse_symmetry_operations(symmops_str_list):
     """
-    Help method to parse the symmetry operations.
+    Help method to parse the symmetry operations. Parsed operations are
+    cached by their strings, so that the same space group is only parsed
+    once.
 
     Args:
         symmops_str_list:
@@ -324,11 +366,16 @@ def parse_symmetry_operations(symmops_str_list):
     Returns:
         List of SymmOps
     """
+    key = tuple(op_str.strip() for op_str in symmops_str_list)
+    if key in _symmops_cache:
+        #Copies are returned, since SymmOps are mutable.
+        return [SymmOp(op.affine_matrix, op.tol)
+                for op in _symmops_cache[key]]
     ops = []
-    for op_str in symmops_str_list:
+    for op_str in key:
         rot_matrix = np.zeros((3, 3))
         trans = np.zeros(3)
-        toks = op_str.strip().split(",")
+        toks = op_str.split(",")
         for i, tok in enumerate(toks):
             for m in re.finditer("([\+\-]*)\s*([x-z\d]+)/*(\d*)", tok):
                 factor = -1 if m.group(1) == "-" else 1
@@ -342,4 +389,7 @@ def parse_symmetry_operations(symmops_str_list):
                     trans[i] = factor * num
         op = SymmOp.from_rotation_and_translation(rot_matrix, trans)
         ops.append(op)
-    return ops
+    if len(_symmops_cache) >= SYMMOPS_CACHE_SIZE:
+        _symmops_cache.popitem(last=False)
+    _symmops_cache[key] = ops
+    return [SymmOp(op.affine_matrix, op.tol) for op in ops]
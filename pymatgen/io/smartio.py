@@ -16,11 +16,19 @@ __date__ = "Jul 29, 2012"
 
 import re
 import os
+import glob
+import time
+import pickle
+import logging
+import collections
+import multiprocessing
 
 from pymatgen.io.vaspio import Vasprun, Poscar, Chgcar
 from pymatgen.io.cifio import CifParser, CifWriter
 from pymatgen.io.cssrio import Cssr
 
+logger = logging.getLogger(__name__)
+
 
 def read_structure(filename):
     """
@@ -54,6 +62,128 @@ def read_structure(filename):
     raise ValueError("Unrecognized file extension!")
 
 
+def read_structures(filenames, ncpus=None, chunksize=16, max_in_flight=None,
+                    reader=read_structure, log_interval=1000):
+    """
+    Reads structures from many files using a pool of processes. Files are
+    parsed in chunks, and only a bounded number of chunks are submitted to
+    the pool at any time, so the memory used is independent of the number
+    of files. Compressed files (.gz, .bz2) are supported by all the default
+    parsers. Throughput is reported using the logging module.
+
+    Args:
+        filenames:
+            Either a glob pattern or an iterable of filenames. Both are
+            consumed lazily.
+        ncpus:
+            Number of processes to use. Defaults to None, which means the
+            number of cpus on the machine. Use 1 to read in the calling
+            process.
+        chunksize:
+            Number of files parsed by a process in one task. Defaults to 16.
+        max_in_flight:
+            Maximum number of chunks that are being parsed or waiting to be
+            consumed. Defaults to None, which means 4 * ncpus.
+        reader:
+            Function used to read a file. Must be a picklable (i.e., module
+            level) function. Defaults to read_structure.
+        log_interval:
+            Number of files between throughput reports. Defaults to 1000.
+
+    Yields:
+        (filename, result) in the order of the filenames, where result is
+        the Structure read from the file or the exception raised when
+        reading it.
+    """
+    if isinstance(filenames, basestring):
+        filenames = glob.iglob(filenames)
+    ncpus = ncpus if ncpus else multiprocessing.cpu_count()
+    max_in_flight = max_in_flight if max_in_flight else 4 * ncpus
+
+    def get_chunks():
+        chunk = []
+        for filename in filenames:
+            chunk.append(filename)
+            if len(chunk) == chunksize:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    start_time = time.time()
+    (count, errors) = (0, 0)
+
+    def get_throughput():
+        rate = count / max(time.time() - start_time, 1e-8)
+        return "{} files read ({} errors), {:.1f} files/s".format(
+            count, errors, rate)
+
+    pool = None
+    if ncpus > 1:
+        pool = multiprocessing.Pool(ncpus)
+        in_flight = collections.deque()
+
+        def get_chunk_results():
+            for (filename, data) in in_flight.popleft().get():
+                try:
+                    result = pickle.loads(data)
+                except Exception as ex:
+                    result = ex
+                yield filename, result
+
+        def get_results():
+            for chunk in get_chunks():
+                in_flight.append(pool.apply_async(_read_files,
+                                                  (chunk, reader, True)))
+                if len(in_flight) >= max_in_flight:
+                    for r in get_chunk_results():
+                        yield r
+            while in_flight:
+                for r in get_chunk_results():
+                    yield r
+    else:
+        def get_results():
+            for chunk in get_chunks():
+                for r in _read_files(chunk, reader):
+                    yield r
+
+    try:
+        for (filename, result) in get_results():
+            count += 1
+            if isinstance(result, Exception):
+                errors += 1
+            if count % log_interval == 0:
+                logger.info(get_throughput())
+            yield filename, result
+        logger.info(get_throughput())
+    finally:
+        if pool:
+            pool.terminate()
+
+
+def _read_files(filenames, reader, pickled=False):
+    """
+    Worker for read_structures. Exceptions are returned instead of raised.
+    If pickled is True, each result is pickled separately, so that a result
+    which cannot be pickled (or unpickled) only affects its own file. Such
+    pickling errors are returned as RuntimeErrors.
+    """
+    results = []
+    for filename in filenames:
+        try:
+            result = reader(filename)
+        except Exception as ex:
+            result = ex
+        if pickled:
+            try:
+                result = pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+            except Exception as ex:
+                result = pickle.dumps(RuntimeError("{}: {}".format(
+                    type(ex).__name__, ex)), pickle.HIGHEST_PROTOCOL)
+        results.append((filename, result))
+    return results
+
+
 def write_structure(structure, filename):
     """
     Write a structure to a file based on file extension. For example, anything
@@ -328,6 +328,23 @@ class HelperFunctionTest(unittest.TestCase):
                                   [-1. ,  0. ,  0. ,  0.5],
                                   [ 0. ,  0. ,  1. ,  0.5],
                                   [ 0. ,  0. ,  0. ,  1. ]]).all())
+        #Cached operations are copies.
+        op.affine_matrix[0, 3] = 0
+        op = parse_symmetry_operations([' y+1/2, -x+1/2, z+1/2 '])[0]
+        self.assertEqual(op.affine_matrix[0, 3], 0.5)
+
+    def test_unique_coords(self):
+        parser = CifParser(os.path.join(test_dir, "Li2O.cif"))
+        parser.get_structures(False)
+        self.assertEqual(len(parser.symmetry_operations), 192)
+        coords = [[0, 0, 0], [0.25, 0.25, 0.25], [0.9999, 0.5, 0.0001],
+                  [0.1, 0.2, 0.3]]
+        unique = parser._unique_coords(coords)
+        self.assertEqual([len(c) for c in unique], [4, 8, 4, 96])
+        for c in unique:
+            fdist = c[:, None, :] - c[None, :, :]
+            fdist = np.abs(fdist - np.round(fdist))
+            self.assertEqual(np.sum(np.all(fdist < 1e-3, axis=2)), len(c))
 
 if __name__ == '__main__':
     unittest.main()
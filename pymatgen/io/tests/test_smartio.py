@@ -15,8 +15,11 @@ __date__ = "Jul 30, 2012"
 
 import unittest
 import os
+import gzip
+import shutil
+import tempfile
 
-from pymatgen.io.smartio import read_structure
+from pymatgen.io.smartio import read_structure, read_structures
 from pymatgen.core.structure import Structure
 
 test_dir = os.path.join(os.path.dirname(__file__), "..", "..", "..",
@@ -33,6 +36,33 @@ class MethodsTest(unittest.TestCase):
             self.assertIsInstance(struct, Structure)
             print struct
 
+    def test_read_structures(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            fnames = [os.path.join(test_dir, fname)
+                      for fname in ("Li2O.cif", "Si.cssr", "POSCAR")]
+            gz_name = os.path.join(tmp_dir, "Li2O2.cif.gz")
+            with open(os.path.join(test_dir, "Li2O2.cif")) as f:
+                with gzip.open(gz_name, "wb") as gz:
+                    gz.write(f.read())
+            fnames.extend([gz_name, os.path.join(tmp_dir, "missing.cif")])
+            fnames = fnames * 3
+            for ncpus in (1, 2):
+                results = list(read_structures(fnames, ncpus=ncpus,
+                                               chunksize=2, max_in_flight=2))
+                self.assertEqual([r[0] for r in results], fnames)
+                for (fname, result) in results:
+                    if fname.endswith("missing.cif"):
+                        self.assertIsInstance(result, IOError)
+                    else:
+                        self.assertEqual(result, read_structure(fname))
+            results = list(read_structures(os.path.join(tmp_dir, "*.gz")))
+            self.assertEqual(len(results), 1)
+            self.assertEqual(results[0][1].composition.reduced_formula,
+                             "Li2O2")
+        finally:
+            shutil.rmtree(tmp_dir)
+
 
 if __name__ == "__main__":
     #import sys;sys.argv = ['', 'Test.testName']
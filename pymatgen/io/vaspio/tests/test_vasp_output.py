@@ -16,10 +16,12 @@ __date__ = "Jul 16, 2012"
 import unittest
 import os
 import json
+import shutil
+from tempfile import mkdtemp
 import numpy as np
 
 from pymatgen.io.vaspio.vasp_output import Chgcar, Locpot, Oszicar, Outcar, \
-    Vasprun, Procar
+    Vasprun, Procar, iter_ionic_steps
 from pymatgen import Spin, Orbital
 
 test_dir = os.path.join(os.path.dirname(__file__), "..", "..", "..", "..",
@@ -99,6 +101,31 @@ class VasprunTest(unittest.TestCase):
         vasprun_unconverged = Vasprun(filepath)
         self.assertFalse(vasprun_unconverged.converged)
 
+    def test_iter_ionic_steps(self):
+        filepath = os.path.join(test_dir, 'vasprun.xml.unconverged')
+        vasprun = Vasprun(filepath)
+        steps = list(iter_ionic_steps(filepath))
+        self.assertEqual(len(steps), 5)
+        for (step, ref) in zip(steps, vasprun.ionic_steps):
+            self.assertEqual(step["electronic_steps"],
+                             ref["electronic_steps"])
+            self.assertEqual(step["structure"], ref["structure"])
+            self.assertTrue(np.allclose(step["forces"], ref["forces"]))
+            self.assertTrue(np.allclose(step["stress"], ref["stress"]))
+
+        vasprun_skip = Vasprun(filepath, 2)
+        steps = list(iter_ionic_steps(filepath, 2))
+        self.assertEqual(len(steps), 3)
+        self.assertEqual([s["electronic_steps"] for s in steps],
+                         [s["electronic_steps"]
+                          for s in vasprun_skip.ionic_steps])
+
+        vasprun_final = Vasprun(filepath, parse_ionic_steps=False)
+        self.assertEqual(len(vasprun_final.ionic_steps), 1)
+        self.assertEqual(vasprun_final.final_energy, vasprun.final_energy)
+        self.assertEqual(vasprun_final.final_structure,
+                         vasprun.final_structure)
+
     def test_to_dict(self):
         filepath = os.path.join(test_dir, 'vasprun.xml')
         vasprun = Vasprun(filepath)
@@ -126,6 +153,28 @@ class VasprunTest(unittest.TestCase):
         self.assertEqual(vbm['kpoint'].label, "\Gamma", "wrong vbm label")
         self.assertEqual(cbm['kpoint'].label, None, "wrong cbm label")
 
+    def test_projected_eigenvalues(self):
+        filepath = os.path.join(test_dir, 'vasprun_Si_bands.xml')
+        vasprun = Vasprun(filepath, parse_projected_eigen=True)
+        self.assertEqual(vasprun.eigenvalue_arrays[Spin.up].shape,
+                         (160, 13, 2))
+        self.assertEqual(vasprun.projected_eigenvalue_arrays[Spin.down].shape,
+                         (160, 13, 2, 9))
+        self.assertEqual(len(vasprun.eigenvalues), 320)
+        self.assertEqual(len(vasprun.projected_eigenvalues), 74880)
+        self.assertAlmostEqual(vasprun.eigenvalues[(Spin.up, 13)][4][0],
+                               6.2301)
+        self.assertAlmostEqual(
+            vasprun.projected_eigenvalues[(Spin.up, 13, 4, 0, Orbital.py)],
+            0.0428)
+        self.assertNotIn((Spin.up, 160, 0, 0, Orbital.s),
+                         vasprun.projected_eigenvalues)
+        bs = vasprun.get_band_structure(kpoints_filename=
+                                        os.path.join(test_dir,
+                                                     'KPOINTS_Si_bands'))
+        self.assertAlmostEqual(bs._projections[Spin.up][7][0][Orbital.s][0],
+                               0.3586)
+
 
 class OutcarTest(unittest.TestCase):
 
@@ -201,6 +250,11 @@ class ChgcarTest(unittest.TestCase):
         chg = Chgcar.from_file(filepath)
         self.assertAlmostEqual(chg.get_integrated_diff(0, 1)[0, 1],
                                -0.0043896932237534022)
+        diffs = chg.get_integrated_diffs([0, 0], [1, 0.5], 2)
+        self.assertEqual(diffs.shape, (2, 2, 2))
+        self.assertAlmostEqual(diffs[0, 1, 1], -0.0043896932237534022)
+        self.assertAlmostEqual(diffs[1, 1, 0], 0.5)
+        self.assertAlmostEqual(diffs[1, 1, 1], diffs[0, 0, 1])
         #test sum
         chg += chg
         self.assertAlmostEqual(chg.get_integrated_diff(0, 1)[0, 1],
@@ -213,6 +267,39 @@ class ChgcarTest(unittest.TestCase):
         myans = chg.get_integrated_diff(0, 3, 6)
         self.assertTrue(np.allclose(myans[:, 1], ans))
 
+    def test_write_file_and_cache(self):
+        tmpdir = mkdtemp()
+        try:
+            filepath = os.path.join(tmpdir, 'CHGCAR')
+            shutil.copy(os.path.join(test_dir, 'CHGCAR.spin'), filepath)
+            chg = Chgcar.from_file(filepath)
+            self.assertEqual(chg.dim, (48, 48, 48))
+            self.assertEqual(len(chg.data_aug["diff"]), 1)
+            self.assertAlmostEqual(chg.data_aug["diff"][0][0], 0.1135810E-01)
+            self.assertAlmostEqual(chg.data["total"][1, 0, 0],
+                                   0.44404397585)
+
+            outpath = os.path.join(tmpdir, 'CHGCAR.out')
+            chg.write_file(outpath)
+            chg2 = Chgcar.from_file(outpath)
+            for k in ["total", "diff"]:
+                self.assertTrue(np.allclose(chg.data[k], chg2.data[k]))
+                self.assertTrue(np.allclose(chg.data_aug[k][0],
+                                            chg2.data_aug[k][0]))
+
+            chg = Chgcar.from_file(filepath, use_cache=True)
+            self.assertTrue(os.path.exists(filepath + ".total.npy"))
+            chg2 = Chgcar.from_file(filepath, use_cache=True)
+            self.assertIsInstance(chg2.data["total"], np.memmap)
+            for k in ["total", "diff"]:
+                self.assertTrue(np.array_equal(chg.data[k], chg2.data[k]))
+                self.assertTrue(np.array_equal(chg.data_aug[k][0],
+                                               chg2.data_aug[k][0]))
+            self.assertAlmostEqual(chg2.get_integrated_diff(0, 1)[0, 1],
+                                   -0.0043896932237534022)
+        finally:
+            shutil.rmtree(tmpdir)
+
 
 class ProcarTest(unittest.TestCase):
 
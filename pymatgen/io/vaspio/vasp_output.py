@@ -24,12 +24,16 @@ import itertools
 import warnings
 import xml.sax.handler
 import StringIO
-from collections import defaultdict
+from collections import defaultdict, Mapping
 import logging
 
+try:
+    import xml.etree.cElementTree as ElementTree
+except ImportError:
+    import xml.etree.ElementTree as ElementTree
+
 import numpy as np
 
-from pymatgen.util.coord_utils import get_points_in_sphere_pbc
 from pymatgen.util.io_utils import zopen, clean_lines, micro_pyawk, \
     clean_json, reverse_readline
 from pymatgen.core.structure import Structure
@@ -82,18 +86,30 @@ class Vasprun(object):
 
         Fermi energy
 
-    .. attribute:: eigenvalues
+    .. attribute:: eigenvalue_arrays
 
         Available only if parse_eigen=True. Final eigenvalues as a dict of
-        {(spin, kpoint index):[[eigenvalue, occu]]}.
+        {spin: array of shape (nkpoints, nbands, 2)}, where the last axis
+        holds the eigenvalue and the occupation.
+
+    .. attribute:: eigenvalues
+
+        Available only if parse_eigen=True. Final eigenvalues as a dict-like
+        view of {(spin, kpoint index):[[eigenvalue, occu]]}.
         This representation is based on actual ordering in VASP and is meant as
         an intermediate representation to be converted into proper objects. The
         kpoint index is 0-based (unlike the 1-based indexing in VASP).
 
+    .. attribute:: projected_eigenvalue_arrays
+
+        Available only if parse_projected_eigen=True. Final projected
+        eigenvalues as a dict of {spin: array of shape (nkpoints, nbands,
+        natoms, norbitals)}. The orbital index is the VASP orbital index.
+
     .. attribute:: projected_eigenvalues
 
-        Final projected eigenvalues as a dict of
-        {(atom index, band index, kpoint index, Orbital, Spin):float}
+        Final projected eigenvalues as a dict-like view of
+        {(spin, kpoint index, band index, atom index, Orbital):float}
         This representation is based on actual ordering in VASP and is meant as
         an intermediate representation to be converted into proper objects. The
         kpoint, band and atom indices are 0-based (unlike the 1-based indexing
@@ -152,10 +168,13 @@ class Vasprun(object):
                             "actual_kpoints_weights", "dos_energies",
                             "eigenvalues", "tdos", "idos", "pdos", "efermi",
                             "ionic_steps", "dos_has_errors",
-                            "projected_eigenvalues", "dielectric"]
+                            "projected_eigenvalues", "dielectric",
+                            "eigenvalue_arrays",
+                            "projected_eigenvalue_arrays"]
 
     def __init__(self, filename, ionic_step_skip=None, parse_dos=True,
-                 parse_eigen=True, parse_projected_eigen=False):
+                 parse_eigen=True, parse_projected_eigen=False,
+                 parse_ionic_steps=True):
         """
         Args:
             filename:
@@ -166,7 +185,9 @@ class Vasprun(object):
                 very useful if you are parsing very large vasprun.xml files and
                 you are not interested in every single ionic step. Note that
                 the initial and final structure of all runs will always be
-                read, regardless of the ionic_step_skip.
+                read, regardless of the ionic_step_skip. Skipped steps are
+                filtered out while the file is streamed to the parser, so the
+                full file is never held in memory.
             parse_dos:
                 Whether to parse the dos. Defaults to True. Set
                 to False to shave off significant time from the parsing if you
@@ -177,33 +198,37 @@ class Vasprun(object):
                 are not interested in getting those data.
             parse_projected_eigen:
                 Whether to parse the projected eigenvalues. Defaults to False.
-                Set to True to obtain projected eigenvalues. **Note that this
-                can take an extreme amount of time and memory.** So use this
-                wisely.
+                Set to True to obtain projected eigenvalues. The projections
+                are stored as dense arrays, but can still take a significant
+                amount of time to parse for large runs.
+            parse_ionic_steps:
+                Whether to parse the intermediate ionic steps. Defaults to
+                True. If False, only the last ionic step is read (together
+                with the initial and final structures), which is the fastest
+                way to obtain the final structure and energy of a long
+                relaxation or MD run. Use iter_ionic_steps to stream through
+                all ionic steps of such runs instead.
         """
         self.filename = filename
 
+        self._handler = VasprunHandler(
+            filename, parse_dos=parse_dos,
+            parse_eigen=parse_eigen,
+            parse_projected_eigen=parse_projected_eigen
+        )
+        if not parse_ionic_steps:
+            ionic_step_skip = 0
         with zopen(filename) as f:
-            self._handler = VasprunHandler(
-                filename, parse_dos=parse_dos,
-                parse_eigen=parse_eigen,
-                parse_projected_eigen=parse_projected_eigen
-            )
             if ionic_step_skip is None:
-                self._parser = xml.sax.parse(f, self._handler)
+                xml.sax.parse(f, self._handler)
             else:
-                #remove parts of the xml file and parse the string
-                run = f.read()
-                steps = run.split("<calculation>")
-                new_steps = steps[::int(ionic_step_skip)]
-                #add the last step from the run
-                if steps[-1] != new_steps[-1]:
-                    new_steps.append(steps[-1])
-                self._parser = xml.sax.parseString("<calculation>"
-                                                   .join(new_steps),
-                                                   self._handler)
-            for k in Vasprun.supported_properties:
-                setattr(self, k, getattr(self._handler, k))
+                parser = xml.sax.make_parser()
+                parser.setContentHandler(self._handler)
+                for data in _filter_ionic_steps(f, int(ionic_step_skip)):
+                    parser.feed(data)
+                parser.close()
+        for k in Vasprun.supported_properties:
+            setattr(self, k, getattr(self._handler, k))
 
     @property
     def converged(self):
@@ -349,44 +374,21 @@ class Vasprun(object):
 
         kpoints = [np.array(self.actual_kpoints[i])
                    for i in range(len(self.actual_kpoints))]
-        dict_eigen = self.to_dict['output']['eigenvalues']
-        dict_p_eigen = {}
-        if 'projected_eigenvalues' in self.to_dict['output']:
-            dict_p_eigen = self.to_dict['output']['projected_eigenvalues']
+        spins = [Spin.up, Spin.down] if self.is_spin and \
+            Spin.down in self.eigenvalue_arrays else [Spin.up]
 
+        eigenvals = {spin: self.eigenvalue_arrays[spin][:, :, 0].T.tolist()
+                     for spin in spins}
         p_eigenvals = {}
-        if "1" in dict_eigen["0"] and "-1" in dict_eigen["0"]\
-                and self.incar['ISPIN'] == 2:
-            eigenvals = {Spin.up: [], Spin.down: []}
-            if len(dict_p_eigen) != 0:
-                p_eigenvals = {Spin.up: [], Spin.down: []}
-        else:
-            eigenvals = {Spin.up: []}
-            if len(dict_p_eigen) != 0:
-                p_eigenvals = {Spin.up: []}
-
-        neigenvalues = [len(v['1']) for v in dict_eigen.values()]
-        min_eigenvalues = min(neigenvalues)
-        for i in range(min_eigenvalues):
-            eigenvals[Spin.up].append([dict_eigen[str(j)]['1'][i][0]
-                                       for j in range(len(kpoints))])
-            if len(dict_p_eigen) != 0:
-                p_eigenvals[Spin.up].append(
-                    [{Orbital.from_string(orb):
-                      dict_p_eigen[j]['1'][i][orb]
-                      for orb in dict_p_eigen[j]['1'][i]}
-                     for j in range(len(kpoints))])
-        if Spin.down in eigenvals:
-            for i in range(min_eigenvalues):
-                eigenvals[Spin.down].append([dict_eigen[str(j)]['-1'][i][0]
-                                             for j in range(len(kpoints))])
-                if len(dict_p_eigen) != 0:
-                    p_eigenvals[Spin.down].append(
-                        [{Orbital.from_string(orb):
-                          dict_p_eigen[j]['-1'][i][orb]
-                          for orb in dict_p_eigen[j]['-1'][i]}
-                         for j in range(len(kpoints))]
-                    )
+        if self.projected_eigenvalue_arrays:
+            for spin in spins:
+                data = self.projected_eigenvalue_arrays[spin]
+                orbitals = [Orbital.from_vasp_index(i)
+                            for i in xrange(data.shape[3])]
+                #Reorder to [band][kpoint][orbital][atom].
+                p_eigenvals[spin] = [
+                    [dict(zip(orbitals, projs)) for projs in band]
+                    for band in data.transpose((1, 0, 3, 2)).tolist()]
 
         #check if we have an hybrid band structure computation
         #for this we look at the presence of the LHFCALC tag and of k-points
@@ -445,14 +447,19 @@ class Vasprun(object):
         vbm_kpoint = None
         cbm = float("inf")
         cbm_kpoint = None
-        for k, val in self.eigenvalues.items():
-            for (eigenval, occu) in val:
-                if occu > 1e-8 and eigenval > vbm:
-                    vbm = eigenval
-                    vbm_kpoint = k[0]
-                elif occu <= 1e-8 and eigenval < cbm:
-                    cbm = eigenval
-                    cbm_kpoint = k[0]
+        for data in self.eigenvalue_arrays.values():
+            occupied = data[:, :, 1] > 1e-8
+            occ_eigen = np.where(occupied, data[:, :, 0], -float("inf"))
+            unocc_eigen = np.where(occupied, float("inf"), data[:, :, 0])
+            (k, b) = np.unravel_index(np.argmax(occ_eigen), occ_eigen.shape)
+            if occ_eigen[k, b] > vbm:
+                vbm = occ_eigen[k, b]
+                vbm_kpoint = int(k)
+            (k, b) = np.unravel_index(np.argmin(unocc_eigen),
+                                      unocc_eigen.shape)
+            if unocc_eigen[k, b] < cbm:
+                cbm = unocc_eigen[k, b]
+                cbm_kpoint = int(k)
         return max(cbm - vbm, 0), cbm, vbm, vbm_kpoint == cbm_kpoint
 
     @property
@@ -512,25 +519,23 @@ class Vasprun(object):
                 "efermi": self.efermi}
 
         eigen = defaultdict(dict)
-        for (spin, index), values in self.eigenvalues.items():
-            eigen[index][str(spin)] = values
+        for spin, data in self.eigenvalue_arrays.items():
+            for index, values in enumerate(data.tolist()):
+                eigen[index][str(spin)] = values
         vout["eigenvalues"] = eigen
         vout['dielectric'] = self.dielectric
 
         peigen = []
-        if len(self.projected_eigenvalues) != 0:
-            for i in range(len(eigen)):
-                peigen.append({})
-                for spin in eigen[i]:
-                    peigen[i][spin] = []
-                    for j in range(len(eigen[i][spin])):
-                        peigen[i][spin].append({})
-            for (spin, kpoint_index, band_index, ion_index, orbital), value \
-                    in self.projected_eigenvalues.items():
-                beigen = peigen[kpoint_index][str(spin)][band_index]
-                if orbital not in beigen:
-                    beigen[orbital] = [0.0] * nsites
-                beigen[orbital][ion_index] = value
+        if self.projected_eigenvalue_arrays:
+            peigen = [{} for i in xrange(len(eigen))]
+        for spin, data in self.projected_eigenvalue_arrays.items():
+            orbitals = [str(Orbital.from_vasp_index(i))
+                        for i in xrange(data.shape[3])]
+            #Reorder to [kpoint][band][orbital][atom].
+            for index, kdata in enumerate(data.transpose((0, 1, 3, 2))
+                                          .tolist()):
+                peigen[index][str(spin)] = [dict(zip(orbitals, projs))
+                                            for projs in kdata]
         vout['projected_eigenvalues'] = peigen
         (gap, cbm, vbm, is_direct) = self.eigenvalue_band_properties
         vout.update(dict(bandgap=gap, cbm=cbm, vbm=vbm,
@@ -565,11 +570,15 @@ class VasprunHandler(xml.sax.handler.ContentHandler):
         self.actual_kpoints_weights = []
         self.dos_energies = None
 
-        #  will  be  {(spin, kpoint index): [[energy, occu]]}
-        self.eigenvalues = {}
+        #{spin: array of shape (nkpoints, nbands, 2)} with the eigenvalues
+        #and occupations.
+        self.eigenvalue_arrays = {}
+        self.eigenvalues = EigenvalueDict(self.eigenvalue_arrays)
 
-        #{(spin, kpoint_index, band_index, atom_ind, orb):float}
-        self.projected_eigenvalues = {}
+        #{spin: array of shape (nkpoints, nbands, natoms, norbitals)}
+        self.projected_eigenvalue_arrays = {}
+        self.projected_eigenvalues = ProjectedEigenvalueDict(
+            self.projected_eigenvalue_arrays)
 
         self.tdos = {}
         self.idos = {}
@@ -673,12 +682,12 @@ class VasprunHandler(xml.sax.handler.ContentHandler):
                     (not state["projected"]):
                 logger.debug("Reading eigenvalues. Projected = {}"
                              .format(state["projected"]))
-                self.eigenvalues = {}
+                self.eigenvalue_arrays.clear()
                 self.read_eigen = True
             elif name == "eigenvalues" and self.parse_projected_eigen and \
                     state["projected"]:
                 logger.debug("Reading projected eigenvalues...")
-                self.projected_eigen = {}
+                self.projected_eigenvalue_arrays.clear()
                 self.read_projected_eigen = True
             elif self.read_eigen or self.read_projected_eigen:
                 if name == "r" and state["set"]:
@@ -805,13 +814,11 @@ class VasprunHandler(xml.sax.handler.ContentHandler):
             self.scdata.append(self.scstep)
             logger.debug("Finished reading scstep...")
         elif name == "varray" and state["varray"] == "forces":
-            self.forces = np.array(map(float,
-                                       self.posstr.getvalue().split()))
+            self.forces = np.fromstring(self.posstr.getvalue(), sep=" ")
             self.forces.shape = (len(self.atomic_symbols), 3)
             self.read_positions = False
         elif name == "varray" and state["varray"] == "stress":
-            self.stress = np.array(map(float,
-                                       self.posstr.getvalue().split()))
+            self.stress = np.fromstring(self.posstr.getvalue(), sep=" ")
             self.stress.shape = (3, 3)
             self.read_positions = False
         elif name == "calculation":
@@ -828,8 +835,7 @@ class VasprunHandler(xml.sax.handler.ContentHandler):
             self.read_rec_lattice = False
         elif name == "structure":
             self.lattice = map(float, self.latticestr.getvalue().split())
-            self.pos = np.array(map(float,
-                                    self.posstr.getvalue().split()))
+            self.pos = np.fromstring(self.posstr.getvalue(), sep=" ")
             self.pos.shape = (len(self.atomic_symbols), 3)
             self.structures.append(Structure(self.lattice, self.atomic_symbols,
                                              self.pos))
@@ -886,10 +892,10 @@ class VasprunHandler(xml.sax.handler.ContentHandler):
                     self.idos_val = []
                 elif state["partial"] and str(state["set"]).startswith("spin"):
                     spin = Spin.up if state["set"] == "spin 1" else Spin.down
-                    self.norbitals = len(self.raw_data[0])
+                    data = np.array(self.raw_data)
+                    self.norbitals = data.shape[1]
                     for i in xrange(self.norbitals):
-                        self.pdos[(self.pdos_ion, i, spin)] = \
-                            [row[i] for row in self.raw_data]
+                        self.pdos[(self.pdos_ion, i, spin)] = data[:, i]
                     self.raw_data = []
             elif name == "partial":
                 all_pdos = []
@@ -901,7 +907,7 @@ class VasprunHandler(xml.sax.handler.ContentHandler):
                         downdos = self.pdos.get((iatom, iorbital, Spin.down),
                                                 None)
                         orb = Orbital.from_vasp_index(iorbital)
-                        if downdos:
+                        if downdos is not None:
                             all_pdos[-1][orb] = {Spin.up: updos,
                                                  Spin.down: downdos}
                         else:
@@ -918,11 +924,14 @@ class VasprunHandler(xml.sax.handler.ContentHandler):
     def _read_eigen(self, name):
         state = self.state
         if name == "r" and str(state["set"]).startswith("kpoint"):
-            tok = self.val.getvalue().split()
-            self.raw_data.append(map(float, tok))
+            self.raw_data.append(self.val.getvalue())
         elif name == "set" and str(state["set"]).startswith("kpoint"):
-            self.eigenvalues[(self.eigen_spin, self.eigen_kpoint - 1)] = \
-                self.raw_data
+            data = _rows_to_array(self.raw_data)
+            if self.eigen_spin not in self.eigenvalue_arrays:
+                self.eigenvalue_arrays[self.eigen_spin] = \
+                    np.zeros((len(self.actual_kpoints),) + data.shape)
+            self.eigenvalue_arrays[self.eigen_spin][self.eigen_kpoint - 1] = \
+                data
             self.raw_data = []
         elif name == "eigenvalues":
             logger.debug("Finished reading eigenvalues. "
@@ -932,24 +941,25 @@ class VasprunHandler(xml.sax.handler.ContentHandler):
     def _read_projected_eigen(self, name):
         state = self.state
         if name == "r" and str(state["set"]).startswith("band"):
-            tok = self.val.getvalue().split()
-            self.raw_data.append({Orbital.from_vasp_index(i): float(val)
-                                  for i, val in enumerate(tok)})
+            self.raw_data.append(self.val.getvalue())
         elif name == "set" and str(state["set"]).startswith("band"):
             logger.debug("Processing projected eigenvalues for " +
                          "band {}, kpoint {}, spin {}."
                          .format(self.eigen_band - 1, self.eigen_kpoint - 1,
                                  self.eigen_spin))
-            for atom_ind, data in enumerate(self.raw_data):
-                for orb, val in data.items():
-                    self.projected_eigenvalues[(self.eigen_spin,
-                                                self.eigen_kpoint - 1,
-                                                self.eigen_band - 1,
-                                                atom_ind, orb)] = val
+            data = _rows_to_array(self.raw_data)
+            if self.eigen_spin not in self.projected_eigenvalue_arrays:
+                shape = (len(self.actual_kpoints),
+                         self.parameters["NBANDS"]) + data.shape
+                self.projected_eigenvalue_arrays[self.eigen_spin] = \
+                    np.zeros(shape)
+            self.projected_eigenvalue_arrays[self.eigen_spin][
+                self.eigen_kpoint - 1, self.eigen_band - 1] = data
             self.raw_data = []
         elif name == "projected":
             logger.debug("Finished reading projected eigenvalues. "
-                         "No. eigen = {}".format(len(self.eigenvalues)))
+                         "No. eigen = {}"
+                         .format(len(self.projected_eigenvalues)))
             self.read_projected_eigen = False
 
     def endElement(self, name):
@@ -971,6 +981,84 @@ class VasprunHandler(xml.sax.handler.ContentHandler):
         self.state[name] = False
 
 
+class EigenvalueDict(Mapping):
+    """
+    Read-only dict-like view of eigenvalues stored as dense arrays. Provides
+    the {(spin, kpoint index): [[eigenvalue, occu]]} interface, where the
+    values are (nbands, 2) arrays.
+    """
+
+    def __init__(self, arrays):
+        """
+        Args:
+            arrays:
+                Dict of {spin: array of shape (nkpoints, nbands, 2)}.
+        """
+        self._arrays = arrays
+
+    def __getitem__(self, key):
+        (spin, kpoint) = key
+        if spin not in self._arrays or \
+                not 0 <= kpoint < len(self._arrays[spin]):
+            raise KeyError(key)
+        return self._arrays[spin][kpoint]
+
+    def __iter__(self):
+        for spin, data in self._arrays.items():
+            for kpoint in xrange(len(data)):
+                yield (spin, kpoint)
+
+    def __len__(self):
+        return sum([len(data) for data in self._arrays.values()])
+
+
+class ProjectedEigenvalueDict(Mapping):
+    """
+    Read-only dict-like view of projected eigenvalues stored as dense arrays.
+    Provides the {(spin, kpoint index, band index, atom index, Orbital):
+    float} interface.
+    """
+
+    def __init__(self, arrays):
+        """
+        Args:
+            arrays:
+                Dict of {spin: array of shape (nkpoints, nbands, natoms,
+                norbitals)}.
+        """
+        self._arrays = arrays
+
+    def __getitem__(self, key):
+        spin = key[0]
+        index = tuple(key[1:4]) + (int(key[4]),)
+        if spin not in self._arrays or \
+                not all([0 <= i < n for i, n
+                         in zip(index, self._arrays[spin].shape)]):
+            raise KeyError(key)
+        return self._arrays[spin][index]
+
+    def __iter__(self):
+        for spin, data in self._arrays.items():
+            orbitals = [Orbital.from_vasp_index(i)
+                        for i in xrange(data.shape[3])]
+            for (k, b, a) in itertools.product(*[xrange(n)
+                                                 for n in data.shape[:3]]):
+                for orb in orbitals:
+                    yield (spin, k, b, a, orb)
+
+    def __len__(self):
+        return sum([data.size for data in self._arrays.values()])
+
+
+def _rows_to_array(rows):
+    """
+    Converts a list of whitespace-separated rows of numbers into a 2D array
+    in a single pass.
+    """
+    data = np.fromstring(" ".join(rows), sep=" ")
+    return data.reshape((len(rows), -1))
+
+
 def parse_parameters(val_type, val):
     """
     Helper function to convert a Vasprun parameter into the proper type.
@@ -1051,6 +1139,129 @@ def parse_from_incar(filename, key):
     return None
 
 
+#Sections of a calculation which can be very large and are not needed for
+#ionic steps.
+_BULKY_CALC_SECTIONS = ("dos", "eigenvalues", "projected",
+                        "dielectricfunction")
+
+
+def iter_ionic_steps(filename, ionic_step_skip=None):
+    """
+    Iterates over the ionic steps in a vasprun.xml file using an incremental
+    parser. Each ionic step is yielded as soon as it has been read and the
+    consumed elements are discarded, so the memory required is independent of
+    the length of the run. This is the recommended way to analyze the
+    trajectories of long MD runs.
+
+    Args:
+        filename:
+            Filename to parse.
+        ionic_step_skip:
+            If ionic_step_skip is a number > 1, only every ionic_step_skip
+            ionic steps are yielded, using the same convention as Vasprun.
+            The last ionic step is always yielded.
+
+    Yields:
+        Ionic steps in the same format as Vasprun.ionic_steps, i.e.,
+        {"structure": structure, "electronic_steps": [{energies}, ...],
+        "forces": forces, "stress": stress}.
+    """
+    skip = int(ionic_step_skip) if ionic_step_skip else 1
+    atomic_symbols = None
+    pending = None
+    count = 0
+    depth = 0
+    with zopen(filename) as f:
+        context = ElementTree.iterparse(f, events=("start", "end"))
+        (event, root) = context.next()
+        for (event, elem) in context:
+            if event == "start":
+                depth += 1
+                continue
+            depth -= 1
+            if depth == 0:
+                if elem.tag == "atominfo":
+                    atomic_symbols = _parse_atomic_symbols(elem)
+                elif elem.tag == "calculation":
+                    count += 1
+                    if count % skip == 0:
+                        pending = None
+                        yield _parse_ionic_step(elem, atomic_symbols)
+                    else:
+                        #Held on to in case it turns out to be the last step.
+                        pending = elem
+                root.clear()
+            elif depth == 1 and elem.tag in _BULKY_CALC_SECTIONS:
+                elem.clear()
+    if pending is not None:
+        yield _parse_ionic_step(pending, atomic_symbols)
+
+
+def _filter_ionic_steps(f, ionic_step_skip, chunk_size=1048576):
+    """
+    Helper generator which streams the text of a vasprun.xml file in chunks,
+    keeping only every ionic_step_skip <calculation> blocks and the last one.
+    An ionic_step_skip of 0 keeps only the last block. At most one skipped
+    block is held in memory at any time.
+    """
+    tag = "<calculation>"
+    index = 0
+    keep = True
+    pending = []
+    chunk = []
+    size = 0
+    for line in f:
+        for (i, piece) in enumerate(line.split(tag)):
+            if i > 0:
+                #A new block starts, so the previous one was not the last.
+                index += 1
+                keep = ionic_step_skip > 0 and index % ionic_step_skip == 0
+                pending = []
+                piece = tag + piece
+            if keep:
+                chunk.append(piece)
+                size += len(piece)
+            else:
+                pending.append(piece)
+        if size > chunk_size:
+            yield "".join(chunk)
+            chunk = []
+            size = 0
+    chunk.extend(pending)
+    if chunk:
+        yield "".join(chunk)
+
+
+def _parse_varray(elem):
+    """
+    Decodes a <varray> element into a 2D numpy array in a single pass.
+    """
+    return _rows_to_array([v.text for v in elem.findall("v")])
+
+
+def _parse_atomic_symbols(elem):
+    symbols = [rc.find("c").text.strip()
+               for rc in elem.findall("array[@name='atoms']/set/rc")]
+    return [sym if sym != "X" else "Xe" for sym in symbols]
+
+
+def _parse_ionic_step(elem, atomic_symbols):
+    esteps = [{i.attrib["name"]: float(i.text) for i in scstep.iter("i")}
+              for scstep in elem.findall("scstep")]
+    struct = elem.find("structure")
+    structure = Structure(
+        _parse_varray(struct.find("crystal/varray[@name='basis']")),
+        atomic_symbols,
+        _parse_varray(struct.find("varray[@name='positions']")))
+    step = {"electronic_steps": esteps, "structure": structure,
+            "forces": None, "stress": None}
+    for name in ("forces", "stress"):
+        varray = elem.find("varray[@name='{}']".format(name))
+        if varray is not None:
+            step[name] = _parse_varray(varray)
+    return step
+
+
 class Outcar(object):
     """
     Parser for data in OUTCAR that is not available in Vasprun.xml
@@ -1461,8 +1672,14 @@ class VolumetricData(object):
     .. attribute:: ngridpts
 
         Total number of grid points in volumetric data.
+
+    ..attribute:: data_aug
+
+        Augmentation occupancies as a dict of {string: [np.array]}, with the
+        same keys as data and one array per atom. Empty if the file has no
+        augmentation occupancies (e.g., LOCPOT files).
     """
-    def __init__(self, structure, data, distance_matrix=None):
+    def __init__(self, structure, data, distance_matrix=None, data_aug=None):
         """
         Typically, this constructor is not used directly and the static
         from_file constructor is used. This constructor is designed to allow
@@ -1477,11 +1694,14 @@ class VolumetricData(object):
                 A pre-computed distance matrix if available. Useful so pass
                 distance_matrices between sums, shortcircuiting an otherwise
                 expensive operation.
+            data_aug:
+                Augmentation occupancies, if any.
         """
         self.structure = structure
         self.is_spin_polarized = len(data) == 2
         self.dim = data["total"].shape
         self.data = data
+        self.data_aug = data_aug if data_aug else {}
         self.ngridpts = self.dim[0] * self.dim[1] * self.dim[2]
         #lazy init the spin data since this is not always needed.
         self._spin_data = {}
@@ -1549,67 +1769,62 @@ class VolumetricData(object):
         return VolumetricData(self.structure, data, self._distance_matrix)
 
     @staticmethod
-    def parse_file(filename):
+    def parse_file(filename, use_cache=False):
         """
         Convenience method to parse a generic volumetric data file in the vasp
-        like format. Used by subclasses for parsing file.
+        like format. Used by subclasses for parsing file. Each grid is read as
+        a single block and converted with numpy.
 
         Args:
             filename:
                 Path of file to parse
+            use_cache:
+                If True, the parsed grids are saved to binary .npy files
+                alongside filename, and subsequent parses of an unmodified
+                file load the grids from these files as read-only
+                memory-mapped arrays, which is orders of magnitude faster.
+                Defaults to False.
 
         Returns:
-            (poscar, data)
-        """
-        poscar_read = False
-        poscar_string = []
-        dataset = []
-        all_dataset = []
-        dim = None
-        dimline = None
-        read_dataset = False
-        ngrid_pts = 0
-        data_count = 0
-        poscar = None
+            (poscar, data, data_aug)
+        """
+        if use_cache:
+            cached = _load_volumetric_cache(filename)
+            if cached is not None:
+                return cached
+
         with zopen(filename) as f:
+            poscar_string = []
+            for line in f:
+                line = line.strip()
+                if line == "" and len(poscar_string) > 0:
+                    break
+                poscar_string.append(line)
+            poscar = Poscar.from_string("\n".join(poscar_string))
+
+            keys = ["total", "diff"]
+            data = {}
+            data_aug = {}
+            dimline = None
             for line in f:
                 line = line.strip()
-                if read_dataset:
-                    toks = line.split()
-                    for tok in toks:
-                        if data_count < ngrid_pts:
-                            #This complicated procedure is necessary because
-                            #vasp outputs x as the fastest index, followed by y
-                            #then z.
-                            x = data_count % dim[0]
-                            y = int(math.floor(data_count / dim[0])) % dim[1]
-                            z = int(math.floor(data_count / dim[0] / dim[1]))
-                            dataset[x, y, z] = float(tok)
-                            data_count += 1
-                    if data_count >= ngrid_pts:
-                        read_dataset = False
-                        data_count = 0
-                        all_dataset.append(dataset)
-                elif not poscar_read:
-                    if line != "" or len(poscar_string) == 0:
-                        poscar_string.append(line)
-                    elif line == "":
-                        poscar = Poscar.from_string("\n".join(poscar_string))
-                        poscar_read = True
-                elif not dim:
-                    dim = map(int, line.split())
-                    ngrid_pts = dim[0] * dim[1] * dim[2]
+                if dimline is None and line != "":
                     dimline = line
-                    read_dataset = True
-                    dataset = np.zeros(dim)
-                elif line == dimline:
-                    read_dataset = True
-                    dataset = np.zeros(dim)
-            if len(all_dataset) == 2:
-                data = {"total": all_dataset[0], "diff": all_dataset[1]}
-            else:
-                data = {"total": all_dataset[0]}
-            return poscar, data
+                if line == dimline:
+                    if len(data) == len(keys):
+                        break
+                    key = keys[len(data)]
+                    dim = [int(i) for i in dimline.split()]
+                    data[key] = _read_grid(f, dim)
+                    data_aug[key] = []
+                elif line.startswith("augmentation occupancies"):
+                    nvals = int(line.split()[-1])
+                    data_aug[key].append(_read_values(f, nvals))
+
+        data_aug = {k: v for k, v in data_aug.items() if v}
+        if use_cache:
+            _save_volumetric_cache(filename, data, data_aug)
+        return poscar, data, data_aug
 
     def write_file(self, file_name, vasp4_compatible=False):
         """
@@ -1629,19 +1844,13 @@ class VolumetricData(object):
         f.write("\n")
 
         def write_spin(data_type):
-            lines = []
-            count = 0
             f.write("{} {} {}\n".format(a[0], a[1], a[2]))
-            for (k, j, i) in itertools.product(xrange(a[2]), xrange(a[1]),
-                                               xrange(a[0])):
-                lines.append("%0.11e" % self.data[data_type][i, j, k])
-                count += 1
-                if count % 5 == 0:
-                    f.write("".join(lines) + "\n")
-                    lines = []
-                else:
-                    lines.append(" ")
-            f.write("".join(lines) + "\n")
+            _write_values(f, self.data[data_type].ravel(order="F"),
+                          "%0.11e", 5)
+            for (i, occu) in enumerate(self.data_aug.get(data_type, [])):
+                f.write("augmentation occupancies {:3d} {:3d}\n"
+                        .format(i + 1, len(occu)))
+                _write_values(f, occu, "%14.7E", 5)
 
         write_spin("total")
         if self.is_spin_polarized:
@@ -1651,9 +1860,9 @@ class VolumetricData(object):
 
     def get_integrated_diff(self, ind, radius, nbins=1):
         """
-        Get integrated difference of atom index ind up to radius. This can be
-        an extremely computationally intensive process, depending on how many
-        grid points are in the VolumetricData.
+        Get integrated difference of atom index ind up to radius. Only the
+        grid points in the sub-box bounding the sphere around the atom are
+        considered.
 
         Args:
             ind:
@@ -1671,43 +1880,87 @@ class VolumetricData(object):
             ...]. Format is for ease of plotting. E.g., plt.plot(data[:,0],
             data[:,1])
         """
-        #For non-spin-polarized runs, this is zero by definition.
-        if not self.is_spin_polarized:
-            radii = [radius / nbins * (i + 1) for i in xrange(nbins)]
-            data = np.zeros((nbins, 2))
-            data[:, 0] = radii
-            return data
+        return self.get_integrated_diffs([ind], radius, nbins)[0]
 
-        struct = self.structure
-        a = self.dim
-        if ind not in self._distance_matrix or\
-                self._distance_matrix[ind]["max_radius"] < radius:
-            coords = []
-            for (x, y, z) in itertools.product(*[xrange(i) for i in a]):
-                coords.append([x / a[0], y / a[1], z / a[2]])
-            sites_dist = get_points_in_sphere_pbc(struct.lattice, coords,
-                                                  struct[ind].coords,
-                                                  radius)
-            self._distance_matrix[ind] = {"max_radius": radius,
-                                          "data": np.array(sites_dist)}
-
-        data = self._distance_matrix[ind]["data"]
-
-        #Use boolean indexing to find all charges within the desired distance.
-        inds = data[:, 1] <= radius
-        dists = data[inds, 1]
-        data_inds = np.rint(np.mod(list(data[inds, 0]), 1) *
-                            np.tile(a, (len(dists), 1)))
-        vals = [self.data["diff"][x, y, z] for x, y, z in data_inds]
-
-        hist, edges = np.histogram(dists, bins=nbins,
-                                   range=[0, radius],
-                                   weights=vals)
-        data = np.zeros((nbins, 2))
-        data[:, 0] = edges[1:]
-        data[:, 1] = [sum(hist[0:i + 1]) / self.ngridpts
-                      for i in xrange(nbins)]
-        return data
+    def get_integrated_diffs(self, indices=None, radius=1.0, nbins=1):
+        """
+        Get integrated differences for several atoms in one pass. The
+        cartesian offsets of the grid points around an atom are computed once
+        for the lattice and reused for all atoms.
+
+        Args:
+            indices:
+                Indices of atoms. Defaults to None, which means all atoms.
+            radius:
+                Radius of integration, either a single value or a sequence
+                of radii with one radius per atom.
+            nbins:
+                Number of bins. Defaults to 1. See get_integrated_diff.
+
+        Returns:
+            Differential integrated charges as a np array of shape (number
+            of atoms, nbins, 2), with each entry in the same format as
+            get_integrated_diff.
+        """
+        if indices is None:
+            indices = range(len(self.structure))
+        radii = np.array(radius, dtype=np.float64) * np.ones(len(indices))
+        results = np.zeros((len(indices), nbins, 2))
+        for (i, r) in enumerate(radii):
+            results[i, :, 0] = [r / nbins * (j + 1) for j in xrange(nbins)]
+
+        #For non-spin-polarized runs, this is zero by definition.
+        if not self.is_spin_polarized or len(indices) == 0:
+            return results
+
+        a = np.array(self.dim)
+        (offsets, cart_offsets) = self._get_grid_offsets(np.max(radii))
+        matrix = self.structure.lattice.matrix
+        diff = self.data["diff"]
+        for (i, ind) in enumerate(indices):
+            fcoords = self.structure[ind].frac_coords
+            #Grid point closest to the atom on the lower side.
+            base = np.floor(fcoords * a).astype(np.int)
+            shift = np.dot(base / a - fcoords, matrix)
+            dists = np.sqrt(np.sum((cart_offsets + shift) ** 2, axis=1))
+            inds = dists <= radii[i]
+            grid_inds = np.mod(offsets[inds] + base, a)
+            vals = diff[grid_inds[:, 0], grid_inds[:, 1], grid_inds[:, 2]]
+            hist, edges = np.histogram(dists[inds], bins=nbins,
+                                       range=[0, radii[i]], weights=vals)
+            results[i, :, 0] = edges[1:]
+            results[i, :, 1] = np.cumsum(hist) / self.ngridpts
+        return results
+
+    def _get_grid_offsets(self, radius):
+        """
+        Returns the integer offsets of all grid points in the box bounding a
+        sphere of the given radius, together with their cartesian vectors.
+        Results are cached for the largest radius requested so far, and are
+        shared with the results of sums of VolumetricData.
+        """
+        cache = self._distance_matrix
+        if cache.get("max_radius", -1) < radius:
+            a = np.array(self.dim)
+            lattice = self.structure.lattice
+            #The sphere spans r / d_i along each axis, where d_i is the
+            #interplanar spacing. One extra point on each side accounts for
+            #the atom not sitting on a grid point.
+            recp_len = np.array(lattice.reciprocal_lattice.abc)
+            nmax = np.ceil(radius * recp_len / (2 * math.pi) * a) \
+                .astype(np.int) + 1
+            offsets = np.mgrid[-nmax[0]:nmax[0] + 1, -nmax[1]:nmax[1] + 1,
+                               -nmax[2]:nmax[2] + 1].reshape((3, -1)).T
+            cart_offsets = np.dot(offsets / a, lattice.matrix)
+            #Drop the corners of the box, which are out of reach for any
+            #position of the atom within its grid cell.
+            max_shift = np.sum(np.sqrt(np.sum(lattice.matrix ** 2, axis=1))
+                               / a)
+            inds = np.sum(cart_offsets ** 2, axis=1) <= \
+                (radius + max_shift) ** 2
+            cache.update({"max_radius": radius, "offsets": offsets[inds],
+                          "cart_offsets": cart_offsets[inds]})
+        return cache["offsets"], cache["cart_offsets"]
 
     def get_average_along_axis(self, ind):
         """
@@ -1737,21 +1990,35 @@ class Locpot(VolumetricData):
     Simple object for reading a LOCPOT file.
     """
 
-    def __init__(self, poscar, data):
+    def __init__(self, poscar, data, data_aug=None):
         """
         Args:
             poscar:
                 Poscar object containing structure.
             data:
                 Actual data.
+            data_aug:
+                Augmentation occupancies, if any.
         """
-        VolumetricData.__init__(self, poscar.structure, data)
+        VolumetricData.__init__(self, poscar.structure, data,
+                                data_aug=data_aug)
         self.name = poscar.comment
 
     @staticmethod
-    def from_file(filename):
-        (poscar, data) = VolumetricData.parse_file(filename)
-        return Locpot(poscar, data)
+    def from_file(filename, use_cache=False):
+        """
+        Reads a LOCPOT file.
+
+        Args:
+            filename:
+                Filename to read.
+            use_cache:
+                Whether to use a binary cache of the grid data. See
+                VolumetricData.parse_file.
+        """
+        (poscar, data, data_aug) = VolumetricData.parse_file(
+            filename, use_cache=use_cache)
+        return Locpot(poscar, data, data_aug)
 
 
 class Chgcar(VolumetricData):
@@ -1759,23 +2026,134 @@ class Chgcar(VolumetricData):
     Simple object for reading a CHGCAR file.
     """
 
-    def __init__(self, poscar, data):
+    def __init__(self, poscar, data, data_aug=None):
         """
         Args:
             poscar:
                 Poscar object containing structure.
             data:
                 Actual data.
+            data_aug:
+                Augmentation occupancies, if any.
         """
-        VolumetricData.__init__(self, poscar.structure, data)
+        VolumetricData.__init__(self, poscar.structure, data,
+                                data_aug=data_aug)
         self.poscar = poscar
         self.name = poscar.comment
         self._distance_matrix = {}
 
     @staticmethod
-    def from_file(filename):
-        (poscar, data) = VolumetricData.parse_file(filename)
-        return Chgcar(poscar, data)
+    def from_file(filename, use_cache=False):
+        """
+        Reads a CHGCAR file.
+
+        Args:
+            filename:
+                Filename to read.
+            use_cache:
+                Whether to use a binary cache of the grid data. See
+                VolumetricData.parse_file.
+        """
+        (poscar, data, data_aug) = VolumetricData.parse_file(
+            filename, use_cache=use_cache)
+        return Chgcar(poscar, data, data_aug)
+
+
+def _read_values(f, nvals):
+    """
+    Reads nvals whitespace-separated numbers from the following lines of an
+    open file as a single block.
+    """
+    line = f.next()
+    vals = np.fromstring(line, sep=" ")
+    if nvals > len(vals) > 0:
+        nlines = int(math.ceil((nvals - len(vals)) / len(vals)))
+        block = line + " ".join(itertools.islice(f, nlines))
+        vals = np.fromstring(block, sep=" ")
+    while len(vals) < nvals:
+        #Lines with fewer values than the first one.
+        vals = np.concatenate([vals, np.fromstring(f.next(), sep=" ")])
+    if len(vals) != nvals:
+        raise VaspParserError("Expected {} values, found {}."
+                              .format(nvals, len(vals)))
+    return vals
+
+
+def _read_grid(f, dim):
+    """
+    Reads a volumetric grid, which vasp writes with x as the fastest index,
+    followed by y and then z.
+    """
+    return _read_values(f, dim[0] * dim[1] * dim[2]).reshape(dim, order="F")
+
+
+def _write_values(f, vals, fmt, ncols, sep=" "):
+    """
+    Writes values to an open file with ncols values per line. The lines are
+    formatted in large blocks rather than value by value.
+    """
+    vals = np.asarray(vals).ravel()
+    nfull = len(vals) // ncols * ncols
+    line_fmt = sep.join([fmt] * ncols) + "\n"
+    nlines_per_block = 10000
+    block_size = nlines_per_block * ncols
+    for start in xrange(0, nfull, block_size):
+        block = vals[start:min(start + block_size, nfull)]
+        f.write((line_fmt * (len(block) // ncols)) % tuple(block))
+    if nfull < len(vals):
+        f.write(sep.join([fmt] * (len(vals) - nfull)) % tuple(vals[nfull:])
+                + "\n")
+
+
+def _get_volumetric_cache_names(filename):
+    return {"total": filename + ".total.npy", "diff": filename + ".diff.npy",
+            "aug": filename + ".aug.npz"}
+
+
+def _load_volumetric_cache(filename):
+    """
+    Loads the cached data for a volumetric data file written by
+    _save_volumetric_cache. Returns None if there is no up-to-date cache.
+    """
+    cache_files = _get_volumetric_cache_names(filename)
+    mtime = os.path.getmtime(filename)
+
+    def is_valid(fname):
+        return os.path.exists(fname) and os.path.getmtime(fname) >= mtime
+
+    if not is_valid(cache_files["total"]):
+        return None
+    poscar_string = []
+    with zopen(filename) as f:
+        for line in f:
+            line = line.strip()
+            if line == "" and len(poscar_string) > 0:
+                break
+            poscar_string.append(line)
+    poscar = Poscar.from_string("\n".join(poscar_string))
+    data = {k: np.load(fname, mmap_mode="r")
+            for k, fname in cache_files.items()
+            if k != "aug" and is_valid(fname)}
+    data_aug = {}
+    if is_valid(cache_files["aug"]):
+        aug = np.load(cache_files["aug"])
+        for k in data:
+            if k + "_counts" in aug:
+                counts = aug[k + "_counts"]
+                data_aug[k] = np.split(aug[k], np.cumsum(counts)[:-1])
+    return poscar, data, data_aug
+
+
+def _save_volumetric_cache(filename, data, data_aug):
+    cache_files = _get_volumetric_cache_names(filename)
+    for k, d in data.items():
+        np.save(cache_files[k], np.asfortranarray(d))
+    aug = {}
+    for k, occus in data_aug.items():
+        aug[k] = np.concatenate(occus)
+        aug[k + "_counts"] = np.array([len(o) for o in occus])
+    if aug:
+        np.savez(cache_files["aug"], **aug)
 
 
 class Procar(object):
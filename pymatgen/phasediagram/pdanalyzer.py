@@ -27,6 +27,11 @@ from pymatgen.phasediagram.pdmaker import PhaseDiagram, \
 from pymatgen.analysis.reaction_calculator import Reaction
 
 
+#Maximum number of barycentric coordinates computed at once by
+#PDAnalyzer.get_e_above_hulls.
+BATCH_ELEMENTS = 2 ** 22
+
+
 class PDAnalyzer(object):
     """
     A class for performing analyses on Phase Diagrams.
@@ -52,6 +57,7 @@ class PDAnalyzer(object):
                 Phase Diagram to analyze.
         """
         self._pd = pd
+        self._facet_data_cache = None
 
     def _make_comp_matrix(self, complist):
         """
@@ -61,42 +67,78 @@ class PDAnalyzer(object):
         return np.array([[comp.get_atomic_fraction(el)
                           for el in self._pd.elements] for comp in complist])
 
-    def _in_facet(self, facet, comp):
+    @property
+    def _facet_data(self):
+        """
+        Precomputed data for locating compositions in the facets, i.e., the
+        inverses of the transposed composition matrices of all facets,
+        stacked into a single (nfacets, dim, dim) array, and the energies
+        per atom of the facet vertices as a (nfacets, dim) array.
+
+        The data is recomputed when the facets of the phase diagram change
+        (e.g., for an IncrementalPhaseDiagram), but only for the facets whose
+        entries were not in the previous facets.
         """
-        Checks if a composition is in a facet.
+        pd = self._pd
+        if self._facet_data_cache is None or \
+                self._facet_data_cache[0] is not pd.facets:
+            previous = {} if self._facet_data_cache is None \
+                else self._facet_data_cache[1]
+            keys = [tuple([pd.qhull_entries[i] for i in facet])
+                    for facet in pd.facets]
+            new_keys = [k for k in keys if k not in previous]
+            vertices = list(set(itertools.chain(*new_keys)))
+            comps = dict(zip(vertices, self._make_comp_matrix(
+                [e.composition for e in vertices])))
+            facet_data = {}
+            for key in keys:
+                if key in previous:
+                    facet_data[key] = previous[key]
+                else:
+                    facet_data[key] = (
+                        np.linalg.inv(np.array([comps[e] for e in key]).T),
+                        np.array([e.energy_per_atom for e in key]))
+            data = [facet_data[key] for key in keys]
+            self._facet_data_cache = (
+                pd.facets, facet_data,
+                (np.array([d[0] for d in data]),
+                 np.array([d[1] for d in data])))
+        return self._facet_data_cache[2]
+
+    def _get_barycentric_coords(self, comp_matrix):
+        """
+        Returns the barycentric coordinates of compositions in all facets.
 
         Args:
-            facet:
-                facet to test.
-            comp:
-                Composition to test.
-        """
-        els = self._pd.elements
-        dim = len(els)
-        if dim > 1:
-            coords = [np.array(self._pd.qhull_data[facet[i]][0:dim - 1])
-                      for i in xrange(len(facet))]
-            simplex = Simplex(coords)
-            comp_point = [comp.get_atomic_fraction(els[i])
-                          for i in xrange(1, len(els))]
-            return simplex.in_simplex(comp_point, PDAnalyzer.numerical_tol)
-        else:
-            return True
+            comp_matrix:
+                (n, dim) array of atomic fractions, as generated by
+                _make_comp_matrix.
+
+        Returns:
+            (n, nfacets, dim) array of barycentric coordinates. A
+            composition is in a facet if all its coordinates in that facet
+            are non-negative (within numerical_tol).
+        """
+        inverses = self._facet_data[0]
+        return np.einsum("fij,nj->nfi", inverses, comp_matrix)
 
     def _get_facets(self, comp):
         """
         Get the facets that a composition falls into.
         """
-        return filter(lambda f: self._in_facet(f, comp), self._pd.facets)
+        coords = self._get_barycentric_coords(
+            self._make_comp_matrix([comp]))[0]
+        in_facets = np.all(coords >= -PDAnalyzer.numerical_tol, axis=1)
+        return [self._pd.facets[i] for i in np.where(in_facets)[0]]
 
     def _get_facet(self, comp):
         """
         Get any facet that a composition falls into.
         """
-        for facet in self._pd.facets:
-            if self._in_facet(facet, comp):
-                return facet
-        raise RuntimeError("No facet found for comp = {}".format(comp))
+        facets = self._get_facets(comp)
+        if not facets:
+            raise RuntimeError("No facet found for comp = {}".format(comp))
+        return facets[0]
 
     def get_decomposition(self, comp):
         """
@@ -109,14 +151,55 @@ class PDAnalyzer(object):
         Returns:
             Decomposition as a dict of {Entry: amount}
         """
-        facet = self._get_facet(comp)
-        comp_list = [self._pd.qhull_entries[i].composition for i in facet]
-        m = self._make_comp_matrix(comp_list)
-        compm = self._make_comp_matrix([comp])
-        decomp_amts = np.linalg.solve(m.T, compm.T)
-        return {self._pd.qhull_entries[facet[i]]: decomp_amts[i][0]
+        coords = self._get_barycentric_coords(
+            self._make_comp_matrix([comp]))[0]
+        in_facets = np.where(np.all(coords >= -PDAnalyzer.numerical_tol,
+                                    axis=1))[0]
+        if len(in_facets) == 0:
+            raise RuntimeError("No facet found for comp = {}".format(comp))
+        facet = self._pd.facets[in_facets[0]]
+        decomp_amts = coords[in_facets[0]]
+        return {self._pd.qhull_entries[facet[i]]: decomp_amts[i]
                 for i in xrange(len(decomp_amts))
-                if abs(decomp_amts[i][0]) > PDAnalyzer.numerical_tol}
+                if abs(decomp_amts[i]) > PDAnalyzer.numerical_tol}
+
+    def _get_e_above_hulls(self, entries, allow_negative=False):
+        """
+        Computes the energies above hull of a batch of entries. For each
+        entry, the first facet it falls into which gives a non-negative
+        energy above hull is used (unless allow_negative is True).
+
+        Returns:
+            (facet indices, barycentric coords in these facets, energies
+            above hull) as numpy arrays. The facet index is -1 for entries
+            with no valid decomposition.
+        """
+        (inverses, facet_energies) = self._facet_data
+        nfacets = len(facet_energies)
+        comp_matrix = self._make_comp_matrix([e.composition
+                                              for e in entries])
+        energies = np.array([e.energy_per_atom for e in entries])
+        facet_inds = -np.ones(len(entries), dtype=np.int)
+        all_coords = np.zeros(comp_matrix.shape)
+        ehulls = np.zeros(len(entries))
+        #Entries are processed in blocks to bound the memory used.
+        block = max(1, BATCH_ELEMENTS // max(1, nfacets * self._pd.dim))
+        for start in xrange(0, len(entries), block):
+            sl = slice(start, start + block)
+            coords = self._get_barycentric_coords(comp_matrix[sl])
+            in_facets = np.all(coords >= -PDAnalyzer.numerical_tol, axis=2)
+            amts = np.where(np.abs(coords) > PDAnalyzer.numerical_tol,
+                            coords, 0)
+            e = energies[sl, None] - np.sum(amts * facet_energies[None],
+                                            axis=2)
+            valid = in_facets if allow_negative else in_facets & (e >= 0)
+            first = np.argmax(valid, axis=1)
+            found = valid[np.arange(len(first)), first]
+            inds = np.arange(start, start + len(first))[found]
+            facet_inds[inds] = first[found]
+            all_coords[inds] = coords[found, first[found]]
+            ehulls[inds] = e[found, first[found]]
+        return facet_inds, all_coords, ehulls
 
     def get_decomp_and_e_above_hull(self, entry, allow_negative=False):
         """
@@ -138,22 +221,48 @@ class PDAnalyzer(object):
             return {entry: 1}, 0
 
         # Hackish fix to deal with problem of -ve ehulls in very high
-        # dimensional convex hulls (typically 8D and above).
+        # dimensional convex hulls (typically 8D and above). The first facet
+        # which gives a non-negative ehull is used.
         # TODO: find a better fix.
-        for facet in self._get_facets(entry.composition):
-            comp_list = [self._pd.qhull_entries[i].composition for i in facet]
-            m = self._make_comp_matrix(comp_list)
-            compm = self._make_comp_matrix([entry.composition])
-            decomp_amts = np.linalg.solve(m.T, compm.T)
-            decomp = {self._pd.qhull_entries[facet[i]]: decomp_amts[i][0]
-                      for i in xrange(len(decomp_amts))
-                      if abs(decomp_amts[i][0]) > PDAnalyzer.numerical_tol}
-            ehull = entry.energy_per_atom
-            for e, amt in decomp.items():
-                ehull -= e.energy_per_atom * amt
-            if allow_negative or ehull >= 0:
-                return decomp, ehull
-        raise ValueError("No valid decomp found!")
+        (facet_inds, coords, ehulls) = self._get_e_above_hulls(
+            [entry], allow_negative)
+        if facet_inds[0] < 0:
+            raise ValueError("No valid decomp found!")
+        facet = self._pd.facets[facet_inds[0]]
+        decomp = {self._pd.qhull_entries[facet[i]]: coords[0][i]
+                  for i in xrange(len(facet))
+                  if abs(coords[0][i]) > PDAnalyzer.numerical_tol}
+        return decomp, ehulls[0]
+
+    def get_e_above_hulls(self, entries=None):
+        """
+        Provides the energies above convex hull for many entries at once.
+        All entries are located in the facets with a single vectorized
+        operation, which is much faster than calling get_e_above_hull for
+        each entry.
+
+        Args:
+            entries:
+                Sequence of PDEntry like objects. Defaults to None, which
+                means all entries of the phase diagram.
+
+        Returns:
+            List of energies above convex hull, in the order of the entries.
+            Stable entries have energy above hull of 0.
+        """
+        entries = self._pd.all_entries if entries is None else list(entries)
+        (facet_inds, coords, ehulls) = self._get_e_above_hulls(entries)
+        stable = self._pd.stable_entries
+        output = []
+        for entry, ind, ehull in zip(entries, facet_inds, ehulls):
+            if entry in stable:
+                output.append(0)
+            elif ind < 0:
+                raise ValueError("No valid decomp found for {}!"
+                                 .format(entry))
+            else:
+                output.append(ehull)
+        return output
 
     def get_e_above_hull(self, entry):
         """
@@ -16,6 +16,10 @@ __date__ = "Nov 25, 2012"
 
 import collections
 import itertools
+import time
+import logging
+from multiprocessing import Pool
+
 import numpy as np
 
 from pyhull.convex_hull import ConvexHull
@@ -23,9 +27,11 @@ from pyhull.convex_hull import ConvexHull
 from pymatgen.core.composition import Composition
 from pymatgen.phasediagram.entries import GrandPotPDEntry, TransformedPDEntry
 
-from pymatgen.core.periodic_table import DummySpecie
+from pymatgen.core.periodic_table import Element, DummySpecie
 from pymatgen.analysis.reaction_calculator import Reaction, ReactionError
 
+logger = logging.getLogger(__name__)
+
 
 class PhaseDiagram (object):
     """
@@ -75,6 +81,11 @@ class PhaseDiagram (object):
 
         Actual entries used in convex hull. Excludes all positive formation
         energy entries.
+
+    .. attribute: timings:
+
+        Dict of the time in seconds spent on "preprocessing" the entries and
+        on building the "hull".
     """
 
     # Tolerance for determining if formation energy is positive.
@@ -96,72 +107,40 @@ class PhaseDiagram (object):
             elements = set()
             map(elements.update, [entry.composition.elements
                                   for entry in entries])
-        error = True
-        # Qhull seems to be sensitive to choice of independent composition
-        # components due to numerical issues in higher dimensions. The
-        # code permutes the element sequence until one that works is found.
-        for elements in itertools.permutations(elements):
-            try:
-                elements = tuple(elements)
-                dim = len(elements)
-                el_refs = {}
-                for el in elements:
-                    el_entries = filter(lambda e: e.composition.is_element and
-                                        e.composition.elements[0] == el,
-                                        entries)
-                    if len(el_entries) == 0:
-                        raise PhaseDiagramError(
-                            "There are no entries associated with terminal {}."
-                            .format(el))
-                    el_refs[el] = min(el_entries,
-                                      key=lambda e: e.energy_per_atom)
-
-                data = []
-                for entry in entries:
-                    comp = entry.composition
-                    row = map(comp.get_atomic_fraction, elements)
-                    row.append(entry.energy_per_atom)
-                    data.append(row)
-                data = np.array(data)
-                self.all_entries_hulldata = data[:, 1:]
-
-                # Calculate formation energies and remove positive formation
-                # energy entries
-                vec = [el_refs[el].energy_per_atom for el in elements]
-                vec.append(-1)
-                form_e = -np.dot(data, vec)
-                ind = np.where(form_e <= -self.formation_energy_tol)[0].tolist()
-                ind.extend(map(entries.index, el_refs.values()))
-                qhull_entries = [entries[i] for i in ind]
-                qhull_data = data[ind][:, 1:]
-
-                if len(qhull_data) == dim:
-                    self.facets = [range(dim)]
-                else:
-                    facets = ConvexHull(qhull_data).vertices
-                    finalfacets = []
-                    for facet in facets:
-                        is_non_element_facet = any(
-                            (len(qhull_entries[i].composition) > 1
-                             for i in facet))
-                        if is_non_element_facet:
-                            m = qhull_data[facet]
-                            m[:, -1] = 1
-                            if abs(np.linalg.det(m)) > 1e-8:
-                                finalfacets.append(facet)
-                    self.facets = finalfacets
-                self.all_entries = entries
-                self.qhull_data = qhull_data
-                self.dim = dim
-                self.el_refs = el_refs
-                self.elements = elements
-                self.qhull_entries = qhull_entries
-                error = False
-                break
-            except:
-                pass
-        if error:
-            raise PhaseDiagramError("Unable to construct PD")
+        start_time = time.time()
+        self.elements = tuple(elements)
+        self.dim = len(elements)
+        self._build(entries, _get_entries_data(entries, self.elements),
+                    start_time)
+
+    def _build(self, entries, data, start_time, hull=None):
+        """
+        Builds the phase diagram from the entries and their hull data, i.e.,
+        an array of the atomic fractions of the elements followed by the
+        energy per atom for each entry. A hull already computed with
+        _get_hull can be supplied.
+        """
+        preprocessing_time = time.time() - start_time
+        if hull is None:
+            hull = _get_hull(data, self.elements,
+                             tol=self.formation_energy_tol)
+        (refs, ind, form_e, self.facets) = hull
+        el_refs = {el: entries[i] for el, i in zip(self.elements, refs)}
+        qhull_entries = [entries[i] for i in ind]
+        qhull_data = data[ind][:, 1:]
+        self.all_entries = entries
+        self.all_entries_hulldata = data[:, 1:]
+        self.qhull_data = qhull_data
+        self.el_refs = el_refs
+        self.qhull_entries = qhull_entries
+        self._entries_data = data
+        self._qhull_fracs = data[ind][:, :-1]
+        self._qhull_form_e = form_e
+        self.timings = {"preprocessing": preprocessing_time,
+                        "hull": time.time() - start_time - preprocessing_time}
+        logger.debug("{}: preprocessing {:.4f} s, hull {:.4f} s".format(
+            "-".join([el.symbol for el in self.elements]),
+            self.timings["preprocessing"], self.timings["hull"]))
 
     @property
     def unstable_entries(self):
@@ -375,6 +354,448 @@ class CompoundPhaseDiagram(PhaseDiagram):
         return new_entries, sp_mapping
 
 
+class IncrementalPhaseDiagram(PhaseDiagram):
+    """
+    A phase diagram which can be updated with new entries, or have entries
+    removed, without being rebuilt from scratch.
+
+    The hull data of all entries is cached, so that the compositions of
+    existing entries are never processed again. New entries are appended to
+    all_entries and qhull_entries, so that the indices of existing entries,
+    and hence the facets not affected by an update, are unchanged (which
+    allows a PDAnalyzer to reuse its precomputed data for these facets).
+    A new entry below the hull only replaces the facets which lie above it,
+    by connecting the new entry to the boundary of the region they cover.
+
+    The phase diagram is rebuilt from the cached hull data if the elemental
+    references change, if a stable entry is removed, or if more than
+    rebuild_fraction of the hull entries are added at once, where a single
+    hull computation is faster than inserting the entries one at a time.
+    """
+
+    # Tolerance for determining if an entry is below a facet.
+    hull_tol = 1e-8
+
+    # Maximum number of new hull entries, as a fraction of the existing
+    # hull entries, which are inserted one at a time.
+    rebuild_fraction = 0.1
+
+    def __init__(self, entries, elements=None):
+        """
+        Args:
+            entries:
+                A list of PDEntry-like objects having an energy,
+                energy_per_atom and composition.
+            elements:
+                Optional list of elements in the phase diagram. If set to None,
+                the elements are determined from the the entries themselves.
+        """
+        PhaseDiagram.__init__(self, list(entries), elements)
+
+    def add_entries(self, entries):
+        """
+        Adds entries to the phase diagram.
+
+        Args:
+            entries:
+                Sequence of PDEntry-like objects.
+        """
+        start_time = time.time()
+        entries = list(entries)
+        if not entries:
+            return
+        data = _get_entries_data(entries, self.elements)
+        all_entries = self.all_entries + entries
+        all_data = np.concatenate([self._entries_data, data])
+        for entry in entries:
+            comp = entry.composition
+            if comp.is_element and comp.elements[0] in self.el_refs and \
+                    entry.energy_per_atom < \
+                    self.el_refs[comp.elements[0]].energy_per_atom:
+                self._build(all_entries, all_data, start_time)
+                return
+
+        vec = [self.el_refs[el].energy_per_atom for el in self.elements]
+        vec.append(-1)
+        form_e = -np.dot(data, vec)
+        ind = np.where(form_e <= -self.formation_energy_tol)[0]
+        nqhull = len(self.qhull_entries)
+        qhull_entries = self.qhull_entries + [entries[i] for i in ind]
+        qhull_data = np.concatenate([self.qhull_data, data[ind][:, 1:]])
+        qhull_fracs = np.concatenate([self._qhull_fracs, data[ind][:, :-1]])
+        qhull_form_e = np.concatenate([self._qhull_form_e, form_e[ind]])
+        preprocessing_time = time.time() - start_time
+
+        facets = self.facets
+        if len(ind) > self.rebuild_fraction * nqhull:
+            facets = _get_lower_hull_facets(qhull_data, qhull_form_e)
+        else:
+            for i in xrange(nqhull, len(qhull_entries)):
+                new_facets = _insert_hull_point(facets, qhull_fracs,
+                                                qhull_form_e, i,
+                                                self.hull_tol)
+                if new_facets is not None:
+                    facets = new_facets
+        self.facets = facets
+        self.all_entries = all_entries
+        self.all_entries_hulldata = all_data[:, 1:]
+        self.qhull_data = qhull_data
+        self.qhull_entries = qhull_entries
+        self._entries_data = all_data
+        self._qhull_fracs = qhull_fracs
+        self._qhull_form_e = qhull_form_e
+        self.timings = {"preprocessing": preprocessing_time,
+                        "hull": time.time() - start_time - preprocessing_time}
+
+    def add_entry(self, entry):
+        """
+        Adds an entry to the phase diagram.
+
+        Args:
+            entry:
+                A PDEntry-like object.
+        """
+        self.add_entries([entry])
+
+    def remove_entries(self, entries):
+        """
+        Removes entries from the phase diagram.
+
+        Args:
+            entries:
+                Sequence of PDEntry-like objects in the phase diagram.
+        """
+        start_time = time.time()
+        to_remove = set(entries)
+        if not to_remove:
+            return
+        keep = [i for i, e in enumerate(self.all_entries)
+                if e not in to_remove]
+        all_entries = [self.all_entries[i] for i in keep]
+        all_data = self._entries_data[keep]
+        if not to_remove.isdisjoint(self.stable_entries):
+            self._build(all_entries, all_data, start_time)
+            return
+
+        keep = [i for i, e in enumerate(self.qhull_entries)
+                if e not in to_remove]
+        mapping = np.zeros(len(self.qhull_entries), dtype=np.int)
+        mapping[keep] = np.arange(len(keep))
+        self.facets = mapping[np.array(self.facets, dtype=np.int)].tolist()
+        self.all_entries = all_entries
+        self.all_entries_hulldata = all_data[:, 1:]
+        self.qhull_data = self.qhull_data[keep]
+        self.qhull_entries = [self.qhull_entries[i] for i in keep]
+        self._entries_data = all_data
+        self._qhull_fracs = self._qhull_fracs[keep]
+        self._qhull_form_e = self._qhull_form_e[keep]
+        self.timings = {"preprocessing": time.time() - start_time,
+                        "hull": 0}
+
+    def remove_entry(self, entry):
+        """
+        Removes an entry from the phase diagram.
+
+        Args:
+            entry:
+                A PDEntry-like object in the phase diagram.
+        """
+        self.remove_entries([entry])
+
+
+def get_phase_diagrams(entries, chemsyses=None, ncpus=None):
+    """
+    Builds the phase diagrams of many chemical systems from a single pool of
+    entries, e.g., all Li-M-O ternaries.
+
+    The atomic fractions of all entries are computed only once, and the
+    chemical systems and all their subsystems are built in order of
+    increasing dimension. Since entries which are unstable in a subsystem
+    are also unstable in all systems containing it, the hull of each system
+    is computed only from the stable entries of its subsystems and the
+    entries spanning the whole system. Systems of the same dimension are
+    independent and are built in parallel if ncpus is set.
+
+    Note that the qhull_entries of the phase diagrams only contain the
+    entries used in the hulls.
+
+    Args:
+        entries:
+            Sequence of PDEntry-like objects.
+        chemsyses:
+            Sequence of chemical systems, either as strings such as
+            "Fe-Li-O" or as sequences of elements or element symbols.
+            Defaults to None, which means all chemical systems of the entries
+            which are not part of a larger one.
+        ncpus:
+            Number of cpus to use. Default of None means serial processing.
+
+    Returns:
+        {chemsys: PhaseDiagram}, where chemsys is the "-" joined sorted
+        symbols of the elements, e.g., "Fe-Li-O".
+    """
+    entries = list(entries)
+    elements = set()
+    for entry in entries:
+        elements.update(entry.composition.elements)
+    elements = sorted(elements, key=lambda el: el.symbol)
+    data = _get_entries_data(entries, elements)
+    #Group the entries by chemical system, as sorted tuples of the indices
+    #of their elements.
+    groups = collections.defaultdict(list)
+    for i, row in enumerate(data[:, :-1] > 0):
+        groups[tuple(np.where(row)[0])].append(i)
+
+    if chemsyses is None:
+        targets = []
+        for system in sorted(groups, key=len, reverse=True):
+            if not any(set(system).issubset(t) for t in targets):
+                targets.append(system)
+    else:
+        indices = {el: i for i, el in enumerate(elements)}
+        targets = []
+        for chemsys in chemsyses:
+            if isinstance(chemsys, basestring):
+                chemsys = chemsys.split("-")
+            system = []
+            for el in chemsys:
+                el = Element(el) if isinstance(el, basestring) else el
+                if el not in indices:
+                    raise PhaseDiagramError(
+                        "There are no entries associated with terminal {}."
+                        .format(el))
+                system.append(indices[el])
+            targets.append(tuple(sorted(set(system))))
+
+    #All subsystems of the targets, by dimension.
+    levels = collections.defaultdict(set)
+    for system in targets:
+        for dim in xrange(1, len(system) + 1):
+            levels[dim].update(itertools.combinations(system, dim))
+
+    stable = {}
+    phase_diagrams = {}
+    pool = Pool(ncpus) if ncpus else None
+    try:
+        for dim in sorted(levels):
+            systems = sorted(levels[dim])
+            system_inds = []
+            tasks = []
+            for system in systems:
+                inds = []
+                for n in xrange(1, dim + 1):
+                    for sub in itertools.combinations(system, n):
+                        inds.extend(groups.get(sub, []))
+                inds.sort()
+                candidates = set(groups.get(system, []))
+                for sub in itertools.combinations(system, dim - 1):
+                    candidates.update(stable.get(sub, []))
+                system_inds.append(inds)
+                tasks.append((data[inds][:, list(system) + [-1]],
+                              [elements[i] for i in system],
+                              np.array([i in candidates for i in inds],
+                                       dtype=bool)))
+            if pool is not None and len(tasks) > 1:
+                results = pool.map(_get_hull_task, tasks)
+            else:
+                results = map(_get_hull_task, tasks)
+            for system, inds, task, (hull_time, hull) in \
+                    zip(systems, system_inds, tasks, results):
+                facets = hull[3]
+                stable[system] = [inds[hull[1][i]]
+                                  for i in set(itertools.chain(*facets))]
+                if system in targets:
+                    pd = PhaseDiagram.__new__(PhaseDiagram)
+                    pd.elements = tuple(task[1])
+                    pd.dim = dim
+                    pd._build([entries[i] for i in inds], task[0],
+                              time.time(), hull)
+                    pd.timings["hull"] = hull_time
+                    chemsys = "-".join([el.symbol for el in pd.elements])
+                    phase_diagrams[chemsys] = pd
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return phase_diagrams
+
+
+def _get_entries_data(entries, elements):
+    """
+    Returns the hull data of entries, i.e., an array of the atomic fractions
+    of the elements followed by the energy per atom for each entry.
+    """
+    indices = {el: i for i, el in enumerate(elements)}
+    data = np.zeros((len(entries), len(elements) + 1))
+    for row, entry in zip(data, entries):
+        comp = entry.composition
+        for el, amt in comp.items():
+            if el in indices:
+                row[indices[el]] = amt / comp.num_atoms
+        row[-1] = entry.energy_per_atom
+    return data
+
+
+def _get_hull(data, elements, candidates=None,
+              tol=PhaseDiagram.formation_energy_tol):
+    """
+    Computes the elemental references and the lower convex hull of a phase
+    diagram from the hull data of its entries.
+
+    Args:
+        data:
+            (n, dim + 1) array of the atomic fractions of the elements
+            followed by the energy per atom for each entry.
+        elements:
+            Elements of the phase diagram.
+        candidates:
+            Optional boolean array of the entries which may be on the hull.
+            Other entries are known to be above the hull, e.g., from the
+            hulls of the subsystems, and are not used in the hull. Defaults
+            to None, which means all entries.
+        tol:
+            Tolerance for determining if formation energy is positive.
+
+    Returns:
+        (refs, ind, form_e, facets): indices of the elemental reference
+        entries in the order of the elements, indices of the entries used in
+        the hull, formation energies per atom of these entries and the facets
+        as lists of indices into ind.
+    """
+    refs = []
+    for i, el in enumerate(elements):
+        el_inds = np.where(data[:, i] == 1)[0]
+        if len(el_inds) == 0:
+            raise PhaseDiagramError(
+                "There are no entries associated with terminal {}."
+                .format(el))
+        refs.append(el_inds[np.argmin(data[el_inds, -1])])
+
+    # Calculate formation energies and remove positive formation
+    # energy entries
+    vec = data[refs, -1].tolist()
+    vec.append(-1)
+    form_e = -np.dot(data, vec)
+    below = form_e <= -tol
+    if candidates is not None:
+        below &= candidates
+    ind = np.where(below)[0].tolist()
+    ind.extend(refs)
+    dim = len(elements)
+    if len(ind) == dim:
+        facets = [range(dim)]
+    else:
+        facets = _get_lower_hull_facets(data[ind][:, 1:], form_e[ind])
+    return refs, ind, form_e[ind], facets
+
+
+def _get_hull_task(args):
+    """
+    Computes a hull with _get_hull, for use with multiprocessing.
+
+    Returns:
+        (time in seconds spent, hull).
+    """
+    start_time = time.time()
+    (data, elements, candidates) = args
+    hull = _get_hull(data, elements, candidates)
+    return time.time() - start_time, hull
+
+
+def _get_lower_hull_facets(qhull_data, form_e):
+    """
+    Computes the facets of the lower convex hull of the phase diagram in a
+    single pass.
+
+    The hull is computed on the formation energies, which are of similar
+    magnitude as the composition coordinates regardless of the energy
+    references, and which makes the hull well-conditioned irrespective of
+    the order of the elements. A single extra point is added above the
+    center of the composition space, so that all upper and vertical facets
+    contain it and the lower hull is obtained by simply discarding these
+    facets. If Qhull fails on the exact data, the input is joggled.
+
+    Args:
+        qhull_data:
+            Array of (composition coordinates, energy per atom) of the hull
+            entries.
+        form_e:
+            Formation energies per atom of the hull entries.
+
+    Returns:
+        List of facets as lists of indices of the hull entries.
+    """
+    dim = qhull_data.shape[1]
+    hull_data = np.array(qhull_data, dtype=np.float64)
+    hull_data[:, -1] = form_e
+    extra_point = np.zeros(dim) + 1 / dim
+    extra_point[-1] = np.max(form_e) + 1
+    hull_data = np.concatenate([hull_data, [extra_point]])
+    extra_index = len(hull_data) - 1
+    try:
+        facets = ConvexHull(hull_data.tolist()).vertices
+    except Exception:
+        facets = ConvexHull(hull_data.tolist(), joggle=True).vertices
+    finalfacets = []
+    for facet in facets:
+        if extra_index in facet:
+            continue
+        m = hull_data[facet]
+        m[:, -1] = 1
+        if abs(np.linalg.det(m)) > 1e-8:
+            finalfacets.append(facet)
+    return finalfacets
+
+
+def _insert_hull_point(facets, fracs, form_e, index, tol):
+    """
+    Inserts a point into the lower convex hull of the phase diagram.
+
+    The facets which lie above the new point (by more than tol) are removed,
+    and each ridge on the boundary of the region they cover, i.e., each
+    ridge of a removed facet which is either shared with a remaining facet
+    or on the boundary of the composition space, is connected to the new
+    point. Degenerate new facets, which arise when the new point is on the
+    boundary of the composition space, are discarded.
+
+    Args:
+        facets:
+            Facets of the lower hull as lists of indices of the hull entries.
+        fracs:
+            (n, dim) array of the atomic fractions of the hull entries.
+        form_e:
+            Formation energies per atom of the hull entries.
+        index:
+            Index of the new point in fracs and form_e.
+        tol:
+            Tolerance for determining if the point is below a facet.
+
+    Returns:
+        The new list of facets, or None if the point is not below the hull.
+    """
+    facet_array = np.array(facets, dtype=np.int)
+    (nfacets, dim) = facet_array.shape
+    coords = np.linalg.solve(np.transpose(fracs[facet_array], (0, 2, 1)),
+                             np.tile(fracs[index], (nfacets, 1)))
+    plane_e = np.sum(coords * form_e[facet_array], axis=1)
+    visible = form_e[index] < plane_e - tol
+    if not np.any(visible):
+        return None
+    ridge_counts = collections.defaultdict(lambda: [0, 0])
+    for facet, is_visible in zip(facet_array.tolist(), visible):
+        for i in xrange(dim):
+            counts = ridge_counts[tuple(sorted(facet[:i] + facet[i + 1:]))]
+            counts[0] += is_visible
+            counts[1] += 1
+    new_facets = [facets[i] for i in np.where(~visible)[0]]
+    for ridge, (nvisible, nfacets) in ridge_counts.items():
+        if nvisible == 1 and nfacets <= 2:
+            facet = list(ridge) + [index]
+            if abs(np.linalg.det(fracs[facet])) > 1e-8:
+                new_facets.append(facet)
+    return new_facets
+
+
 class PhaseDiagramError(Exception):
     """
     An exception class for Phase Diagram generation.
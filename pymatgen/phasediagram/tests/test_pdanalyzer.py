@@ -25,6 +25,16 @@ class  PDAnalyzerTest(unittest.TestCase):
                 self.assertGreaterEqual(self.analyzer.get_e_above_hull(entry),
                                         0)
 
+    def test_get_e_above_hulls(self):
+        ehulls = self.analyzer.get_e_above_hulls()
+        self.assertEqual(len(ehulls), len(self.pd.all_entries))
+        for entry, ehull in zip(self.pd.all_entries, ehulls):
+            self.assertAlmostEqual(ehull,
+                                   self.analyzer.get_e_above_hull(entry))
+        entries = self.pd.all_entries[:10]
+        self.assertEqual(self.analyzer.get_e_above_hulls(entries),
+                         ehulls[:10])
+
     def test_get_equilibrium_reaction_energy(self):
         for entry in self.pd.stable_entries:
             self.assertLessEqual(
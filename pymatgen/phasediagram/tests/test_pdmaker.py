@@ -1,10 +1,13 @@
 import unittest
 import os
+import itertools
 
 from pymatgen import Element, Composition
-from pymatgen.phasediagram.entries import PDEntryIO
+from pymatgen.phasediagram.entries import PDEntryIO, PDEntry
 from pymatgen.phasediagram.pdmaker import PhaseDiagram, \
-    GrandPotentialPhaseDiagram, CompoundPhaseDiagram, PhaseDiagramError
+    GrandPotentialPhaseDiagram, CompoundPhaseDiagram, PhaseDiagramError, \
+    IncrementalPhaseDiagram, get_phase_diagrams
+from pymatgen.phasediagram.pdanalyzer import PDAnalyzer
 
 
 class PhaseDiagramTest(unittest.TestCase):
@@ -52,9 +55,120 @@ class PhaseDiagramTest(unittest.TestCase):
     def test_all_entries_hulldata(self):
         self.assertEqual(len(self.pd.all_entries_hulldata), 492)
 
+    def test_element_order_and_references(self):
+        #The hull must not depend on the order of the elements or on the
+        #energy references.
+        stable = set(e.name for e in self.pd.stable_entries)
+        shifts = {Element("Li"): 1e4, Element("Fe"): -3e4, Element("O"): 5e3}
+        entries = [PDEntry(e.composition, e.energy + sum(
+            [shifts[el] * amt for el, amt in e.composition.items()]), e.name)
+            for e in self.entries]
+        for elements in itertools.permutations(self.elements):
+            pd = PhaseDiagram(entries, elements)
+            self.assertEqual(set(e.name for e in pd.stable_entries), stable)
+            self.assertEqual(len(pd.facets), len(self.pd.facets))
+
+    def test_timings(self):
+        self.assertEqual(set(self.pd.timings.keys()),
+                         set(["preprocessing", "hull"]))
+        self.assertTrue(all(t >= 0 for t in self.pd.timings.values()))
+
     def test_str(self):
         self.assertIsNotNone(str(self.pd))
 
+    def test_get_phase_diagrams(self):
+        for ncpus in (None, 2):
+            pds = get_phase_diagrams(self.entries, ["Li-Fe-O", "Li-O",
+                                                    ["Fe", "O"]], ncpus=ncpus)
+            self.assertEqual(sorted(pds.keys()), ["Fe-Li-O", "Fe-O", "Li-O"])
+            pd = pds["Fe-Li-O"]
+            self.assertEqual(set(pd.all_entries), set(self.entries))
+            self.assertEqual(set(pd.stable_entries),
+                             set(self.pd.stable_entries))
+            ehulls = PDAnalyzer(pd).get_e_above_hulls(self.entries)
+            expected = PDAnalyzer(self.pd).get_e_above_hulls(self.entries)
+            for e1, e2 in zip(ehulls, expected):
+                self.assertAlmostEqual(e1, e2)
+            for chemsys in ["Fe-O", "Li-O"]:
+                els = set(Composition(chemsys.replace("-", "")).elements)
+                entries = [e for e in self.entries
+                           if set(e.composition.elements).issubset(els)]
+                self.assertEqual(set(pds[chemsys].all_entries), set(entries))
+                self.assertEqual(set(pds[chemsys].stable_entries),
+                                 set(PhaseDiagram(entries).stable_entries))
+        self.assertEqual(list(get_phase_diagrams(self.entries).keys()),
+                         ["Fe-Li-O"])
+        self.assertRaises(PhaseDiagramError, get_phase_diagrams,
+                          self.entries, ["Li-Mn-O"])
+
+
+class IncrementalPhaseDiagramTest(unittest.TestCase):
+
+    def setUp(self):
+        module_dir = os.path.dirname(os.path.abspath(__file__))
+        (self.elements, self.entries) = \
+            PDEntryIO.from_csv(os.path.join(module_dir, "pdentries_test.csv"))
+        self.pd = PhaseDiagram(self.entries)
+
+    def assertSameHull(self, pd1, pd2):
+        self.assertEqual(set(pd1.all_entries), set(pd2.all_entries))
+        self.assertEqual(set(pd1.stable_entries), set(pd2.stable_entries))
+        ehulls1 = PDAnalyzer(pd1).get_e_above_hulls(pd1.all_entries)
+        ehulls2 = PDAnalyzer(pd2).get_e_above_hulls(pd1.all_entries)
+        for e1, e2 in zip(ehulls1, ehulls2):
+            self.assertAlmostEqual(e1, e2)
+
+    def test_add_entries(self):
+        elements = [e for e in self.entries if e.composition.is_element]
+        others = [e for e in self.entries if not e.composition.is_element]
+        pd = IncrementalPhaseDiagram(elements + others[:10])
+        analyzer = PDAnalyzer(pd)
+        analyzer.get_e_above_hulls()
+        for entry in others[10:]:
+            qhull_entries = pd.qhull_entries
+            pd.add_entry(entry)
+            #Existing entries keep their indices.
+            self.assertEqual(pd.qhull_entries[:len(qhull_entries)],
+                             qhull_entries)
+            analyzer.get_e_above_hulls([entry])
+        self.assertSameHull(pd, self.pd)
+        self.assertEqual(len(pd.facets), len(self.pd.facets))
+        self.assertAlmostEqual(analyzer.get_e_above_hull(others[0]),
+                               PDAnalyzer(self.pd).get_e_above_hull(others[0]))
+
+        #Adding many entries at once rebuilds the hull.
+        pd = IncrementalPhaseDiagram(elements)
+        pd.add_entries(others)
+        self.assertSameHull(pd, self.pd)
+
+    def test_new_references(self):
+        pd = IncrementalPhaseDiagram(self.entries)
+        li = pd.el_refs[Element("Li")]
+        entry = PDEntry(li.composition, li.energy - 1)
+        pd.add_entry(entry)
+        self.assertEqual(pd.el_refs[Element("Li")], entry)
+        self.assertSameHull(pd, PhaseDiagram(self.entries + [entry]))
+
+    def test_remove_entries(self):
+        pd = IncrementalPhaseDiagram(self.entries)
+        unstable = list(self.pd.unstable_entries)[:20]
+        pd.remove_entries(unstable)
+        self.assertSameHull(pd, PhaseDiagram([e for e in self.entries
+                                              if e not in unstable]))
+        stable = [e for e in pd.stable_entries
+                  if not e.composition.is_element][0]
+        pd.remove_entry(stable)
+        self.assertSameHull(pd, PhaseDiagram([e for e in self.entries
+                                              if e not in unstable and
+                                              e != stable]))
+        li = pd.el_refs[Element("Li")]
+        li_entries = [e for e in pd.all_entries
+                      if e.composition.is_element and
+                      e.composition.elements[0] == Element("Li")]
+        self.assertRaises(PhaseDiagramError, pd.remove_entries, li_entries)
+        pd.remove_entry(li)
+        self.assertNotEqual(pd.el_refs[Element("Li")], li)
+
 
 class GrandPotentialPhaseDiagramTest(unittest.TestCase):
 
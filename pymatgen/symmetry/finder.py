@@ -19,8 +19,10 @@ __maintainer__ = "Shyue Ping Ong"
 __email__ = "shyue@mit.edu"
 __date__ = "Mar 9, 2012"
 
-import re
 import itertools
+import copy
+from collections import OrderedDict
+from multiprocessing import Pool
 
 import numpy as np
 import math
@@ -34,6 +36,7 @@ from pymatgen.core.operations import SymmOp
 from pymatgen.core.lattice import Lattice
 from pymatgen.core.structure import PeriodicSite
 from pymatgen.core.structure_modifier import SupercellMaker
+from pymatgen.util.coord_utils import find_pbc_matches
 
 try:
     import pymatgen._spglib as spg
@@ -45,6 +48,11 @@ except ImportError:
               " for pymatgen, or install pyspglib from spglib."
         raise ImportError(msg)
 
+#Maximum number of structures whose symmetry results are cached.
+SYMMETRY_CACHE_SIZE = 10000
+
+_results_cache = OrderedDict()
+
 
 class SymmetryFinder(object):
     """
@@ -71,24 +79,45 @@ class SymmetryFinder(object):
         self._transposed_latt = structure.lattice.matrix.transpose()
         #Spglib requires numpy floats.
         self._transposed_latt = self._transposed_latt.astype(float)
-        self._positions = np.array([site.frac_coords for site in structure])
-        unique_species = []
-        zs = []
-
-        for species, g in itertools.groupby(structure,
-                                            key=lambda s: s.species_and_occu):
-            try:
-                ind = unique_species.index(species)
-                zs.extend([ind + 1] * len(tuple(g)))
-            except ValueError:
-                unique_species.append(species)
-                zs.extend([len(unique_species)] * len(tuple(g)))
-        self._unique_species = unique_species
-        self._numbers = np.array(zs)
-        self._spacegroup_data = spg.spacegroup(self._transposed_latt.copy(),
-                                               self._positions.copy(),
-                                               self._numbers, self._symprec,
-                                               self._angle_tol)
+        self._positions = np.array(structure.frac_coords, dtype=float)
+        #The species table of a structure holds the unique species in order
+        #of appearance.
+        self._unique_species = list(structure._species_table)
+        self._numbers = structure._species_indices + 1
+        self._results = None
+
+    @property
+    def _cache_key(self):
+        """
+        Key of the symmetry results in the cache. The results only depend on
+        the lattice, the species numbers and the positions. Coordinates are
+        rounded to a hundredth of symprec, so that structures only differing
+        by numerical noise share their results.
+        """
+        scale = 100 / self._symprec
+        lengths = np.sqrt(np.sum(self._transposed_latt ** 2, axis=0))
+        latt = np.round(self._transposed_latt * scale).astype(np.int64)
+        pos = np.round(np.mod(self._positions, 1) * lengths * scale)
+        return (self._symprec, self._angle_tol, latt.tostring(),
+                self._numbers.astype(np.int64).tostring(),
+                pos.astype(np.int64).tostring())
+
+    @property
+    def _cached_results(self):
+        """
+        Dict of the symmetry results of the structure, which is shared by all
+        SymmetryFinders of equivalent structures (see _cache_key). The
+        "dataset" is computed on creation, and other results are added to the
+        dict when they are first needed.
+        """
+        if self._results is None:
+            key = self._cache_key
+            if key not in _results_cache:
+                _add_to_cache(key, _get_symmetry_results(
+                    self._transposed_latt, self._positions, self._numbers,
+                    self._symprec, self._angle_tol))
+            self._results = _results_cache[key]
+        return self._results
 
     def get_spacegroup(self):
         """
@@ -98,7 +127,10 @@ class SymmetryFinder(object):
         # Atomic positions have to be specified by scaled positions for spglib.
         return Spacegroup(self.get_spacegroup_symbol(),
                           self.get_spacegroup_number(),
-                          self.get_symmetry_operations())
+                          self.get_symmetry_operations(),
+                          structure=self._structure,
+                          site_permutations=self.get_site_permutations(),
+                          symprec=self._symprec)
 
     def get_spacegroup_symbol(self):
         """
@@ -107,7 +139,7 @@ class SymmetryFinder(object):
         Returns:
             Spacegroup symbol for structure.
         """
-        return self._spacegroup_data.split()[0]
+        return self._cached_results["dataset"]["international"]
 
     def get_spacegroup_number(self):
         """
@@ -116,9 +148,7 @@ class SymmetryFinder(object):
         Returns:
             International spacegroup number for structure.
         """
-        sgnum = self._spacegroup_data.split()[-1]
-        sgnum = int(re.sub("\D", "", sgnum))
-        return sgnum
+        return self._cached_results["dataset"]["number"]
 
     def get_hall(self):
         """
@@ -204,33 +234,7 @@ class SymmetryFinder(object):
             wyckoffs:
                   Wyckoff letters
         """
-        keys = ("number",
-                "international",
-                "hall",
-                "transformation_matrix",
-                "origin_shift",
-                "rotations",
-                "translations",
-                "wyckoffs",
-                "equivalent_atoms")
-        dataset = {}
-        for key, data in zip(keys, spg.dataset(self._transposed_latt.copy(),
-                                               self._positions, self._numbers,
-                                               self._symprec,
-                                               self._angle_tol)):
-            dataset[key] = data
-        dataset["international"] = dataset["international"].strip()
-        dataset["hall"] = dataset["hall"].strip()
-        dataset["transformation_matrix"] = \
-            np.array(dataset["transformation_matrix"])
-        dataset["origin_shift"] = np.array(dataset["origin_shift"])
-        dataset["rotations"] = np.array(dataset["rotations"])
-        dataset["translations"] = np.array(dataset["translations"])
-        letters = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
-        dataset["wyckoffs"] = [letters[x] for x in dataset["wyckoffs"]]
-        dataset["equivalent_atoms"] = np.array(dataset["equivalent_atoms"])
-
-        return dataset
+        return copy.deepcopy(self._cached_results["dataset"])
 
     def _get_symmetry(self):
         """
@@ -243,18 +247,13 @@ class SymmetryFinder(object):
             "translations" gives the numpy float64 array of the translation
             vectors in scaled positions.
         """
-
-        # Get number of symmetry operations and allocate symmetry operations
-        # multi = spg.multiplicity(cell, positions, numbers, symprec)
-        multi = 48 * self._structure.num_sites
-        rotation = np.zeros((multi, 3, 3), dtype=int)
-        translation = np.zeros((multi, 3))
-
-        num_sym = spg.symmetry(rotation, translation,
-                               self._transposed_latt.copy(),
-                               self._positions, self._numbers, self._symprec,
-                               self._angle_tol)
-        return rotation[:num_sym], translation[:num_sym]
+        results = self._cached_results
+        if "symmetry" not in results:
+            results["symmetry"] = _get_symmetry(
+                self._transposed_latt, self._positions, self._numbers,
+                self._symprec, self._angle_tol)
+        (rotation, translation) = results["symmetry"]
+        return rotation.copy(), translation.copy()
 
     def get_symmetry_operations(self, cartesian=False):
         """
@@ -274,6 +273,54 @@ class SymmetryFinder(object):
             symmops.append(op)
         return symmops
 
+    def get_site_permutations(self):
+        """
+        Get the symmetry operations as permutations of the sites of the
+        structure. This allows symmetry operations to be applied to sets of
+        sites by simple array indexing, instead of operating on and matching
+        coordinates. The permutations are cached on the structure.
+
+        Returns:
+            Integer array of shape (n_ops, n_sites), in which element [i, j]
+            is the index of the nearest site of the same species within
+            symprec of the image of site j under the i-th operation of
+            get_symmetry_operations(). None if any image has no such site.
+        """
+        key = (self._symprec, self._angle_tol)
+        cache = self._structure._site_permutations
+        if key not in cache:
+            (rotations, translations) = self._get_symmetry()
+            fcoords = self._positions
+            matrix = self._structure.lattice.matrix
+            #Maximum difference of each fractional coordinate within
+            #symprec.
+            atol = self._symprec * np.sqrt(np.sum(np.linalg.inv(matrix) ** 2,
+                                                  axis=0))
+            perms = -np.ones((len(rotations), len(fcoords)), dtype=np.int)
+            for perm, rot, trans in zip(perms, rotations, translations):
+                images = np.dot(fcoords, np.transpose(rot)) + trans
+                (inds1, inds2) = find_pbc_matches(images, fcoords, atol)
+                same = self._numbers[inds1] == self._numbers[inds2]
+                (inds1, inds2) = (inds1[same], inds2[same])
+                fdist = fcoords[inds2] - images[inds1]
+                fdist -= np.round(fdist)
+                dists = np.sum(np.dot(fdist, matrix) ** 2, axis=1)
+                within = dists <= self._symprec ** 2
+                (inds1, inds2) = (inds1[within], inds2[within])
+                dists = dists[within]
+                #Use the nearest match for each image.
+                order = np.lexsort((dists, inds1))
+                (inds1, inds2) = (inds1[order], inds2[order])
+                first = np.ones(len(inds1), dtype=bool)
+                first[1:] = inds1[1:] != inds1[:-1]
+                perm[inds1[first]] = inds2[first]
+            if np.any(perms < 0):
+                perms = None
+            else:
+                perms.flags.writeable = False
+            cache[key] = perms
+        return cache[key]
+
     def get_symmetrized_structure(self):
         """
         Get a symmetrized structure. A symmetrized structure is one where the
@@ -283,10 +330,7 @@ class SymmetryFinder(object):
             pymatgen.symmetry.structure.SymmetrizedStructure object.
         """
         ds = self.get_symmetry_dataset()
-        sg = Spacegroup(self.get_spacegroup_symbol(),
-                        self.get_spacegroup_number(),
-                        self.get_symmetry_operations())
-        return SymmetrizedStructure(self._structure, sg,
+        return SymmetrizedStructure(self._structure, self.get_spacegroup(),
                                     ds["equivalent_atoms"])
 
     def get_refined_structure(self):
@@ -790,3 +834,128 @@ def get_point_group(rotations):
         rotations = np.int_(rotations)
         # (symbol, pointgroup_number, transformation_matrix)
     return spg.pointgroup(rotations)
+
+
+def get_symmetry_finders(structures, symprec=1e-5, angle_tolerance=5,
+                         ncpus=None):
+    """
+    Creates SymmetryFinders for a list of structures. The symmetry dataset of
+    each distinct structure is computed only once, optionally in parallel,
+    and stored in the symmetry cache that backs the getters of the
+    SymmetryFinders.
+
+    Args:
+        structures:
+            List of Structure objects.
+        symprec:
+            Tolerance for symmetry finding
+        angle_tolerance:
+            Angle tolerance for symmetry finding.
+        ncpus:
+            Number of processes used to compute the datasets. Defaults to
+            None, which computes them in the current process.
+
+    Returns:
+        List of SymmetryFinders, in the order of the structures.
+    """
+    finders = [SymmetryFinder(s, symprec, angle_tolerance)
+               for s in structures]
+    tasks = OrderedDict()
+    for finder in finders:
+        key = finder._cache_key
+        if key not in _results_cache and key not in tasks:
+            tasks[key] = (finder._transposed_latt, finder._positions,
+                          finder._numbers, symprec, angle_tolerance)
+    if ncpus is not None and len(tasks) > 1:
+        pool = Pool(ncpus)
+        try:
+            results = pool.map(_get_symmetry_results_task, tasks.values())
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = map(_get_symmetry_results_task, tasks.values())
+    new_results = dict(zip(tasks.keys(), results))
+    for finder in finders:
+        key = finder._cache_key
+        if key in new_results:
+            finder._results = new_results[key]
+        else:
+            finder._results = _results_cache[key]
+    for key, results in new_results.items():
+        _add_to_cache(key, results)
+    return finders
+
+
+def clear_symmetry_cache():
+    """
+    Clears the cache of symmetry results shared by SymmetryFinders. Results
+    already held by existing SymmetryFinders are not affected.
+    """
+    _results_cache.clear()
+
+
+def _add_to_cache(key, results):
+    """
+    Adds the symmetry results of a structure to the cache, dropping the
+    oldest results if the cache is full.
+    """
+    if len(_results_cache) >= SYMMETRY_CACHE_SIZE:
+        _results_cache.popitem(last=False)
+    _results_cache[key] = results
+
+
+def _get_symmetry_results(transposed_latt, positions, numbers, symprec,
+                          angle_tol):
+    """
+    Computes the symmetry results of a structure, i.e., a dict containing its
+    symmetry "dataset".
+    """
+    keys = ("number",
+            "international",
+            "hall",
+            "transformation_matrix",
+            "origin_shift",
+            "rotations",
+            "translations",
+            "wyckoffs",
+            "equivalent_atoms")
+    dataset = {}
+    for key, data in zip(keys, spg.dataset(transposed_latt.copy(),
+                                           positions.copy(), numbers,
+                                           symprec, angle_tol)):
+        dataset[key] = data
+    dataset["international"] = dataset["international"].strip()
+    dataset["hall"] = dataset["hall"].strip()
+    dataset["transformation_matrix"] = \
+        np.array(dataset["transformation_matrix"])
+    dataset["origin_shift"] = np.array(dataset["origin_shift"])
+    dataset["rotations"] = np.array(dataset["rotations"])
+    dataset["translations"] = np.array(dataset["translations"])
+    letters = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    dataset["wyckoffs"] = [letters[x] for x in dataset["wyckoffs"]]
+    dataset["equivalent_atoms"] = np.array(dataset["equivalent_atoms"])
+    return {"dataset": dataset}
+
+
+def _get_symmetry_results_task(args):
+    """
+    Pool wrapper around _get_symmetry_results.
+    """
+    return _get_symmetry_results(*args)
+
+
+def _get_symmetry(transposed_latt, positions, numbers, symprec, angle_tol):
+    """
+    Computes the symmetry operations of a structure as a tuple of rotations
+    and translations.
+    """
+    # Get number of symmetry operations and allocate symmetry operations
+    # multi = spg.multiplicity(cell, positions, numbers, symprec)
+    multi = 48 * len(positions)
+    rotation = np.zeros((multi, 3, 3), dtype=int)
+    translation = np.zeros((multi, 3))
+
+    num_sym = spg.symmetry(rotation, translation, transposed_latt.copy(),
+                           positions.copy(), numbers, symprec, angle_tol)
+    return rotation[:num_sym], translation[:num_sym]
@@ -13,6 +13,8 @@ __maintainer__ = "Shyue Ping Ong"
 __email__ = "shyue@mit.edu"
 __date__ = "Mar 9, 2012"
 
+import numpy as np
+
 from pymatgen.core.sites import PeriodicSite
 
 
@@ -21,7 +23,8 @@ class Spacegroup(object):
     Represents a space group, which is a collection of symmetry operations
     """
 
-    def __init__(self, int_symbol, int_number, symmops):
+    def __init__(self, int_symbol, int_number, symmops, structure=None,
+                 site_permutations=None, symprec=None):
         """
         Args:
             int_symbol:
@@ -30,10 +33,35 @@ class Spacegroup(object):
                 The international number of the spacegroup.
             symmops:
                 The symmetry operations associated with the spacegroup.
+            structure:
+                Optional structure the spacegroup was determined from.
+            site_permutations:
+                Optional symmetry operations as permutations of the sites of
+                structure, as returned by SymmetryFinder.get_site_permutations.
+            symprec:
+                The symmetry precision site_permutations were determined
+                with. site_permutations are only used if it is given.
         """
         self.int_symbol = int_symbol
         self.int_number = int_number
         self.symmops = symmops
+        self.structure = structure
+        self.site_permutations = site_permutations
+        self.symprec = symprec
+        self._site_indices = None
+
+    def _get_site_indices(self, sites):
+        """
+        Returns the indices of sites in the structure of the spacegroup, or
+        None if any of the sites is not a site of the structure.
+        """
+        if self._site_indices is None:
+            self._site_indices = {id(site): i
+                                  for i, site in enumerate(self.structure)}
+        try:
+            return [self._site_indices[id(site)] for site in sites]
+        except KeyError:
+            return None
 
     def are_symmetrically_equivalent(self, sites1, sites2, symm_prec=1e-3):
         """
@@ -45,6 +73,14 @@ class Spacegroup(object):
         One use is in PartialRemoveSpecie transformation to return only
         symmetrically distinct arrangements of atoms.
 
+        If the spacegroup has site permutations and all sites are sites of
+        its structure, the operations mapping sites2 onto sites1 are looked
+        up in the permutations. If symm_prec is the symmetry precision the
+        permutations were determined with, the result of the lookup is
+        returned. Otherwise, the operations found are checked against
+        symm_prec, and all operations are tested on the coordinates if none
+        of them passes.
+
         Args:
             sites1:
                 1st set of sites
@@ -58,6 +94,26 @@ class Spacegroup(object):
             Boolean indicating whether the two sets of sites are symmetrically
             equivalent.
         """
+        if self.site_permutations is not None and self.symprec is not None:
+            inds1 = self._get_site_indices(sites1)
+            inds2 = self._get_site_indices(sites2)
+            if inds1 is not None and inds2 is not None:
+                images = self.site_permutations[:, inds2]
+                mapped = np.in1d(images, inds1).reshape(images.shape)
+                candidates = np.where(np.all(mapped, axis=1))[0]
+                if symm_prec == self.symprec:
+                    return len(candidates) > 0
+                fcoords = self.structure.frac_coords
+                for i in candidates:
+                    op = self.symmops[i]
+                    newcoords = np.dot(fcoords[inds2],
+                                       op.rotation_matrix.T) + \
+                        op.translation_vector
+                    diff = newcoords - fcoords[images[i]]
+                    diff -= np.round(diff)
+                    if np.all(np.abs(diff) <= symm_prec):
+                        return True
+
         def in_sites(site):
             for test_site in sites1:
                 if test_site.is_periodic_image(site, symm_prec, False):
@@ -13,7 +13,7 @@ __maintainer__ = "Shyue Ping Ong"
 __email__ = "shyue@mit.edu"
 __date__ = "Mar 9, 2012"
 
-import itertools
+import collections
 
 from pymatgen.core.structure import Structure
 
@@ -31,11 +31,16 @@ class SymmetrizedStructure(Structure):
                            refined_structure.frac_coords)
 
         self._spacegroup = spacegroup
-        site_map = zip(self._sites, equivalent_positions)
-        site_map = sorted(site_map, key=lambda x: x[1])
-        self._equivalent_sites = [
-            [x[0] for x in g] for k, g
-            in itertools.groupby(site_map, key=lambda x: x[1])]
+        groups = collections.defaultdict(list)
+        for i, eq in enumerate(equivalent_positions):
+            groups[eq].append(i)
+        self._equivalent_indices = [groups[k] for k in sorted(groups)]
+        self._equivalent_sites = [[self[i] for i in inds]
+                                  for inds in self._equivalent_indices]
+        #Maps the sites of the structure to their group.
+        self._site_groups = {id(site): g for g, sites
+                             in enumerate(self._equivalent_sites)
+                             for site in sites}
 
     @property
     def equivalent_sites(self):
@@ -45,6 +50,14 @@ class SymmetrizedStructure(Structure):
         """
         return self._equivalent_sites
 
+    @property
+    def equivalent_indices(self):
+        """
+        Indices of all the sites grouped by symmetry equivalence in the form
+        of [[indices in group1], [indices in group2], ...]
+        """
+        return self._equivalent_indices
+
     def find_equivalent_sites(self, site):
         """
         Finds all symmetrically equivalent sites for a particular site
@@ -56,6 +69,8 @@ class SymmetrizedStructure(Structure):
         Returns:
             A list of all symmetrically equivalent sites.
         """
+        if id(site) in self._site_groups:
+            return self._equivalent_sites[self._site_groups[id(site)]]
         for sites in self.equivalent_sites:
             if site in sites:
                 return sites
@@ -20,7 +20,9 @@ import numpy as np
 
 from pymatgen.core.sites import PeriodicSite
 from pymatgen.io.vaspio.vasp_input import Poscar
-from pymatgen.symmetry.finder import SymmetryFinder
+import pymatgen.symmetry.finder as sym_finder
+from pymatgen.symmetry.finder import SymmetryFinder, get_symmetry_finders, \
+    clear_symmetry_cache
 from pymatgen.io.cifio import CifParser
 from pymatgen.core.structure_modifier import StructureEditor
 from pymatgen.io.vaspio.vasp_output import Vasprun
@@ -32,6 +34,7 @@ test_dir = os.path.join(os.path.dirname(__file__), "..", "..", "..",
 class SymmetryFinderTest(unittest.TestCase):
 
     def setUp(self):
+        clear_symmetry_cache()
         p = Poscar.from_file(os.path.join(test_dir, 'POSCAR'))
         self.structure = p.structure
         self.sg = SymmetryFinder(self.structure, 0.001)
@@ -71,6 +74,43 @@ class SymmetryFinderTest(unittest.TestCase):
     def test_get_symmetry_dataset(self):
         ds = self.sg.get_symmetry_dataset()
         self.assertEqual(ds['international'], 'Pnma')
+        #The dataset is cached, but the returned dataset is a copy.
+        ds['international'] = 'P1'
+        finder = SymmetryFinder(self.structure, 0.001)
+        self.assertEqual(finder.get_symmetry_dataset()['international'],
+                         'Pnma')
+        self.assertIs(finder._results, self.sg._results)
+
+    def test_get_symmetry_finders(self):
+        structures = [self.structure, self.disordered_structure,
+                      self.structure]
+        ops = self.disordered_sg.get_symmetry_operations()
+        for ncpus in (None, 2):
+            clear_symmetry_cache()
+            finders = get_symmetry_finders(structures, 0.001, ncpus=ncpus)
+            self.assertEqual(len(sym_finder._results_cache), 2)
+            self.assertEqual([f.get_spacegroup_symbol() for f in finders],
+                             ["Pnma", "P4_2/nmc", "Pnma"])
+            self.assertIs(finders[0]._results, finders[2]._results)
+            self.assertEqual(len(finders[1].get_symmetry_operations()),
+                             len(ops))
+            #Structures in the cache are not computed again.
+            cached = finders[0]._results
+            finders = get_symmetry_finders(structures, 0.001, ncpus=ncpus)
+            self.assertEqual(len(sym_finder._results_cache), 2)
+            self.assertIs(finders[0]._results, cached)
+            self.assertIs(SymmetryFinder(self.structure, 0.001)._cached_results,
+                          cached)
+        #A cached structure among structures computed in parallel. The
+        #reordered structure of sg3 has its own results.
+        clear_symmetry_cache()
+        cached = self.sg._cached_results
+        structures.append(self.sg3._structure)
+        finders = get_symmetry_finders(structures, 0.001, ncpus=2)
+        self.assertEqual(len(sym_finder._results_cache), 3)
+        self.assertIs(finders[0]._results, cached)
+        self.assertIs(finders[2]._results, cached)
+        self.assertEqual(finders[3].get_spacegroup_symbol(), "Pnma")
 
     def test_get_crystal_system(self):
         crystal_system = self.sg.get_crystal_system()
@@ -97,6 +137,26 @@ class SymmetryFinderTest(unittest.TestCase):
                         break
                 self.assertTrue(found)
 
+    def test_get_site_permutations(self):
+        perms = self.sg.get_site_permutations()
+        self.assertEqual(perms.shape, (8, len(self.structure)))
+        fcoords = self.structure.frac_coords
+        latt = self.structure.lattice
+        for op, perm in zip(self.sg.get_symmetry_operations(), perms):
+            self.assertEqual(sorted(perm), range(len(self.structure)))
+            for i, j in enumerate(perm):
+                diff = op.operate(fcoords[i]) - fcoords[j]
+                self.assertTrue(np.allclose(diff, np.round(diff), atol=1e-3))
+                cart = latt.get_cartesian_coords(diff - np.round(diff))
+                self.assertLessEqual(np.linalg.norm(cart), 0.001)
+                self.assertEqual(self.structure[i].species_and_occu,
+                                 self.structure[j].species_and_occu)
+        #The permutations are cached on the structure.
+        self.assertIs(SymmetryFinder(self.structure,
+                                     0.001).get_site_permutations(), perms)
+        perms = self.disordered_sg.get_site_permutations()
+        self.assertTrue(np.all(perms >= 0))
+
     def test_get_refined_structure(self):
         for a in self.sg.get_refined_structure().lattice.angles:
             self.assertEqual(a, 90)
@@ -115,6 +175,14 @@ class SymmetryFinderTest(unittest.TestCase):
             self.assertEqual(a, 90)
         self.assertEqual(len(symm_struct.equivalent_sites), 5)
 
+        self.assertEqual(symm_struct.equivalent_indices,
+                         [[0, 1, 2, 3], [4, 5, 6, 7], [8, 15, 16, 23],
+                          [9, 14, 17, 22], [10, 11, 12, 13, 18, 19, 20, 21]])
+        for sites in symm_struct.equivalent_sites:
+            for site in sites:
+                self.assertEqual(symm_struct.find_equivalent_sites(site),
+                                 sites)
+
         symm_struct = self.disordered_sg.get_symmetrized_structure()
         self.assertEqual(len(symm_struct.equivalent_sites), 8)
 
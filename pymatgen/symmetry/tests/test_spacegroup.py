@@ -16,8 +16,12 @@ __date__ = "Mar 12, 2012"
 import unittest
 import os
 
+import numpy as np
+
+from pymatgen.core.structure import Structure
 from pymatgen.io.vaspio.vasp_input import Poscar
 from pymatgen.symmetry.finder import SymmetryFinder
+from pymatgen.symmetry.spacegroup import Spacegroup
 
 test_dir = os.path.join(os.path.dirname(__file__), "..", "..", "..",
                         'test_files')
@@ -41,6 +45,67 @@ class SpacegroupTest(unittest.TestCase):
         self.assertFalse(self.sg1.are_symmetrically_equivalent(sites1, sites2,
                                                                1e-3))
 
+        #Sites which are not from the structure of the spacegroup are
+        #matched by their coordinates.
+        structure = Structure.from_sites(self.structure)
+        sites1 = [structure[i] for i in [0, 1]]
+        sites2 = [self.structure[i] for i in [2, 3]]
+        self.assertTrue(self.sg1.are_symmetrically_equivalent(sites1, sites2,
+                                                              1e-3))
+        sites2 = [structure[i] for i in [0, 2]]
+        self.assertFalse(self.sg1.are_symmetrically_equivalent(sites1, sites2,
+                                                               1e-3))
+
+    def test_are_symmetrically_equivalent_symm_prec(self):
+        #The permutations of a noisy structure determined with a small
+        #symprec only contain the identity. They must not be used for a
+        #larger symm_prec.
+        np.random.seed(0)
+        noise = np.random.uniform(-2e-4, 2e-4, (len(self.structure), 3))
+        noisy = Structure(self.structure.lattice,
+                          self.structure.species_and_occu,
+                          self.structure.frac_coords + noise)
+        finder = SymmetryFinder(noisy, 1e-5)
+        self.assertEqual(len(finder.get_site_permutations()), 1)
+        symmops = SymmetryFinder(noisy, 0.01).get_symmetry_operations()
+        sg = Spacegroup("Pnma", 62, symmops, structure=noisy,
+                        site_permutations=finder.get_site_permutations(),
+                        symprec=1e-5)
+        sites1 = [noisy[i] for i in [0, 1]]
+        sites2 = [noisy[i] for i in [2, 3]]
+        self.assertTrue(sg.are_symmetrically_equivalent(sites1, sites2, 0.1))
+        self.assertFalse(sg.are_symmetrically_equivalent(sites1, sites2,
+                                                         1e-6))
+
+    def test_are_symmetrically_equivalent_tight_symm_prec(self):
+        #A symm_prec smaller than the symprec of the permutations must not be
+        #widened to the symprec.
+        np.random.seed(0)
+        noise = np.random.uniform(-5e-3, 5e-3, (len(self.structure), 3))
+        noisy = Structure(self.structure.lattice,
+                          self.structure.species_and_occu,
+                          self.structure.frac_coords + noise)
+        sg = SymmetryFinder(noisy, 0.1).get_spacegroup()
+        self.assertIsNotNone(sg.site_permutations)
+        #Reference spacegroup without permutations, which only tests the
+        #coordinates.
+        ref = Spacegroup(sg.int_symbol, sg.int_number, sg.symmops)
+        for inds1, inds2 in [([0, 1], [2, 3]), ([0, 1], [0, 1]),
+                             ([4, 5], [6, 7]), ([8, 9], [10, 11])]:
+            sites1 = [noisy[i] for i in inds1]
+            sites2 = [noisy[i] for i in inds2]
+            for symm_prec in [1e-3, 0.02, 0.1]:
+                self.assertEqual(
+                    sg.are_symmetrically_equivalent(sites1, sites2,
+                                                    symm_prec),
+                    ref.are_symmetrically_equivalent(sites1, sites2,
+                                                     symm_prec))
+        sites1 = [noisy[i] for i in [0, 1]]
+        sites2 = [noisy[i] for i in [2, 3]]
+        self.assertFalse(sg.are_symmetrically_equivalent(sites1, sites2,
+                                                         1e-3))
+        self.assertTrue(sg.are_symmetrically_equivalent(sites1, sites2, 0.1))
+
 
 if __name__ == "__main__":
     #import sys;sys.argv = ['', 'Test.testName']
@@ -319,25 +319,27 @@ class EnumerateStructureTransformation(AbstractTransformation):
         structures = adaptor.structures
         original_latt = structure.lattice
         inv_latt = np.linalg.inv(original_latt.matrix)
-        ewald_matrices = {}
         all_structures = []
+        supercells = {}
         for s in structures:
             new_latt = s.lattice
             transformation = np.dot(new_latt.matrix, inv_latt)
             transformation = tuple([tuple([int(round(cell)) for cell in row])
                                     for row in transformation])
-            if contains_oxidation_state:
-                if transformation not in ewald_matrices:
-                    maker = SupercellMaker(structure, transformation)
-                    ewald = EwaldSummation(maker.modified_structure)
-                    ewald_matrices[transformation] = ewald
-                else:
-                    ewald = ewald_matrices[transformation]
-                energy = ewald.compute_sub_structure(s)
-                all_structures.append({"num_sites": len(s), "energy": energy,
-                                       "structure": s})
-            else:
-                all_structures.append({"num_sites": len(s), "structure": s})
+            all_structures.append({"num_sites": len(s), "structure": s})
+            supercells.setdefault(transformation, []).append(
+                all_structures[-1])
+
+        if contains_oxidation_state:
+            #The Ewald matrix of each supercell is computed once, and the
+            #energies of all its orderings are obtained together.
+            for transformation, items in supercells.items():
+                maker = SupercellMaker(structure, transformation)
+                ewald = EwaldSummation(maker.modified_structure)
+                energies = ewald.compute_sub_structures(
+                    [item["structure"] for item in items])
+                for item, energy in zip(items, energies):
+                    item["energy"] = energy
 
         def sort_func(s):
             return s["energy"] / s["num_sites"] if contains_oxidation_state \
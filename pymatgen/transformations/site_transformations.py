@@ -21,11 +21,18 @@ import itertools
 import logging
 import time
 
+import numpy as np
+
 from pymatgen.transformations.transformation_abc import AbstractTransformation
 from pymatgen.core.structure_modifier import StructureEditor
 from pymatgen.analysis.ewald import EwaldSummation, EwaldMinimizer
 
 
+#Maximum number of site indices in the symmetry images computed at once by
+#PartialRemoveSitesTransformation.complete_ordering.
+BATCH_ELEMENTS = 2 ** 22
+
+
 class InsertSitesTransformation(AbstractTransformation):
     """
     This transformation substitutes certain sites with certain species.
@@ -272,7 +279,8 @@ class PartialRemoveSitesTransformation(AbstractTransformation):
     ALGO_BEST_FIRST = 2
     ALGO_ENUMERATE = 3
 
-    def __init__(self, indices, fractions, algo=ALGO_COMPLETE):
+    def __init__(self, indices, fractions, algo=ALGO_COMPLETE, ncpus=None,
+                 time_limit=None, max_nodes=None):
         """
         Args:
             indices:
@@ -285,10 +293,24 @@ class PartialRemoveSitesTransformation(AbstractTransformation):
                 This parameter allows you to choose the algorithm to perform
                 ordering. Use one of PartialRemoveSpecieTransformation.ALGO_*
                 variables to set the algo.
+            ncpus:
+                Number of processes used by the EwaldMinimizer search of
+                ALGO_FAST. Defaults to None, i.e., a serial search.
+            time_limit:
+                Wall-clock limit in seconds on the EwaldMinimizer search of
+                ALGO_FAST. Defaults to None, i.e., no limit.
+            max_nodes:
+                Approximate limit on the number of search tree nodes visited
+                by the EwaldMinimizer search of ALGO_FAST. Defaults to None,
+                i.e., no limit.
         """
         self._indices = indices
         self._fractions = fractions
         self._algo = algo
+        self._ncpus = ncpus
+        self._time_limit = time_limit
+        self._max_nodes = max_nodes
+        self._completed = None
         self.logger = logging.getLogger(self.__class__.__name__)
 
     def best_first_ordering(self, structure, num_remove_dict):
@@ -338,8 +360,15 @@ class PartialRemoveSitesTransformation(AbstractTransformation):
         s = SymmetryFinder(structure, symprec=symprec)
         self.logger.debug("Symmetry of structure is determined to be {}."
                           .format(s.get_spacegroup_symbol()))
-        sg = s.get_spacegroup()
-        tested_sites = []
+        #Distinct symmetry operations which map the sites onto each other.
+        #Without site permutations, only the identity is used.
+        nsites = len(structure)
+        perms = s.get_site_permutations()
+        if perms is None:
+            perms = [range(nsites)]
+        perms = np.array(sorted(set(
+            [tuple(p) for p in perms if len(set(p)) == nsites])),
+            dtype=np.int)
         starttime = time.time()
         self.logger.debug("Performing initial ewald sum...")
         ewaldsum = EwaldSummation(structure)
@@ -350,40 +379,43 @@ class PartialRemoveSitesTransformation(AbstractTransformation):
         allcombis = []
         for ind, num in num_remove_dict.items():
             allcombis.append(itertools.combinations(ind, num))
-
+        combis = (list(itertools.chain(*allindices))
+                  for allindices in itertools.product(*allcombis))
+        num_sites = len(structure) - sum(num_remove_dict.values())
+        #Symmetrically equivalent combinations have the same canonical form,
+        #so they are found by a simple lookup. As the symmetry is only
+        #determined within symprec, equivalent combinations must also have
+        #the same energy.
+        tested = {}
+        chunk_size = max(1, BATCH_ELEMENTS //
+                         (len(perms) * max(1, sum(num_remove_dict.values()))))
         count = 0
-        for allindices in itertools.product(*allcombis):
-            sites_to_remove = []
-            indices_list = []
-            for indices in allindices:
-                sites_to_remove.extend([structure[i] for i in indices])
-                indices_list.extend(indices)
-
-            mod = StructureEditor(structure)
-            mod.delete_sites(indices_list)
-            s_new = mod.modified_structure
-            energy = ewaldsum.compute_partial_energy(indices_list)
-            already_tested = False
-            for i, tsites in enumerate(tested_sites):
-                tenergy = all_structures[i]["energy"]
-                if abs((energy - tenergy) / len(s_new)) < 1e-5 and \
-                        sg.are_symmetrically_equivalent(sites_to_remove, tsites,
-                                                        symm_prec=symprec):
-                    already_tested = True
-
-            if not already_tested:
-                tested_sites.append(sites_to_remove)
-                all_structures.append({"structure": s_new, "energy": energy})
-
-            count += 1
-            if count % 10 == 0:
-                timenow = time.time()
-                self.logger.debug("{} structures, {:.2f} seconds."
-                                  .format(count, timenow - starttime))
-                self.logger.debug("Average time per combi = {} seconds"
-                                  .format((timenow - starttime) / count))
-                self.logger.debug("{} symmetrically distinct structures found."
-                                  .format(len(all_structures)))
+        while True:
+            chunk = list(itertools.islice(combis, chunk_size))
+            if not chunk:
+                break
+            keys = _get_canonical_combinations(perms, chunk)
+            energies = _get_partial_energies(ewaldsum.total_energy_matrix,
+                                             chunk)
+            for indices_list, key, energy in zip(chunk, keys, energies):
+                tested_energies = tested.setdefault(key, [])
+                if any([abs((energy - e) / num_sites) < 1e-5
+                        for e in tested_energies]):
+                    continue
+                tested_energies.append(energy)
+                mod = StructureEditor(structure)
+                mod.delete_sites(indices_list)
+                all_structures.append({"structure": mod.modified_structure,
+                                       "energy": energy})
+
+            count += len(chunk)
+            timenow = time.time()
+            self.logger.debug("{} structures, {:.2f} seconds."
+                              .format(count, timenow - starttime))
+            self.logger.debug("Average time per combi = {} seconds"
+                              .format((timenow - starttime) / count))
+            self.logger.debug("{} symmetrically distinct structures found."
+                              .format(len(all_structures)))
 
         self.logger.debug("Total symmetrically distinct structures found = {}"
                           .format(len(all_structures)))
@@ -413,9 +445,20 @@ class PartialRemoveSitesTransformation(AbstractTransformation):
 
         self.logger.debug("Calling EwaldMinimizer...")
         minimizer = EwaldMinimizer(ewaldmatrix, m_list, num_to_return,
-                                   PartialRemoveSitesTransformation.ALGO_FAST)
+                                   PartialRemoveSitesTransformation.ALGO_FAST,
+                                   ncpus=self._ncpus,
+                                   time_limit=self._time_limit,
+                                   max_nodes=self._max_nodes)
         self.logger.debug("Minimizing Ewald took {} seconds."
                           .format(time.time() - starttime))
+        self._completed = minimizer.completed
+        if not minimizer.completed:
+            self.logger.warning("Ewald minimization stopped by time_limit or "
+                                "max_nodes. Returning the best orderings "
+                                "found so far.")
+            if not minimizer.output_lists:
+                raise ValueError("No ordering found within time_limit and "
+                                 "max_nodes.")
 
         all_structures = []
 
@@ -539,10 +582,74 @@ class PartialRemoveSitesTransformation(AbstractTransformation):
     def is_one_to_many(self):
         return True
 
+    @property
+    def completed(self):
+        """
+        Whether the last EwaldMinimizer search of ALGO_FAST was completed, or
+        was stopped early by time_limit or max_nodes. None if no such search
+        has been performed.
+        """
+        return self._completed
+
     @property
     def to_dict(self):
         return {"name": self.__class__.__name__, "version": __version__,
                 "init_args": {"indices": self._indices,
-                              "fractions": self._fractions, "algo": self._algo},
+                              "fractions": self._fractions, "algo": self._algo,
+                              "ncpus": self._ncpus,
+                              "time_limit": self._time_limit,
+                              "max_nodes": self._max_nodes},
                 "@module": self.__class__.__module__,
                 "@class": self.__class__.__name__}
+
+
+def _get_canonical_combinations(perms, combinations):
+    """
+    Returns the canonical forms of combinations of sites, i.e., the
+    lexicographically smallest of their sorted images under a set of site
+    permutations.
+
+    Args:
+        perms:
+            (nperms, nsites) array of site permutations, e.g., from
+            SymmetryFinder.get_site_permutations.
+        combinations:
+            Sequence of combinations of the same number of site indices.
+
+    Returns:
+        List of canonical forms as tuples of site indices.
+    """
+    combis = np.array(combinations, dtype=np.int).reshape(
+        (len(combinations), -1))
+    images = np.sort(perms[:, combis], axis=2)
+    minimal = np.ones(images.shape[:2], dtype=bool)
+    canonical = np.zeros(combis.shape, dtype=np.int)
+    for i in xrange(combis.shape[1]):
+        values = np.where(minimal, images[:, :, i], perms.shape[1])
+        canonical[:, i] = np.min(values, axis=0)
+        minimal &= values == canonical[:, i]
+    return [tuple(c) for c in canonical.tolist()]
+
+
+def _get_partial_energies(energy_matrix, combinations):
+    """
+    Returns the total Ewald energies for combinations of sites being removed,
+    i.e., the same as EwaldSummation.compute_partial_energy for each
+    combination, but computed for all combinations at once.
+
+    Args:
+        energy_matrix:
+            Total energy matrix of an EwaldSummation.
+        combinations:
+            Sequence of combinations of the same number of site indices.
+
+    Returns:
+        Array of energies.
+    """
+    combis = np.array(combinations, dtype=np.int).reshape(
+        (len(combinations), -1))
+    removed = np.sum(energy_matrix.sum(axis=1)[combis], axis=1)
+    removed += np.sum(energy_matrix.sum(axis=0)[combis], axis=1)
+    removed -= np.sum(energy_matrix[combis[:, :, None], combis[:, None, :]],
+                      axis=(1, 2))
+    return np.sum(energy_matrix) - removed
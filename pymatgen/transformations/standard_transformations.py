@@ -405,7 +405,8 @@ class PartialRemoveSpecieTransformation(AbstractTransformation):
     ALGO_BEST_FIRST = 2
     ALGO_ENUMERATE = 3
 
-    def __init__(self, specie_to_remove, fraction_to_remove, algo=ALGO_FAST):
+    def __init__(self, specie_to_remove, fraction_to_remove, algo=ALGO_FAST,
+                 ncpus=None, time_limit=None, max_nodes=None):
         """
         Args:
             specie_to_remove:
@@ -416,10 +417,24 @@ class PartialRemoveSpecieTransformation(AbstractTransformation):
                 This parameter allows you to choose the algorithm to perform
                 ordering. Use one of PartialRemoveSpecieTransformation.ALGO_*
                 variables to set the algo.
+            ncpus:
+                Number of processes used by the EwaldMinimizer search of
+                ALGO_FAST. Defaults to None, i.e., a serial search.
+            time_limit:
+                Wall-clock limit in seconds on the EwaldMinimizer search of
+                ALGO_FAST. Defaults to None, i.e., no limit.
+            max_nodes:
+                Approximate limit on the number of search tree nodes visited
+                by the EwaldMinimizer search of ALGO_FAST. Defaults to None,
+                i.e., no limit.
         """
         self._specie = specie_to_remove
         self._frac = fraction_to_remove
         self._algo = algo
+        self._ncpus = ncpus
+        self._time_limit = time_limit
+        self._max_nodes = max_nodes
+        self._completed = None
 
     def apply_transformation(self, structure, return_ranked_list=False):
         """
@@ -450,13 +465,27 @@ class PartialRemoveSpecieTransformation(AbstractTransformation):
                           if structure[i].species_and_occu ==
                           Composition({sp: 1})]
         trans = PartialRemoveSitesTransformation([specie_indices],
-                                                 [self._frac], algo=self._algo)
-        return trans.apply_transformation(structure, return_ranked_list)
+                                                 [self._frac], algo=self._algo,
+                                                 ncpus=self._ncpus,
+                                                 time_limit=self._time_limit,
+                                                 max_nodes=self._max_nodes)
+        output = trans.apply_transformation(structure, return_ranked_list)
+        self._completed = trans.completed
+        return output
 
     @property
     def is_one_to_many(self):
         return True
 
+    @property
+    def completed(self):
+        """
+        Whether the last EwaldMinimizer search of ALGO_FAST was completed, or
+        was stopped early by time_limit or max_nodes. None if no such search
+        has been performed.
+        """
+        return self._completed
+
     def __str__(self):
         spec_str = ["Species = {}".format(self._specie),
                     "Fraction to remove = {}".format(self._frac),
@@ -475,7 +504,9 @@ class PartialRemoveSpecieTransformation(AbstractTransformation):
         return {"name": self.__class__.__name__, "version": __version__,
                 "init_args": {"specie_to_remove": self._specie,
                               "fraction_to_remove": self._frac,
-                              "algo": self._algo},
+                              "algo": self._algo, "ncpus": self._ncpus,
+                              "time_limit": self._time_limit,
+                              "max_nodes": self._max_nodes},
                 "@module": self.__class__.__module__,
                 "@class": self.__class__.__name__}
 
@@ -513,7 +544,8 @@ class OrderDisorderedStructureTransformation(AbstractTransformation):
     ALGO_COMPLETE = 1
     ALGO_BEST_FIRST = 2
 
-    def __init__(self, algo=ALGO_FAST, symmetrized_structures=False):
+    def __init__(self, algo=ALGO_FAST, symmetrized_structures=False,
+                 ncpus=None, time_limit=None, max_nodes=None):
         """
         Args:
             num_structures:
@@ -525,10 +557,23 @@ class OrderDisorderedStructureTransformation(AbstractTransformation):
                 Boolean stating whether the input structures are instances of
                 SymmetrizedStructure, and that their symmetry should be used
                 for the grouping of sites.
+            ncpus:
+                Number of processes used by the EwaldMinimizer search.
+                Defaults to None, i.e., a serial search.
+            time_limit:
+                Wall-clock limit in seconds on the EwaldMinimizer search.
+                Defaults to None, i.e., no limit.
+            max_nodes:
+                Approximate limit on the number of search tree nodes visited
+                by the EwaldMinimizer search. Defaults to None, i.e., no limit.
         """
         self._algo = algo
         self._all_structures = []
         self._symmetrized = symmetrized_structures
+        self._ncpus = ncpus
+        self._time_limit = time_limit
+        self._max_nodes = max_nodes
+        self._completed = None
 
     def apply_transformation(self, structure, return_ranked_list=False):
         """
@@ -568,6 +613,11 @@ class OrderDisorderedStructureTransformation(AbstractTransformation):
 
         equivalent_sites = []
         exemplars = []
+        if self._symmetrized:
+            sym_groups = {}
+            for g, inds in enumerate(structure.equivalent_indices):
+                for i in inds:
+                    sym_groups[i] = g
         #generate list of equivalent sites to order
         #equivalency is determined by sp_and_occu and symmetry
         #if symmetrized structure is true
@@ -576,12 +626,11 @@ class OrderDisorderedStructureTransformation(AbstractTransformation):
                 continue
             found = False
             for j, ex in enumerate(exemplars):
-                sp = ex.species_and_occu
+                sp = structure[ex].species_and_occu
                 if not site.species_and_occu.almost_equals(sp):
                     continue
                 if self._symmetrized:
-                    sym_equiv = structure.find_equivalent_sites(ex)
-                    sym_test = site in sym_equiv
+                    sym_test = sym_groups[i] == sym_groups[ex]
                 else:
                     sym_test = True
                 if sym_test:
@@ -589,7 +638,7 @@ class OrderDisorderedStructureTransformation(AbstractTransformation):
                     found = True
             if not found:
                 equivalent_sites.append([i])
-                exemplars.append(site)
+                exemplars.append(i)
 
         #generate the list of manipulations and input structure
         se = StructureEditor(structure)
@@ -622,7 +671,18 @@ class OrderDisorderedStructureTransformation(AbstractTransformation):
 
         structure = se.modified_structure
         matrix = EwaldSummation(structure).total_energy_matrix
-        ewald_m = EwaldMinimizer(matrix, m_list, num_to_return, self._algo)
+        ewald_m = EwaldMinimizer(matrix, m_list, num_to_return, self._algo,
+                                 ncpus=self._ncpus,
+                                 time_limit=self._time_limit,
+                                 max_nodes=self._max_nodes)
+        self._completed = ewald_m.completed
+        if not ewald_m.completed:
+            logger.warning("Ewald minimization stopped by time_limit or "
+                           "max_nodes. Returning the best orderings found so "
+                           "far.")
+            if not ewald_m.output_lists:
+                raise ValueError("No ordering found within time_limit and "
+                                 "max_nodes.")
 
         self._all_structures = []
 
@@ -668,10 +728,23 @@ class OrderDisorderedStructureTransformation(AbstractTransformation):
     @property
     def to_dict(self):
         return {"name": self.__class__.__name__, "version": __version__,
-                "init_args": {"algo": self._algo},
+                "init_args": {"algo": self._algo,
+                              "symmetrized_structures": self._symmetrized,
+                              "ncpus": self._ncpus,
+                              "time_limit": self._time_limit,
+                              "max_nodes": self._max_nodes},
                 "@module": self.__class__.__module__,
                 "@class": self.__class__.__name__}
 
+    @property
+    def completed(self):
+        """
+        Whether the last EwaldMinimizer search was completed, or was stopped
+        early by time_limit or max_nodes. None if no search has been
+        performed.
+        """
+        return self._completed
+
     @property
     def lowest_energy_structure(self):
         return self._all_structures[0]["structure"]
@@ -21,7 +21,8 @@ from pymatgen import Lattice, Structure
 from pymatgen.transformations.site_transformations import \
     InsertSitesTransformation, TranslateSitesTransformation, \
     ReplaceSiteSpeciesTransformation, RemoveSitesTransformation, \
-    PartialRemoveSitesTransformation
+    PartialRemoveSitesTransformation, _get_canonical_combinations
+from pymatgen.symmetry.finder import SymmetryFinder
 
 from pymatgen.util.io_utils import which
 
@@ -195,6 +196,22 @@ class PartialRemoveSitesTransformationTest(unittest.TestCase):
         self.assertEqual(s.formula, "Li2 O2")
         s = t.apply_transformation(self.struct, 12)
         self.assertEqual(len(s), 12)
+        s = t.apply_transformation(self.struct, 100)
+        self.assertEqual(len(s), 12)
+        self.assertAlmostEqual(s[0]["energy"], -80.5496, 4)
+        self.assertAlmostEqual(s[-1]["energy"], -23.6752, 4)
+
+    def test_canonical_combinations(self):
+        perms = SymmetryFinder(self.struct, 0.2).get_site_permutations()
+        perms = np.array(sorted(set(map(tuple, perms))))
+        self.assertEqual(perms.tolist(), [[0, 1, 2, 3, 4, 5, 6, 7],
+                                          [1, 0, 3, 2, 5, 4, 7, 6],
+                                          [2, 3, 0, 1, 6, 7, 4, 5],
+                                          [3, 2, 1, 0, 7, 6, 5, 4]])
+        keys = _get_canonical_combinations(perms, [(2, 3), (0, 1), (1, 3),
+                                                   (0, 2), (0, 3), (1, 2)])
+        self.assertEqual(keys, [(0, 1), (0, 1), (0, 2), (0, 2), (0, 3),
+                                (0, 3)])
 
     def test_apply_transformation_enumerate(self):
         if not enumlib_present:
@@ -222,6 +222,13 @@ class PartialRemoveSpecieTransformationTest(unittest.TestCase):
                                EwaldSummation(slow_opt_s).total_energy, 4)
         self.assertEqual(fast_opt_s, slow_opt_s)
 
+        t = PartialRemoveSpecieTransformation("Li+", 0.5, ncpus=2,
+                                              max_nodes=10 ** 6)
+        self.assertEqual(t.apply_transformation(struct), fast_opt_s)
+        self.assertTrue(t.completed)
+        self.assertEqual(t.to_dict["init_args"]["ncpus"], 2)
+        self.assertEqual(t.to_dict["init_args"]["max_nodes"], 10 ** 6)
+
     def test_apply_transformations_complete_ranking(self):
 
         p = Poscar.from_file(os.path.join(test_dir, 'POSCAR.LiFePO4'),
@@ -285,6 +292,33 @@ class OrderDisorderedStructureTransformationTest(unittest.TestCase):
                                      {"Si4+": 0.333}, "O2-"], coords)
         allstructs = t.apply_transformation(struct, 50)
         self.assertEqual(len(allstructs), 3)
+
+    def test_search_budget(self):
+        coords = [[0, 0, 0], [0.75, 0.75, 0.75], [0.5, 0.5, 0.5],
+                  [0.25, 0.25, 0.25]]
+        lattice = Lattice([[3.8401979337, 0.00, 0.00],
+                           [1.9200989668, 3.3257101909, 0.00],
+                           [0.00, -2.2171384943, 3.1355090603]])
+        struct = Structure(lattice, [{"Si4+": 0.5, "O2-": 0.25, "P5+": 0.25}]
+                           * 4, coords)
+        serial = OrderDisorderedStructureTransformation()
+        output = serial.apply_transformation(struct, return_ranked_list=50)
+        self.assertTrue(serial.completed)
+        t = OrderDisorderedStructureTransformation(ncpus=2)
+        self.assertEqual([o["energy"] for o in
+                          t.apply_transformation(struct, 50)],
+                         [o["energy"] for o in output])
+        self.assertTrue(t.completed)
+        t = OrderDisorderedStructureTransformation(max_nodes=10)
+        budget_output = t.apply_transformation(struct, 50)
+        self.assertFalse(t.completed)
+        self.assertGreater(len(budget_output), 0)
+        self.assertLess(len(budget_output), len(output))
+        d = t.to_dict
+        self.assertEqual(d["init_args"]["max_nodes"], 10)
+        self.assertIsNone(d["init_args"]["time_limit"])
+        t = OrderDisorderedStructureTransformation(max_nodes=1)
+        self.assertRaises(ValueError, t.apply_transformation, struct, 50)
         
     def test_symmetrized_structure(self):
         t = OrderDisorderedStructureTransformation(symmetrized_structures=True)
@@ -17,6 +17,9 @@ __date__ = "Nov 27, 2011"
 
 import numpy as np
 import math
+import itertools
+
+from pymatgen.util.num_utils import hermite_normal_form
 
 
 def find_in_coord_list(coord_list, coord, atol=1e-8):
@@ -114,7 +117,7 @@ def pbc_diff(fcoords1, fcoords2):
     return fdist - np.round(fdist)
 
 
-def pbc_all_distances(lattice, fcoords1, fcoords2):
+def pbc_all_distances(lattice, fcoords1, fcoords2, max_chunk_size=5000000):
     """
     Returns the distances between two lists of coordinates taking into
     account periodic boundary conditions and the lattice. Note that this
@@ -122,6 +125,12 @@ def pbc_all_distances(lattice, fcoords1, fcoords2):
     point in fcoords1 and every coordinate in fcoords2). This is
     different functionality from pbc_diff.
 
+    The minimum image search is performed in an LLL-reduced basis of the
+    lattice. Pairs for which the nearest of the 27 neighboring images cannot
+    be guaranteed to be the minimum image (which can only happen for very
+    skewed or elongated cells) are rechecked against all images that could
+    possibly be closer, so that the result is exact for any cell.
+
     Args:
         lattice:
             lattice to use
@@ -131,6 +140,11 @@ def pbc_all_distances(lattice, fcoords1, fcoords2):
             coord or any array of coords.
         fcoords2:
             Second set of fractional coordinates.
+        max_chunk_size:
+            Maximum number of image vectors to hold in memory at any one
+            time. The rows of the distance matrix are computed in chunks to
+            satisfy this limit, which allows distance matrices of large
+            structures to be computed.
 
     Returns:
         2d array of cartesian distances. E.g the distance between
@@ -139,33 +153,74 @@ def pbc_all_distances(lattice, fcoords1, fcoords2):
     #ensure correct shape
     fcoords1, fcoords2 = np.atleast_2d(fcoords1, fcoords2)
 
-    #ensure that all points are in the unit cell
-    fcoords1 = np.mod(fcoords1, 1)
-    fcoords2 = np.mod(fcoords2, 1)
+    lll_latt = lattice.get_lll_reduced_lattice()
+    lll_matrix = lll_latt.matrix
+    #Integer transformation of fractional coords to the LLL basis.
+    transf = np.round(np.dot(lattice.matrix, lll_latt.inv_matrix))
+    #Interplanar spacings of the reduced lattice.
+    spacings = 2 * math.pi / np.array(lll_latt.reciprocal_lattice.abc)
 
     #create images, 2d array of all length 3 combinations of [-1,0,1]
-    r = np.arange(-1, 2)
-    arange = r[:, None] * np.array([1, 0, 0])[None, :]
-    brange = r[:, None] * np.array([0, 1, 0])[None, :]
-    crange = r[:, None] * np.array([0, 0, 1])[None, :]
-    images = arange[:, None, None] + brange[None, :, None] +\
-        crange[None, None, :]
-    images = images.reshape((27, 3))
+    images = np.array(list(itertools.product((-1, 0, 1), repeat=3)))
+    cart_images = np.dot(images, lll_matrix)
+    image_norms = np.sum(cart_images ** 2, axis=1)
+
+    n2 = len(fcoords2)
+    chunk = max(1, int(max_chunk_size // (27 * max(n2, 1))))
+    distances = np.zeros((len(fcoords1), n2))
+    for start in xrange(0, len(fcoords1), chunk):
+        f1 = fcoords1[start:start + chunk]
+        #fractional vectors from f1 to f2, wrapped to [-0.5, 0.5] in the
+        #reduced basis. The arrays are flattened to 2D so that numpy can use
+        #BLAS for the matrix products.
+        fvecs = (fcoords2[None, :, :] - f1[:, None, :]).reshape((-1, 3))
+        fvecs = np.dot(fvecs, transf)
+        fvecs -= np.round(fvecs)
+        cvecs = np.dot(fvecs, lll_matrix)
+        #|v + t|^2 - |v|^2 = 2 v.t + |t|^2, so the closest image can be
+        #found with a matrix product instead of creating all image vectors.
+        d_2 = np.dot(cvecs, 2 * cart_images.T) + image_norms
+        #Recompute the distance to the closest image directly for accuracy.
+        min_vecs = cvecs + cart_images[np.argmin(d_2, axis=1)]
+        dists = np.sum(min_vecs ** 2, axis=1).reshape((len(f1), n2)) ** 0.5
+        cvecs = cvecs.reshape((len(f1), n2, 3))
+
+        #Any image outside the 27 tested ones is at least 1.5 interplanar
+        #spacings away, so only pairs beyond that need to be rechecked.
+        unsure = np.where(dists > 1.5 * np.min(spacings))
+        if len(unsure[0]) > 0:
+            dists[unsure] = _get_min_image_distances(
+                lll_matrix, spacings, cvecs[unsure], dists[unsure],
+                max_chunk_size)
+        distances[start:start + chunk] = dists
 
-    #create images of f2
-    shifted_f2 = fcoords2[:, None, :] + images[None, :, :]
-
-    cart_f1 = lattice.get_cartesian_coords(fcoords1)
-    cart_f2 = lattice.get_cartesian_coords(shifted_f2)
-
-    #all vectors from f1 to f2
-    vectors = cart_f2[None, :, :, :] - cart_f1[:, None, None, :]
-
-    d_2 = np.sum(vectors ** 2, axis=3)
+    return distances
 
-    distances = np.min(d_2, axis=2) ** 0.5
 
-    return distances
+def _get_min_image_distances(matrix, spacings, cvecs, dists,
+                             max_chunk_size):
+    """
+    Refines minimum image distances for a set of cartesian vectors by testing
+    all lattice translations (beyond the 27 nearest) that could possibly give
+    a shorter vector.
+    """
+    radius = np.max(dists + np.sqrt(np.sum(cvecs ** 2, axis=1)))
+    nmax = np.ceil(radius / spacings).astype(np.int)
+    ranges = [np.arange(-n, n + 1) for n in nmax]
+    images = np.array(list(itertools.product(*ranges)))
+    images = images[np.any(np.abs(images) > 1, axis=1)]
+    cart_images = np.dot(images, matrix)
+    cart_images = cart_images[np.sum(cart_images ** 2, axis=1)
+                              <= radius ** 2]
+    d_2 = dists ** 2
+    vec_norms = np.sum(cvecs ** 2, axis=1)
+    block = max(1, int(max_chunk_size // max(len(cvecs), 1)))
+    for start in xrange(0, len(cart_images), block):
+        block_images = cart_images[start:start + block]
+        block_d_2 = np.dot(cvecs, 2 * block_images.T) + \
+            np.sum(block_images ** 2, axis=1)
+        d_2 = np.minimum(d_2, np.min(block_d_2, axis=1) + vec_norms)
+    return d_2 ** 0.5
 
 
 def pbc_shortest_vectors(lattice, fcoords1, fcoords2):
@@ -241,6 +296,106 @@ def find_in_coord_list_pbc(fcoord_list, fcoord, atol=1e-8):
     return np.where(np.all(np.abs(fdist) < atol, axis=1))[0]
 
 
+#Maximum number of bins for which find_pbc_matches uses a dense lookup table
+#instead of binary searches.
+DENSE_BINS_LIMIT = 2 ** 20
+
+
+def find_pbc_matches(fcoords1, fcoords2, atol=1e-8):
+    """
+    Finds all pairs of points from two lists of fractional coords that are
+    equal (with a tolerance), taking into account periodic boundary
+    conditions. The points of fcoords2 are hashed into bins at least twice
+    as wide as atol, so each point of fcoords1 is only compared with the
+    points in its own bin and the nearest neighboring bins. This scales
+    linearly with the number of points, unlike repeated calls to
+    find_in_coord_list_pbc.
+
+    Args:
+        fcoords1:
+            List of fractional coords to find matches for.
+        fcoords2:
+            List of fractional coords to search in.
+        atol:
+            Absolute tolerance for each coordinate, either as a scalar or
+            one value per coordinate. Defaults to 1e-8.
+
+    Returns:
+        (indices1, indices2) of all matching pairs as numpy arrays, sorted
+        by indices1, then indices2.
+    """
+    fcoords1 = np.mod(np.array(fcoords1, dtype=np.float64).reshape((-1, 3)),
+                      1)
+    fcoords2 = np.mod(np.array(fcoords2, dtype=np.float64).reshape((-1, 3)),
+                      1)
+    atol = np.zeros(3) + atol
+    empty = (np.zeros(0, dtype=np.int), np.zeros(0, dtype=np.int))
+    if len(fcoords1) == 0 or len(fcoords2) == 0:
+        return empty
+    #The number of bins is capped so that the linearized keys cannot
+    #overflow.
+    nbins = np.minimum(np.maximum(1, (0.5 / atol).astype(np.int64)), 2 ** 20)
+
+    def get_keys(bins):
+        bins = bins % nbins
+        return (bins[:, 0] * nbins[1] + bins[:, 1]) * nbins[2] + bins[:, 2]
+
+    scaled2 = fcoords2 * nbins
+    keys2 = get_keys(np.floor(scaled2).astype(np.int64))
+    order = np.argsort(keys2, kind="mergesort")
+    sorted_keys = keys2[order]
+    nkeys = np.prod(nbins)
+    if nkeys <= max(DENSE_BINS_LIMIT, len(fcoords1) + len(fcoords2)):
+        #A dense table of bin boundaries avoids the binary searches.
+        bin_counts = np.bincount(keys2, minlength=nkeys)
+        bin_ends = np.cumsum(bin_counts)
+
+        def find_range(keys):
+            return bin_ends[keys] - bin_counts[keys], bin_ends[keys]
+    else:
+        (uniq_keys, uniq_starts) = np.unique(sorted_keys, return_index=True)
+        uniq_ends = np.append(uniq_starts[1:], len(sorted_keys))
+
+        def find_range(keys):
+            pos = np.minimum(np.searchsorted(uniq_keys, keys),
+                             len(uniq_keys) - 1)
+            found = uniq_keys[pos] == keys
+            return (np.where(found, uniq_starts[pos], 0),
+                    np.where(found, uniq_ends[pos], 0))
+
+    #Since the bins are at least 2 * atol wide, a match can only be in the
+    #same bin or in the neighboring bin on the nearer side along each axis.
+    scaled1 = fcoords1 * nbins
+    bins1 = np.floor(scaled1).astype(np.int64)
+    nearer = np.where(scaled1 - bins1 < 0.5, -1, 1)
+    all_inds1 = []
+    all_inds2 = []
+    for use_neighbor in itertools.product((0, 1), repeat=3):
+        if any(u and n == 1 for u, n in zip(use_neighbor, nbins)):
+            continue
+        keys = get_keys(bins1 + nearer * use_neighbor)
+        (start, end) = find_range(keys)
+        counts = end - start
+        total = np.sum(counts)
+        if total == 0:
+            continue
+        run_starts = np.cumsum(counts) - counts
+        within = np.arange(total) - np.repeat(run_starts, counts)
+        all_inds1.append(np.repeat(np.arange(len(keys)), counts))
+        all_inds2.append(order[np.repeat(start, counts) + within])
+    if not all_inds1:
+        return empty
+    inds1 = np.concatenate(all_inds1)
+    inds2 = np.concatenate(all_inds2)
+    fdist = fcoords2[inds2] - fcoords1[inds1]
+    fdist -= np.round(fdist)
+    matched = np.all(np.abs(fdist) < atol, axis=1)
+    inds1 = inds1[matched]
+    inds2 = inds2[matched]
+    pairs = np.lexsort((inds2, inds1))
+    return inds1[pairs], inds2[pairs]
+
+
 def in_coord_list_pbc(fcoord_list, fcoord, atol=1e-8):
     """
     Tests if a particular fractional coord is within a fractional coord_list.
@@ -326,6 +481,36 @@ def get_points_in_sphere_pbc(lattice, frac_points, center, r):
     return np.transpose(d)
 
 
+def get_lattice_points_in_supercell(scaling_matrix):
+    """
+    Returns the lattice points of a lattice which lie inside a supercell,
+    i.e., exactly one lattice translation for each of the |det(M)| sites
+    a site of the lattice gives rise to in the supercell. The points are
+    enumerated from the Hermite normal form H of the scaling matrix. The
+    rows of H are lower triangular, so the integer vectors in the box
+    0 <= x_i < H[i, i] form a complete set of representatives of the
+    lattice points modulo the superlattice.
+
+    Args:
+        scaling_matrix:
+            Integer matrix defining the supercell, i.e., the supercell
+            lattice vectors are the rows of scaling_matrix . lattice.
+
+    Returns:
+        (n, 3) integer array of lattice points, in fractional coordinates
+        of the original lattice, chosen such that their fractional
+        coordinates in the supercell lie in [0, 1).
+    """
+    scaling_matrix = np.array(scaling_matrix, dtype=np.int).reshape((3, 3))
+    hnf = hermite_normal_form(scaling_matrix)
+    points = np.array(list(itertools.product(
+        *[xrange(hnf[i, i]) for i in xrange(3)])), dtype=np.int)
+    #Map the points into the supercell.
+    fcoords = np.dot(points, np.linalg.inv(scaling_matrix))
+    fcoords -= np.floor(fcoords + 1e-8)
+    return np.round(np.dot(fcoords, scaling_matrix)).astype(np.int)
+
+
 def barycentric_coords(coords, simplex):
     """
     Converts a list of coordinates to barycentric coordinates, given a
@@ -78,3 +78,56 @@ def min_max_indexes(seq):
     minimum = min(enumerate(seq), key=lambda s: s[1])
     maximum = max(enumerate(seq), key=lambda s: s[1])
     return minimum[0], maximum[0]
+
+
+def hermite_normal_form(matrix):
+    """
+    Computes the Hermite normal form of an integer matrix with full column
+    rank using integer row operations, i.e., the lower triangular matrix
+    H = U.M, with U unimodular, positive diagonal elements, and 0 <= H[i, j]
+    < H[j, j] for j < i. The rows of H generate the same lattice as the rows
+    of the matrix. A matrix with more rows than columns (i.e., a redundant
+    set of generators) is reduced to a square basis.
+
+    Args:
+        matrix:
+            (m, n) integer matrix, with m >= n.
+
+    Returns:
+        The (n, n) Hermite normal form as an integer numpy array.
+    """
+    h = [[int(round(x)) for x in row] for row in matrix]
+    n = len(h[0]) if h else 0
+    #Rows h[:nactive] have not been used as pivots yet.
+    nactive = len(h)
+    for col in xrange(n - 1, -1, -1):
+        #Euclid's algorithm on the active rows, which leaves a single
+        #nonzero element in this column, in the last active row.
+        last = nactive - 1
+        while True:
+            nonzero = [i for i in xrange(nactive) if h[i][col] != 0]
+            if not nonzero:
+                raise ValueError("Matrix is singular.")
+            pivot = min(nonzero, key=lambda i: abs(h[i][col]))
+            h[pivot], h[last] = h[last], h[pivot]
+            done = True
+            for i in xrange(last):
+                q = h[i][col] // h[last][col]
+                if q != 0:
+                    h[i] = [a - q * b for a, b in zip(h[i], h[last])]
+                if h[i][col] != 0:
+                    done = False
+            if done:
+                break
+        if h[last][col] < 0:
+            h[last] = [-a for a in h[last]]
+        nactive = last
+    #The remaining rows are all zero.
+    h = h[nactive:]
+    #Reduce the elements below the diagonal.
+    for i in xrange(n):
+        for j in xrange(i - 1, -1, -1):
+            q = h[i][j] // h[j][j]
+            if q != 0:
+                h[i] = [a - q * b for a, b in zip(h[i], h[j])]
+    return np.array(h, dtype=np.int)
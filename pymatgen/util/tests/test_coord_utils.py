@@ -21,7 +21,8 @@ from pymatgen.core.lattice import Lattice
 from pymatgen.util.coord_utils import get_linear_interpolated_value,\
     in_coord_list, pbc_diff, in_coord_list_pbc, get_points_in_sphere_pbc,\
     find_in_coord_list, find_in_coord_list_pbc, pbc_all_distances,\
-    barycentric_coords
+    barycentric_coords, get_lattice_points_in_supercell, find_pbc_matches
+from pymatgen.util.num_utils import hermite_normal_form
 
 
 class CoordUtilsTest(unittest.TestCase):
@@ -88,6 +89,22 @@ class CoordUtilsTest(unittest.TestCase):
         f1 = [0, 0, 17]
         f2 = [0, 0, 10]
         self.assertEqual(pbc_all_distances(lattice, f1, f2)[0,0], 0)
+
+    def test_pbc_all_distances_skewed(self):
+        #Highly skewed cell in which the minimum image is well outside the
+        #27 neighboring images of the original basis.
+        lattice = Lattice([[1, 0, 0], [4.3, 1, 0], [0.2, 2.5, 2]])
+        fcoords = np.random.uniform(0, 1, size=(10, 3))
+        images = np.array(list(itertools.product(range(-15, 16),
+                                                 repeat=3)))
+        expected = np.zeros((10, 10))
+        for i, j in itertools.product(range(10), range(10)):
+            vecs = lattice.get_cartesian_coords(fcoords[j] - fcoords[i]
+                                                + images)
+            expected[i, j] = np.min(np.sum(vecs ** 2, axis=1)) ** 0.5
+        output = pbc_all_distances(lattice, fcoords, fcoords,
+                                   max_chunk_size=50)
+        self.assertTrue(np.allclose(output, expected))
         
 
     def test_in_coord_list_pbc(self):
@@ -111,6 +128,28 @@ class CoordUtilsTest(unittest.TestCase):
         self.assertEqual(
             find_in_coord_list_pbc(coords, test_coord, atol=0.01)[0], 1)
 
+    def test_find_pbc_matches(self):
+        coords = [[0, 0, 0], [0.5, 0.5, 0.5], [0.51, 0.5, 0.5]]
+        test_coords = [[0.99, 0.99, 0.99], [0.1, 0.1, 0.1],
+                       [-0.499, 0.5, 0.5]]
+        (inds1, inds2) = find_pbc_matches(test_coords, coords, 0.02)
+        self.assertEqual(list(inds1), [0, 2, 2])
+        self.assertEqual(list(inds2), [0, 1, 2])
+        (inds1, inds2) = find_pbc_matches(test_coords, coords, 0.002)
+        self.assertEqual(list(inds1), [2])
+        self.assertEqual(list(inds2), [1])
+        #Compare with a brute force search for random points.
+        coords = np.random.random((200, 3))
+        test_coords = coords[:50] + np.random.randint(-2, 3, (50, 3)) + \
+            np.random.uniform(-0.05, 0.05, (50, 3))
+        for atol in [0.01, 0.05, [0.3, 0.01, 0.6]]:
+            (inds1, inds2) = find_pbc_matches(test_coords, coords, atol)
+            fdist = coords[None, :, :] - test_coords[:, None, :]
+            fdist = np.abs(fdist - np.round(fdist))
+            expected = np.where(np.all(fdist < atol, axis=2))
+            self.assertEqual(list(inds1), list(expected[0]))
+            self.assertEqual(list(inds2), list(expected[1]))
+
     def test_get_points_in_sphere_pbc(self):
         latt = Lattice.cubic(1)
         pts = []
@@ -123,6 +162,25 @@ class CoordUtilsTest(unittest.TestCase):
                                                       [0.5, 0.5, 0.5],
                                                       0.5)), 515)
         
+    def test_get_lattice_points_in_supercell(self):
+        matrix = [[2, 1, 0], [-1, 2, 0], [1, 0, 1]]
+        self.assertTrue(np.array_equal(hermite_normal_form(matrix),
+                                       [[5, 0, 0], [2, 1, 0], [1, 0, 1]]))
+        #Redundant generators of the body centered lattice.
+        gens = [[1, 1, 1], [2, 0, 0], [0, 2, 0], [0, 0, 2]]
+        self.assertTrue(np.array_equal(hermite_normal_form(gens),
+                                       [[2, 0, 0], [0, 2, 0], [1, 1, 1]]))
+        points = get_lattice_points_in_supercell(matrix)
+        self.assertEqual(len(points), 5)
+        fcoords = np.dot(points, np.linalg.inv(matrix))
+        self.assertTrue(np.all(fcoords > -1e-8))
+        self.assertTrue(np.all(fcoords < 1 - 1e-8))
+        #All points are distinct in the supercell.
+        for i, j in itertools.combinations(range(5), 2):
+            self.assertFalse(np.allclose(pbc_diff(fcoords[i], fcoords[j]), 0))
+        self.assertRaises(ValueError, hermite_normal_form,
+                          [[1, 0, 0], [2, 0, 0], [0, 0, 1]])
+
     def test_barycentric(self):
         #2d test
         simplex1 = np.array([[0.3,0.1], [0.2,-1.2], [1.3,2.3]])